@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+趋势买入信号历史回测（向量化）
+===================================
+
+职责：
+1. 在本地 stock_daily 全市场面板上，对每只股票的每一根 K 线重放
+   StockTrendAnalyzer._generate_signal 的评分规则（趋势 / 乖离率 / 量能 / 支撑）
+2. 所有计算都是 (股票 × 交易日) 二维数组运算，没有逐日、逐只的 Python 循环
+3. 统计信号之后 N 个交易日的收益，按评分区间和 BuySignal 等级汇总：
+   样本数、平均收益、胜率（收益 > 0 的比例）
+
+口径说明：
+- 每一根 K 线的评分等价于用截至当日的历史调用 StockTrendAnalyzer.analyze()
+  （至少 20 根 K 线才参与统计，与 analyze() 的数据不足判断一致）
+- 停牌日不计入：每只股票只使用有效 K 线，"N 日后"指该股票之后第 N 根有效 K 线
+- 收益按信号当日收盘价买入、N 日后收盘价卖出计算，不考虑手续费和涨跌停无法成交
+
+用法：
+    python backtest.py                    # 回测本地数据库最近 750 个交易日
+    python backtest.py --days 500
+    python backtest.py --synthetic 5000   # 在 5000 只 × 750 日的合成面板上测试耗时
+"""
+
+import argparse
+import logging
+import time
+from dataclasses import dataclass, field, fields
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from indicators import compute_indicators
+from market_panel import OhlcvPanel
+from stock_analyzer import BuySignal, StockTrendAnalyzer, TrendStatus, VolumeStatus
+
+logger = logging.getLogger(__name__)
+
+
+# 默认统计的持有周期（交易日）
+DEFAULT_HORIZONS = (1, 5, 10, 20)
+
+# 每批处理的股票数（控制中间数组的内存占用）
+CHUNK_SIZE = 1000
+
+# 参与评分所需的最少 K 线数（与 StockTrendAnalyzer.analyze 一致）
+MIN_BARS = 20
+
+# 评分区间宽度（0-9, 10-19, ..., 90-100）
+BUCKET_WIDTH = 10
+N_BUCKETS = 100 // BUCKET_WIDTH
+
+# 状态编码顺序（数组中以下标表示）
+TREND_ORDER = (
+    TrendStatus.STRONG_BULL, TrendStatus.BULL, TrendStatus.WEAK_BULL, TrendStatus.CONSOLIDATION,
+    TrendStatus.WEAK_BEAR, TrendStatus.BEAR, TrendStatus.STRONG_BEAR,
+)
+VOLUME_ORDER = (
+    VolumeStatus.HEAVY_VOLUME_UP, VolumeStatus.HEAVY_VOLUME_DOWN,
+    VolumeStatus.SHRINK_VOLUME_UP, VolumeStatus.SHRINK_VOLUME_DOWN, VolumeStatus.NORMAL,
+)
+SIGNAL_ORDER = tuple(BuySignal)
+
+# 各状态得分（与 StockTrendAnalyzer._generate_signal 一致）
+_TREND_POINTS = np.array([40, 35, 25, 15, 10, 5, 0])
+_VOLUME_POINTS = np.array([15, 0, 8, 20, 12])
+
+
+@dataclass
+class SignalParams:
+    """评分规则参数（默认值取自 StockTrendAnalyzer）"""
+    bias_threshold: float = StockTrendAnalyzer.BIAS_THRESHOLD            # 乖离率上限（%），超过只得 5 分
+    bias_near: float = 2.0                                              # 贴近 MA5 的乖离率上限（%）
+    bias_pullback: float = -3.0                                         # 略低于 MA5 的乖离率下限（%）
+    bias_break: float = -5.0                                            # 回踩 MA5 的乖离率下限（%）
+    volume_shrink_ratio: float = StockTrendAnalyzer.VOLUME_SHRINK_RATIO  # 缩量阈值
+    volume_heavy_ratio: float = StockTrendAnalyzer.VOLUME_HEAVY_RATIO    # 放量阈值
+    ma_support_tolerance: float = StockTrendAnalyzer.MA_SUPPORT_TOLERANCE  # MA 支撑容忍度
+    strong_spread: float = 5.0                                          # 强势多头/空头的均线间距（%）
+
+
+@dataclass
+class SignalFeatures:
+    """
+    与评分参数无关的逐 K 线特征（同形状数组）
+    
+    参数扫描时只需计算一次，之后每组参数只做阈值比较
+    """
+    base_trend: np.ndarray      # 不区分强弱的趋势（TREND_ORDER 下标：BULL/WEAK_BULL/CONSOLIDATION/WEAK_BEAR/BEAR）
+    spread: np.ndarray          # 多头/空头排列且间距较 4 日前扩大时的 MA5-MA20 间距（%），否则 NaN
+    bias: np.ndarray            # MA5 乖离率（%）
+    volume_ratio: np.ndarray    # 当日量 / 前 5 日均量
+    rising: np.ndarray          # 收盘价高于前一根
+    ma5_gap: np.ndarray         # 价格在 MA5 上方时与 MA5 的距离（比例），否则 NaN
+    ma10_gap: np.ndarray        # 价格在 MA10 上方时与 MA10 的距离（比例），否则 NaN
+    
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """{字段名: 数组}（不拷贝）"""
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+    
+    def compress(self, mask: np.ndarray) -> 'SignalFeatures':
+        """只保留 mask 为 True 的样本（展开为一维）"""
+        return SignalFeatures(**{name: values[mask] for name, values in self.arrays().items()})
+
+
+@dataclass
+class ScoredPanel:
+    """
+    评分结果（右对齐后的二维数组，列不对应同一交易日）
+    """
+    close: np.ndarray       # 右对齐的收盘价
+    score: np.ndarray       # 综合评分 0-100
+    signal: np.ndarray      # BuySignal 在 SIGNAL_ORDER 中的下标
+    trend: np.ndarray       # TrendStatus 在 TREND_ORDER 中的下标
+    valid: np.ndarray       # 是否参与统计（K 线数 >= MIN_BARS）
+
+
+@dataclass
+class BacktestResult:
+    """回测结果"""
+    horizons: Tuple[int, ...]
+    by_bucket: pd.DataFrame       # 按评分区间汇总
+    by_signal: pd.DataFrame       # 按 BuySignal 汇总
+    n_samples: int = 0            # 参与评分的 K 线数
+    n_codes: int = 0
+    n_days: int = 0
+    elapsed: float = 0.0          # 耗时（秒）
+    params: SignalParams = field(default_factory=SignalParams)
+    
+    def format_report(self) -> str:
+        """格式化为文本报告"""
+        lines = [
+            "=== 趋势买入信号回测 ===",
+            f"面板: {self.n_codes} 只 × {self.n_days} 日，评分样本: {self.n_samples}，耗时: {self.elapsed:.2f}s",
+            "",
+            "【按评分区间】",
+            self.by_bucket.to_string(float_format=lambda v: f"{v:.2f}"),
+            "",
+            "【按买入信号】",
+            self.by_signal.to_string(float_format=lambda v: f"{v:.2f}"),
+        ]
+        return "\n".join(lines)
+
+
+def compute_features(panel: OhlcvPanel) -> Tuple[SignalFeatures, np.ndarray, np.ndarray]:
+    """
+    计算面板每一根 K 线的评分特征
+    
+    Returns:
+        (特征, 右对齐的收盘价, 是否参与统计的掩码)
+    """
+    aligned = panel.align_right(('close', 'volume'))
+    close, volume = aligned['close'], aligned['volume']
+    n_days = close.shape[1]
+    
+    mas = compute_indicators(close, ('ma5', 'ma10', 'ma20'))
+    ma5, ma10, ma20 = mas['ma5'], mas['ma10'], mas['ma20']
+    # 4 个交易日前的 MA5/MA20（analyze() 中的 df.iloc[-5]）
+    prev_ma5 = _shift(ma5, 4)
+    prev_ma20 = _shift(ma20, 4)
+    
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # === 趋势：排列方式 + 间距是否扩大 ===
+        bull = (ma5 > ma10) & (ma10 > ma20)
+        bear = (ma5 < ma10) & (ma10 < ma20)
+        base_trend = np.select(
+            [bull, (ma5 > ma10) & (ma10 <= ma20), bear, (ma5 < ma10) & (ma10 >= ma20)],
+            [1, 2, 5, 4],
+            default=3,
+        )
+        bull_spread = np.where(ma20 > 0, (ma5 - ma20) / ma20 * 100, 0)
+        bull_prev = np.where(prev_ma20 > 0, (prev_ma5 - prev_ma20) / prev_ma20 * 100, 0)
+        bear_spread = np.where(ma5 > 0, (ma20 - ma5) / ma5 * 100, 0)
+        bear_prev = np.where(prev_ma5 > 0, (prev_ma20 - prev_ma5) / prev_ma5 * 100, 0)
+        spread = np.select(
+            [bull & (bull_spread > bull_prev), bear & (bear_spread > bear_prev)],
+            [bull_spread, bear_spread],
+            default=np.nan,
+        )
+        
+        # === 乖离率 ===
+        bias = np.where(ma5 > 0, (close - ma5) / ma5 * 100, 0)
+        
+        # === 量能：当日量 / 前 5 日均量（跳过 NaN），涨跌看前一根收盘价 ===
+        prev_volume = np.stack([_shift(volume, k) for k in range(1, 6)])
+        vol_5d_avg = np.nansum(prev_volume, axis=0) / np.count_nonzero(~np.isnan(prev_volume), axis=0)
+        volume_ratio = np.where(vol_5d_avg > 0, volume / vol_5d_avg, 0)
+        rising = close > _shift(close, 1)
+        
+        # === 支撑：价格在均线上方时与均线的距离 ===
+        ma5_gap, ma10_gap = (
+            np.where((ma > 0) & (close >= ma), np.abs(close - ma) / ma, np.nan) for ma in (ma5, ma10)
+        )
+    
+    # 右对齐后，第 j 列是该股票的第 (j - 缺失数 + 1) 根 K 线
+    first_bar = n_days - panel.bar_counts()
+    valid = np.arange(n_days)[None, :] >= (first_bar + MIN_BARS - 1)[:, None]
+    
+    features = SignalFeatures(
+        base_trend=base_trend, spread=spread, bias=bias, volume_ratio=volume_ratio,
+        rising=rising, ma5_gap=ma5_gap, ma10_gap=ma10_gap,
+    )
+    return features, close, valid
+
+
+def score_features(features: SignalFeatures, params: Optional[SignalParams] = None
+                   ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    按参数对特征评分（与 StockTrendAnalyzer._generate_signal 相同的规则，数组可为任意形状）
+    
+    Returns:
+        (综合评分, SIGNAL_ORDER 下标, TREND_ORDER 下标)
+    """
+    params = params or SignalParams()
+    base_trend = features.base_trend
+    
+    # 间距扩大且超过阈值：多头 -> 强势多头，空头 -> 强势空头
+    strong = features.spread > params.strong_spread
+    trend = np.where(strong & (base_trend == 1), 0, np.where(strong & (base_trend == 5), 6, base_trend))
+    score = _TREND_POINTS[trend]
+    
+    bias = features.bias
+    score = score + np.select(
+        [
+            (bias < 0) & (bias > params.bias_pullback),
+            (bias < 0) & (bias > params.bias_break),
+            bias < 0,
+            bias < params.bias_near,
+            bias < params.bias_threshold,
+        ],
+        [30, 25, 10, 28, 20],
+        default=5,
+    )
+    
+    heavy = features.volume_ratio >= params.volume_heavy_ratio
+    shrink = features.volume_ratio <= params.volume_shrink_ratio
+    rising = features.rising
+    volume_status = np.select(
+        [heavy & rising, heavy, shrink & rising, shrink],
+        [0, 1, 2, 3],
+        default=4,
+    )
+    score = score + _VOLUME_POINTS[volume_status]
+    
+    score = score + np.where(features.ma5_gap <= params.ma_support_tolerance, 5, 0)
+    score = score + np.where(features.ma10_gap <= params.ma_support_tolerance, 5, 0)
+    
+    # === 信号等级（与 _generate_signal 相同的判断顺序）===
+    signal = np.select(
+        [
+            (score >= 80) & (trend <= 1),
+            (score >= 65) & (trend <= 2),
+            score >= 50,
+            score >= 35,
+            trend >= 5,
+        ],
+        [SIGNAL_ORDER.index(s) for s in (BuySignal.STRONG_BUY, BuySignal.BUY, BuySignal.HOLD,
+                                          BuySignal.WAIT, BuySignal.STRONG_SELL)],
+        default=SIGNAL_ORDER.index(BuySignal.SELL),
+    )
+    return score, signal, trend
+
+
+def score_panel(panel: OhlcvPanel, params: Optional[SignalParams] = None) -> ScoredPanel:
+    """
+    对面板每一根 K 线计算 _generate_signal 的评分和信号
+    
+    Args:
+        panel: 全市场面板（或其中一部分股票）
+        params: 评分参数（可选）
+    """
+    features, close, valid = compute_features(panel)
+    score, signal, trend = score_features(features, params)
+    return ScoredPanel(close=close, score=score, signal=signal, trend=trend, valid=valid)
+
+
+def _shift(values: np.ndarray, periods: int) -> np.ndarray:
+    """沿交易日方向后移，前端补 NaN"""
+    result = np.full(values.shape, np.nan)
+    result[:, periods:] = values[:, :-periods]
+    return result
+
+
+def forward_returns(close: np.ndarray, horizon: int) -> np.ndarray:
+    """N 根 K 线之后的收益率（%），超出面板末尾为 NaN"""
+    result = np.full(close.shape, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result[:, :-horizon] = (close[:, horizon:] / close[:, :-horizon] - 1) * 100
+    return result
+
+
+class _Accumulator:
+    """按分组累计 样本数 / 收益和 / 盈利次数（bincount 实现）"""
+    
+    def __init__(self, n_groups: int, horizons: Sequence[int]):
+        self.n_groups = n_groups
+        self.samples = np.zeros(n_groups, dtype=np.int64)
+        self.count = {h: np.zeros(n_groups, dtype=np.int64) for h in horizons}
+        self.total = {h: np.zeros(n_groups) for h in horizons}
+        self.wins = {h: np.zeros(n_groups, dtype=np.int64) for h in horizons}
+    
+    def add(self, groups: np.ndarray, returns: Dict[int, np.ndarray]) -> None:
+        self.samples += np.bincount(groups, minlength=self.n_groups)
+        for h, ret in returns.items():
+            known = ~np.isnan(ret)
+            g, r = groups[known], ret[known]
+            self.count[h] += np.bincount(g, minlength=self.n_groups)
+            self.total[h] += np.bincount(g, weights=r, minlength=self.n_groups)
+            self.wins[h] += np.bincount(g, weights=r > 0, minlength=self.n_groups).astype(np.int64)
+    
+    def to_frame(self, labels: Sequence[str], index_name: str) -> pd.DataFrame:
+        data = {'samples': self.samples}
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for h in self.count:
+                data[f'ret_{h}d'] = self.total[h] / self.count[h]
+                data[f'win_{h}d'] = self.wins[h] / self.count[h] * 100
+        return pd.DataFrame(data, index=pd.Index(labels, name=index_name))
+
+
+def run_backtest(
+    panel: OhlcvPanel,
+    params: Optional[SignalParams] = None,
+    horizons: Sequence[int] = DEFAULT_HORIZONS,
+    chunk_size: int = CHUNK_SIZE
+) -> BacktestResult:
+    """
+    回测趋势买入信号
+    
+    Args:
+        panel: 全市场面板
+        params: 评分参数（可选）
+        horizons: 统计的持有周期（交易日）
+        chunk_size: 每批处理的股票数
+    
+    Returns:
+        BacktestResult（收益单位为 %，胜率为收益 > 0 的样本占比 %）
+    """
+    params = params or SignalParams()
+    horizons = tuple(horizons)
+    start = time.perf_counter()
+    
+    by_bucket = _Accumulator(N_BUCKETS, horizons)
+    by_signal = _Accumulator(len(SIGNAL_ORDER), horizons)
+    n_codes, n_days = panel.shape
+    
+    for lo in range(0, n_codes, chunk_size):
+        chunk = panel.subset(slice(lo, lo + chunk_size))
+        scored = score_panel(chunk, params)
+        valid = scored.valid
+        returns = {h: forward_returns(scored.close, h)[valid] for h in horizons}
+        buckets = np.minimum(scored.score[valid] // BUCKET_WIDTH, N_BUCKETS - 1)
+        by_bucket.add(buckets, returns)
+        by_signal.add(scored.signal[valid], returns)
+    
+    bucket_labels = [f"{b * BUCKET_WIDTH}-{b * BUCKET_WIDTH + BUCKET_WIDTH - 1}" for b in range(N_BUCKETS)]
+    bucket_labels[-1] = f"{(N_BUCKETS - 1) * BUCKET_WIDTH}-100"
+    result = BacktestResult(
+        horizons=horizons,
+        by_bucket=by_bucket.to_frame(bucket_labels, 'score'),
+        by_signal=by_signal.to_frame([s.value for s in SIGNAL_ORDER], 'signal'),
+        n_samples=int(by_bucket.samples.sum()),
+        n_codes=n_codes,
+        n_days=n_days,
+        elapsed=time.perf_counter() - start,
+        params=params,
+    )
+    logger.info(f"[回测] {n_codes} 只 × {n_days} 日，评分样本 {result.n_samples}，耗时 {result.elapsed:.2f}s")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='趋势买入信号历史回测')
+    parser.add_argument('--days', type=int, default=750, help='回测的交易日数量（默认 750）')
+    parser.add_argument('--synthetic', type=int, default=0, metavar='N',
+                        help='使用 N 只股票的合成面板代替本地数据（测试耗时）')
+    parser.add_argument('--horizons', type=str, default=','.join(map(str, DEFAULT_HORIZONS)),
+                        help='持有周期，逗号分隔（默认 1,5,10,20）')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)-8s | %(message)s')
+    
+    if args.synthetic:
+        panel = OhlcvPanel.synthetic(args.synthetic, args.days)
+    else:
+        panel = OhlcvPanel.load(days=args.days)
+    if len(panel) == 0:
+        logger.error("本地数据库没有日线数据，请先运行数据拉取")
+        return
+    
+    horizons = tuple(int(h) for h in args.horizons.split(',') if h.strip())
+    print(run_backtest(panel, horizons=horizons).format_report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,564 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+列式日线存储（与 SQLite 并存）
+===================================
+
+职责：
+1. 按 市场 / 年份 分区保存全市场日线（Parquet，未安装 pyarrow 时退化为 pickle）
+2. DatabaseManager 写入 stock_daily 成功后同步写入（write-through），每次写入追加一个分片文件
+3. 全市场 / 多年份的范围读取直接返回列数组或长表，不经过 ORM；Parquet 以内存映射方式读取
+4. 压缩（compaction）：把分区内的多个分片合并、去重为一个文件，分片过多时自动触发
+
+目录结构：
+    {root}/_manifest.json
+    {root}/{market}/{year}/{序号}-{进程号}-{计数}.parquet      # 写入分片
+    {root}/{market}/{year}/{序号}-{进程号}-{计数}-c.parquet    # 压缩后的分片
+
+一致性规则：
+- 分片按序号排序，同一 (code, date) 以最后写入的分片为准（与 SQLite 的 UPSERT 一致）
+- 压缩结果沿用被合并的最后一个分片的序号，压缩期间新写入的分片仍然更新
+- 只有执行过 rebuild（从 SQLite 全量导出）后才标记为已同步，读取方据此决定是否使用列式存储
+- 同步写入失败、或未启用期间 SQLite 有写入时标记为未同步，读取方回退到 SQLite 直到重新 rebuild
+- 文件格式记录在 manifest 中，之后的读写都沿用该格式；当前环境无法读取该格式时视为未同步，
+  读取方回退到 SQLite（安装 pyarrow 后重新 rebuild 即切换为 Parquet）
+
+用法：
+    python columnar_store.py rebuild    # 从 SQLite 全量导出（首次启用或数据不一致时）
+    python columnar_store.py compact    # 压缩所有分区
+    python columnar_store.py stats      # 查看分区统计
+"""
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import date, datetime
+from itertools import count
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+try:
+    import pyarrow  # noqa: F401
+    _PARQUET_AVAILABLE = True
+except ImportError:
+    _PARQUET_AVAILABLE = False
+
+
+# 存储的列（与 stock_daily 一致，不含 id / 创建时间）
+VALUE_COLUMNS = (
+    'open', 'high', 'low', 'close', 'volume', 'amount', 'pct_chg',
+    'ma5', 'ma10', 'ma20', 'volume_ratio',
+)
+COLUMNS = ('code', 'date') + VALUE_COLUMNS + ('data_source',)
+
+# 分区内分片数超过该值时，写入后自动压缩
+COMPACT_THRESHOLD = 64
+
+_MANIFEST = '_manifest.json'
+
+# 文件格式 -> 分片后缀
+_SUFFIXES = {'parquet': '.parquet', 'pickle': '.pkl'}
+_COMPACTED_SUFFIX = '-c'
+
+
+def market_of(code: str) -> str:
+    """按代码前缀划分市场分区"""
+    if code[:1] in ('6', '9'):
+        return 'sh'
+    if code[:1] in ('0', '2', '3'):
+        return 'sz'
+    if code[:1] in ('4', '8'):
+        return 'bj'
+    return 'other'
+
+
+class ColumnarStore:
+    """
+    列式日线存储 - 单例模式
+    """
+    
+    _instance: Optional['ColumnarStore'] = None
+    _instance_lock = threading.Lock()
+    
+    def __init__(self, root: Optional[str] = None, enabled: Optional[bool] = None):
+        """
+        初始化列式存储
+        
+        Args:
+            root: 存储目录（可选，默认从配置读取）
+            enabled: 是否启用（可选，默认从配置读取）
+        """
+        if root is None or enabled is None:
+            from config import get_config
+            config = get_config()
+            root = config.columnar_store_dir if root is None else root
+            enabled = config.columnar_store_enabled if enabled is None else enabled
+        
+        self.root = Path(root)
+        self.enabled = enabled
+        # 已有存储沿用 manifest 记录的格式，新建时优先 Parquet
+        self.format = self._read_manifest().get('format') or self._preferred_format()
+        self._counter = count()
+        # 同一进程内：写入 / 压缩同一分区互斥
+        self._partition_locks: Dict[Path, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        
+        if self.enabled and not self._format_supported(self.format):
+            logger.warning(f"[列式存储] 存储格式为 {self.format}，当前环境无法读取（未安装 pyarrow），"
+                           f"将回退到 SQLite，请执行 python columnar_store.py rebuild")
+        elif self.enabled and self.format == 'pickle':
+            logger.info("[列式存储] 使用 pickle 格式（安装 pyarrow 后执行 rebuild 可切换为 Parquet）")
+    
+    @staticmethod
+    def _preferred_format() -> str:
+        return 'parquet' if _PARQUET_AVAILABLE else 'pickle'
+    
+    @staticmethod
+    def _format_supported(fmt: str) -> bool:
+        return fmt == 'pickle' or (fmt == 'parquet' and _PARQUET_AVAILABLE)
+    
+    @property
+    def suffix(self) -> str:
+        return _SUFFIXES.get(self.format, '.pkl')
+    
+    @classmethod
+    def get_instance(cls) -> 'ColumnarStore':
+        """获取单例实例"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+    
+    @classmethod
+    def reset_instance(cls) -> None:
+        """重置单例（用于测试）"""
+        cls._instance = None
+    
+    # === 元数据 ===
+    
+    def _read_manifest(self) -> Dict[str, object]:
+        try:
+            return json.loads((self.root / _MANIFEST).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+    
+    def _write_manifest(self, manifest: Dict[str, object]) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._atomic_write(self.root / _MANIFEST, lambda path: Path(path).write_text(
+            json.dumps(manifest, ensure_ascii=False, indent=2), encoding='utf-8'
+        ))
+    
+    @property
+    def is_ready(self) -> bool:
+        """
+        已启用、已从 SQLite 全量同步过，且分片格式与本实例一致并可读取
+        （读取方据此决定是否使用列式存储）
+        """
+        if not self.enabled:
+            return False
+        manifest = self._read_manifest()
+        return (
+            bool(manifest.get('synced'))
+            and manifest.get('format') == self.format
+            and self._format_supported(self.format)
+        )
+    
+    def mark_unsynced(self, reason: str) -> None:
+        """
+        标记为未同步（同步写入失败、未启用期间 SQLite 有写入时调用）
+        
+        读取方回退到 SQLite，直到重新执行 rebuild；标记失败只记录日志
+        
+        Args:
+            reason: 原因（写入 manifest 并记录日志）
+        """
+        try:
+            manifest = self._read_manifest()
+            if not manifest.get('synced'):
+                return
+            manifest.update(synced=False, unsynced_at=datetime.now().isoformat(), unsynced_reason=reason)
+            self._write_manifest(manifest)
+        except OSError as e:
+            logger.warning(f"[列式存储] 标记未同步失败: {e}")
+            return
+        logger.warning(f"[列式存储] {reason}，已标记为未同步，请执行 python columnar_store.py rebuild 重新同步")
+    
+    # === 文件操作 ===
+    
+    def _partition_lock(self, partition: Path) -> threading.Lock:
+        with self._locks_lock:
+            lock = self._partition_locks.get(partition)
+            if lock is None:
+                lock = threading.Lock()
+                self._partition_locks[partition] = lock
+            return lock
+    
+    @staticmethod
+    def _part_order(path: Path):
+        """分片排序键：(序号, 是否压缩结果, 文件名)"""
+        stem = path.name[:-len(path.suffix)]
+        seq = stem.split('-', 1)[0]
+        return (int(seq) if seq.isdigit() else 0, stem.endswith(_COMPACTED_SUFFIX), stem)
+    
+    def _list_parts(self, partition: Path, all_formats: bool = False) -> List[Path]:
+        if not partition.is_dir():
+            return []
+        suffixes = set(_SUFFIXES.values()) if all_formats else {self.suffix}
+        return sorted((p for p in partition.iterdir() if p.suffix in suffixes), key=self._part_order)
+    
+    def _partitions(self, markets: Optional[Sequence[str]] = None,
+                    years: Optional[Sequence[int]] = None) -> List[Path]:
+        """列出分区目录（可按市场 / 年份过滤）"""
+        if not self.root.is_dir():
+            return []
+        result = []
+        for market_dir in sorted(p for p in self.root.iterdir() if p.is_dir()):
+            if markets is not None and market_dir.name not in markets:
+                continue
+            for year_dir in sorted(p for p in market_dir.iterdir() if p.is_dir() and p.name.isdigit()):
+                if years is None or int(year_dir.name) in years:
+                    result.append(year_dir)
+        return result
+    
+    @staticmethod
+    def _atomic_write(path: Path, writer) -> None:
+        """先写临时文件再原子替换，读取方不会看到半截文件"""
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        os.close(fd)
+        try:
+            writer(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
+    def _write_part(self, partition: Path, df: pd.DataFrame, seq: Optional[int] = None,
+                    compacted: bool = False) -> Path:
+        partition.mkdir(parents=True, exist_ok=True)
+        seq = time.time_ns() if seq is None else seq
+        name = f"{seq:020d}-{os.getpid()}-{next(self._counter)}"
+        if compacted:
+            name += _COMPACTED_SUFFIX
+        path = partition / f"{name}{self.suffix}"
+        df = df.reset_index(drop=True)
+        if self.suffix == '.parquet':
+            self._atomic_write(path, lambda tmp: df.to_parquet(tmp, index=False))
+        else:
+            self._atomic_write(path, df.to_pickle)
+        return path
+    
+    def _read_part(self, path: Path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        if path.suffix == '.parquet':
+            return pd.read_parquet(path, columns=columns, memory_map=True)
+        df = pd.read_pickle(path)
+        return df[columns] if columns is not None else df
+    
+    def _read_partition(self, partition: Path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        读取一个分区，结果按 (code, date) 升序
+        
+        - 只有一个压缩分片：本身有序，直接返回
+        - 多个分片：按 (code, date) 去重（后写入的优先）后排序
+        
+        压缩可能在读取期间删除旧分片，此时重新列出分片再读
+        """
+        for attempt in range(3):
+            parts = self._list_parts(partition)
+            try:
+                frames = [self._read_part(path, columns) for path in parts]
+                break
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise
+        if not frames:
+            return pd.DataFrame(columns=columns or list(COLUMNS))
+        if len(frames) == 1 and self._part_order(parts[0])[1]:
+            return frames[0]
+        df = pd.concat(frames, ignore_index=True).drop_duplicates(['code', 'date'], keep='last')
+        return df.sort_values(['code', 'date'], kind='stable', ignore_index=True)
+    
+    @staticmethod
+    def _merge(frames: List[pd.DataFrame], columns: List[str]) -> pd.DataFrame:
+        """
+        合并按年份升序排列的分区结果，输出按 (code, date) 升序
+        
+        各分区内部已按 (code, date) 有序、年份之间日期不重叠，
+        只需按 code 做一次稳定排序（整数编码后 argsort，比多列 sort_values 快得多）
+        """
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        if len(frames) == 1:
+            return frames[0].reset_index(drop=True)
+        df = pd.concat(frames, ignore_index=True)
+        codes, _ = pd.factorize(df['code'], sort=True)
+        return df.take(np.argsort(codes, kind='stable')).reset_index(drop=True)
+    
+    def _scan(
+        self,
+        start_date: Optional[date],
+        end_date: Optional[date],
+        codes: Optional[Sequence[str]],
+        columns: List[str]
+    ) -> List[pd.DataFrame]:
+        """读取并过滤涉及的分区（按 年份、市场 升序）"""
+        markets = sorted({market_of(code) for code in codes}) if codes is not None else None
+        years = None
+        if start_date is not None or end_date is not None:
+            first = start_date.year if start_date is not None else 1900
+            last = end_date.year if end_date is not None else 9999
+            years = range(first, last + 1)
+        
+        frames = []
+        partitions = sorted(self._partitions(markets, years), key=lambda p: (int(p.name), p.parent.name))
+        for partition in partitions:
+            df = self._read_partition(partition, columns)
+            mask = np.ones(len(df), dtype=bool)
+            if start_date is not None:
+                mask &= (df['date'] >= pd.Timestamp(start_date)).to_numpy()
+            if end_date is not None:
+                mask &= (df['date'] <= pd.Timestamp(end_date)).to_numpy()
+            if codes is not None:
+                mask &= df['code'].isin(codes).to_numpy()
+            frames.append(df if mask.all() else df[mask])
+        return frames
+    
+    # === 写入 ===
+    
+    @staticmethod
+    def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+        """统一列与类型：code 字符串、date 为 datetime64、数值列 float64"""
+        out = pd.DataFrame({'code': df['code'].astype(str), 'date': pd.to_datetime(df['date'])})
+        for col in VALUE_COLUMNS:
+            out[col] = pd.to_numeric(df[col], errors='coerce').astype(float) if col in df.columns else np.nan
+        out['data_source'] = df['data_source'].astype(object) if 'data_source' in df.columns else None
+        return out
+    
+    def write(self, df: pd.DataFrame) -> int:
+        """
+        写入日线数据（每个涉及的 市场/年份 分区追加一个分片）
+        
+        Args:
+            df: 包含 code/date 及数值列的长表（可包含多只股票、多个年份）
+        
+        Returns:
+            写入的行数
+        """
+        if not self.enabled or df is None or df.empty:
+            return 0
+        if not self._format_supported(self.format):
+            # 本次写入无法落盘：标记为未同步，等待 rebuild
+            self.mark_unsynced(f"存储格式 {self.format} 当前环境无法写入")
+            return 0
+        
+        df = self._normalize(df)
+        markets = df['code'].map(market_of)
+        years = df['date'].dt.year
+        for (market, year), group in df.groupby([markets, years], sort=False):
+            partition = self.root / market / str(year)
+            with self._partition_lock(partition):
+                self._write_part(partition, group)
+                if len(self._list_parts(partition)) > COMPACT_THRESHOLD:
+                    self._compact_partition(partition)
+        return len(df)
+    
+    def rebuild(self) -> int:
+        """
+        从 SQLite 全量重建（逐年导出，写入新分片后删除旧分片）
+        
+        重建时切换到当前环境的首选格式（已安装 pyarrow 时为 Parquet），旧格式的分片一并删除
+        
+        Returns:
+            导出的行数
+        """
+        from storage import get_db
+        
+        db = get_db()
+        bounds = db.get_daily_date_bounds()
+        old_parts = {partition: self._list_parts(partition, all_formats=True) for partition in self._partitions()}
+        self.format = self._preferred_format()
+        manifest = {'synced': False, 'format': self.format}
+        self._write_manifest(manifest)
+        if bounds is None:
+            manifest.update(synced=True, rebuilt_at=datetime.now().isoformat(), rows=0)
+            self._write_manifest(manifest)
+            self._remove_parts(old_parts)
+            return 0
+        
+        total = 0
+        for year in range(bounds[0].year, bounds[1].year + 1):
+            df = db.get_daily_frame_between(date(year, 1, 1), date(year, 12, 31))
+            if df.empty:
+                continue
+            df = self._normalize(df)
+            for market, group in df.groupby(df['code'].map(market_of), sort=False):
+                partition = self.root / market / str(year)
+                with self._partition_lock(partition):
+                    self._write_part(partition, group.sort_values(['code', 'date']), compacted=True)
+            total += len(df)
+            logger.info(f"[列式存储] 导出 {year} 年: {len(df)} 行")
+        
+        self._remove_parts(old_parts)
+        
+        manifest.update(synced=True, rebuilt_at=datetime.now().isoformat(), rows=total)
+        self._write_manifest(manifest)
+        logger.info(f"[列式存储] 重建完成: {total} 行")
+        return total
+    
+    @staticmethod
+    def _remove_parts(parts_by_partition: Dict[Path, List[Path]]) -> None:
+        for parts in parts_by_partition.values():
+            for path in parts:
+                path.unlink(missing_ok=True)
+    
+    # === 压缩 ===
+    
+    def _compact_partition(self, partition: Path) -> bool:
+        """合并分区内所有分片（调用方持有分区锁）"""
+        parts = self._list_parts(partition)
+        if not parts or (len(parts) == 1 and self._part_order(parts[0])[1]):
+            return False
+        frames = [self._read_part(path) for path in parts]
+        df = pd.concat(frames, ignore_index=True).drop_duplicates(['code', 'date'], keep='last')
+        df = df.sort_values(['code', 'date'], kind='stable')
+        seq = self._part_order(parts[-1])[0]
+        self._write_part(partition, df, seq=seq, compacted=True)
+        for path in parts:
+            path.unlink(missing_ok=True)
+        logger.debug(f"[列式存储] 压缩 {partition}: {len(parts)} 个分片 -> 1 个，{len(df)} 行")
+        return True
+    
+    def compact(self, min_parts: int = 2) -> int:
+        """
+        压缩分片数不少于 min_parts 的分区（只有一个未压缩分片的分区也会排序后标记为已压缩）
+        
+        Returns:
+            压缩的分区数
+        """
+        compacted = 0
+        for partition in self._partitions():
+            parts = self._list_parts(partition)
+            if len(parts) < min_parts and all(self._part_order(path)[1] for path in parts):
+                continue
+            with self._partition_lock(partition):
+                if self._compact_partition(partition):
+                    compacted += 1
+        return compacted
+    
+    # === 读取 ===
+    
+    @staticmethod
+    def _wanted_columns(columns: Optional[Sequence[str]]) -> List[str]:
+        return ['code', 'date'] + [col for col in (columns or COLUMNS) if col not in ('code', 'date')]
+    
+    def read_frame(
+        self,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        codes: Optional[Sequence[str]] = None,
+        columns: Optional[Sequence[str]] = None
+    ) -> pd.DataFrame:
+        """
+        范围读取（长表）
+        
+        只读取日期区间涉及的年份分区和代码涉及的市场分区
+        
+        Args:
+            start_date / end_date: 日期区间（含，可选）
+            codes: 股票代码（可选，默认全部）
+            columns: 需要的数值列（可选，默认全部；code/date 总是返回）
+        
+        Returns:
+            按 (code, date) 升序排列的 DataFrame
+        """
+        wanted = self._wanted_columns(columns)
+        return self._merge(self._scan(start_date, end_date, codes, wanted), wanted)
+    
+    def read_columns(self, *args, **kwargs) -> Dict[str, np.ndarray]:
+        """范围读取，返回 {列名: 数组}（参数同 read_frame）"""
+        df = self.read_frame(*args, **kwargs)
+        return {col: df[col].to_numpy() for col in df.columns}
+    
+    def read_recent(
+        self,
+        days: int,
+        end_date: Optional[date] = None,
+        codes: Optional[Sequence[str]] = None,
+        columns: Optional[Sequence[str]] = None
+    ) -> pd.DataFrame:
+        """
+        读取最近 days 个交易日（与 DatabaseManager.get_daily_panel_frame 的口径一致）
+        
+        从最近的年份往前读，直到累计的去重交易日数量足够
+        """
+        wanted = self._wanted_columns(columns)
+        last_year = end_date.year if end_date is not None else None
+        all_years = sorted({int(p.name) for p in self._partitions()}, reverse=True)
+        frames: List[pd.DataFrame] = []
+        dates: List[np.ndarray] = []
+        for year in all_years:
+            if last_year is not None and year > last_year:
+                continue
+            year_end = date(year, 12, 31) if end_date is None else min(end_date, date(year, 12, 31))
+            year_frames = self._scan(date(year, 1, 1), year_end, codes, wanted)
+            frames = year_frames + frames
+            dates.extend(df['date'].unique() for df in year_frames)
+            if len(np.unique(np.concatenate(dates))) >= days:
+                break
+        
+        if dates:
+            recent = np.unique(np.concatenate(dates))
+            if len(recent) > days:
+                cutoff = recent[-days]
+                frames = [df[(df['date'] >= cutoff).to_numpy()] for df in frames]
+        return self._merge(frames, wanted)
+    
+    def stats(self) -> pd.DataFrame:
+        """分区统计：市场、年份、分片数、文件大小（MB）"""
+        rows = []
+        for partition in self._partitions():
+            parts = self._list_parts(partition)
+            rows.append({
+                'market': partition.parent.name,
+                'year': int(partition.name),
+                'parts': len(parts),
+                'size_mb': round(sum(p.stat().st_size for p in parts) / 1024 / 1024, 2),
+            })
+        return pd.DataFrame(rows, columns=['market', 'year', 'parts', 'size_mb'])
+
+
+def get_columnar_store() -> ColumnarStore:
+    """获取列式存储实例的快捷方式"""
+    return ColumnarStore.get_instance()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='列式日线存储维护')
+    parser.add_argument('command', choices=['rebuild', 'compact', 'stats'], help='rebuild: 从 SQLite 全量导出；compact: 压缩分区；stats: 分区统计')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)-8s | %(message)s')
+    
+    # 维护命令不受 COLUMNAR_STORE_ENABLED 限制
+    store = get_columnar_store()
+    store.enabled = True
+    
+    if args.command == 'rebuild':
+        store.rebuild()
+    elif args.command == 'compact':
+        print(f"压缩分区: {store.compact()} 个")
+    print(store.stats().to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -95,6 +95,44 @@ class Config:
     # === 数据库配置 ===
     database_path: str = "./data/stock_analysis.db"
     
+    # 异步写入队列（获取到的日线由后台线程合并批量写入，获取与写入重叠进行）
+    write_behind_enabled: bool = False
+    write_behind_queue_size: int = 64      # 队列中最多缓存的股票数（满时获取线程等待）
+    write_behind_batch_rows: int = 20000   # 单次批量写入的目标行数
+    write_behind_wait_timeout: float = 60.0  # 分析前等待本股票数据落库的最长时间（秒），超时直接读取数据库已有数据
+    
+    # 分析结果复用（增强上下文 + 新闻情报完全相同时返回已保存的结果，不再调用大模型）
+    analysis_cache_enabled: bool = True
+    
+    # 按股票缓存最近 K 线的股票数（进程内 LRU，0 表示关闭）
+    bar_cache_size: int = 512
+    
+    # SQLite 并发参数（WAL 模式下读写互不阻塞，写操作由单写线程排队执行）
+    sqlite_wal_enabled: bool = True
+    sqlite_busy_timeout: float = 30.0  # 等待锁的最长时间（秒）
+    sqlite_cache_size_mb: int = 64
+    sqlite_mmap_size_mb: int = 256
+    
+    # 列式日线存储（按 市场/年份 分区的 Parquet，全市场读取用；需先执行 python columnar_store.py rebuild）
+    columnar_store_enabled: bool = False
+    columnar_store_dir: str = "./data/columnar"
+    
+    # 全市场 OHLCV 内存映射立方体（扫描 / 回测加载面板用；需先执行 python ohlcv_cube.py build）
+    ohlcv_cube_enabled: bool = False
+    ohlcv_cube_dir: str = "./data/cube"
+    
+    # 数据源原始响应缓存（历史区间永久有效，当日区间按 TTL 过期）
+    raw_cache_enabled: bool = True
+    raw_cache_dir: str = "./data/raw_cache"
+    raw_cache_ttl: int = 300  # 当日区间缓存有效期（秒）
+    
+    # 录制 / 回放（离线运行与基准测试）：off / record / replay
+    replay_mode: str = "off"
+    replay_dir: str = "./data/replay"
+    replay_latency_scale: float = 0.0  # 回放时按录制耗时的倍数休眠
+    replay_failure_rate: float = 0.0  # 回放时随机注入失败的概率
+    replay_seed: int = 0
+    
     # === 日志配置 ===
     log_dir: str = "./logs"  # 日志文件目录
     log_level: str = "INFO"  # 日志级别
@@ -116,6 +154,40 @@ class Config:
     # Tushare 每分钟最大请求数（免费配额）
     tushare_rate_limit_per_minute: int = 80
     
+    # 按上游主机的令牌桶限流（所有 Fetcher 实例和工作线程共享）
+    # rate: 每秒请求数；burst: 允许的瞬时突发请求数
+    eastmoney_rate_limit: float = 0.5  # 东方财富（akshare / efinance / 行情快照 / VCP 扫描）
+    eastmoney_rate_burst: int = 2
+    baostock_rate_limit: float = 2.0
+    baostock_rate_burst: int = 5
+    yahoo_rate_limit: float = 1.0
+    yahoo_rate_burst: int = 3
+    
+    # 数据源熔断：连续失败 N 次后跳过该数据源一段冷却时间（秒）
+    circuit_breaker_failures: int = 3
+    circuit_breaker_cooldown: float = 300.0
+    source_health_window: int = 20  # 健康度统计的滚动窗口（最近 N 次请求）
+    
+    # 对冲请求：主数据源超过延迟阈值未返回时，同时请求下一个健康的数据源
+    hedged_requests_enabled: bool = False
+    hedge_delay_percentile: float = 95.0  # 延迟阈值取主数据源历史耗时的百分位
+    hedge_min_delay: float = 2.0  # 最小延迟阈值（秒），无历史耗时时使用
+    hedge_budget_ratio: float = 0.2  # 对冲请求数占总请求数的上限
+    
+    # 增量获取：只请求本地最后一根 K 线之后的数据（重叠 N 根用于捕获修订）
+    incremental_fetch_enabled: bool = True
+    incremental_overlap_bars: int = 3
+    
+    # 全市场实时行情快照缓存有效期（秒），多个模块共享同一份快照
+    spot_snapshot_ttl: int = 60
+    
+    # VCP 全市场扫描：基于本地 stock_daily 历史数据一次性向量化筛选
+    vcp_history_days: int = 250  # 加载的交易日数量（VCP 趋势模板至少需要 170 个）
+    vcp_min_local_codes: int = 300  # 本地有历史数据的股票少于该数量时回退到逐只联网扫描
+    
+    # RS 评级：可参与评级的股票少于该数量时（如本地只有自选股）不计算、不保存全市场评级
+    rs_min_universe: int = 300
+    
     # 重试配置
     max_retries: int = 3
     retry_base_delay: float = 1.0
@@ -212,6 +284,28 @@ class Config:
             feishu_max_bytes=int(os.getenv('FEISHU_MAX_BYTES', '20000')),
             wechat_max_bytes=int(os.getenv('WECHAT_MAX_BYTES', '4000')),
             database_path=os.getenv('DATABASE_PATH', './data/stock_analysis.db'),
+            write_behind_enabled=os.getenv('WRITE_BEHIND_ENABLED', 'false').lower() == 'true',
+            write_behind_queue_size=int(os.getenv('WRITE_BEHIND_QUEUE_SIZE', '64')),
+            write_behind_batch_rows=int(os.getenv('WRITE_BEHIND_BATCH_ROWS', '20000')),
+            write_behind_wait_timeout=float(os.getenv('WRITE_BEHIND_WAIT_TIMEOUT', '60')),
+            analysis_cache_enabled=os.getenv('ANALYSIS_CACHE_ENABLED', 'true').lower() == 'true',
+            bar_cache_size=int(os.getenv('BAR_CACHE_SIZE', '512')),
+            sqlite_wal_enabled=os.getenv('SQLITE_WAL_ENABLED', 'true').lower() == 'true',
+            sqlite_busy_timeout=float(os.getenv('SQLITE_BUSY_TIMEOUT', '30')),
+            sqlite_cache_size_mb=int(os.getenv('SQLITE_CACHE_SIZE_MB', '64')),
+            sqlite_mmap_size_mb=int(os.getenv('SQLITE_MMAP_SIZE_MB', '256')),
+            columnar_store_enabled=os.getenv('COLUMNAR_STORE_ENABLED', 'false').lower() == 'true',
+            columnar_store_dir=os.getenv('COLUMNAR_STORE_DIR', './data/columnar'),
+            ohlcv_cube_enabled=os.getenv('OHLCV_CUBE_ENABLED', 'false').lower() == 'true',
+            ohlcv_cube_dir=os.getenv('OHLCV_CUBE_DIR', './data/cube'),
+            raw_cache_enabled=os.getenv('RAW_CACHE_ENABLED', 'true').lower() == 'true',
+            raw_cache_dir=os.getenv('RAW_CACHE_DIR', './data/raw_cache'),
+            raw_cache_ttl=int(os.getenv('RAW_CACHE_TTL', '300')),
+            replay_mode=os.getenv('REPLAY_MODE', 'off'),
+            replay_dir=os.getenv('REPLAY_DIR', './data/replay'),
+            replay_latency_scale=float(os.getenv('REPLAY_LATENCY_SCALE', '0')),
+            replay_failure_rate=float(os.getenv('REPLAY_FAILURE_RATE', '0')),
+            replay_seed=int(os.getenv('REPLAY_SEED', '0')),
             log_dir=os.getenv('LOG_DIR', './logs'),
             log_level=os.getenv('LOG_LEVEL', 'INFO'),
             max_workers=int(os.getenv('MAX_WORKERS', '3')),
@@ -219,6 +313,26 @@ class Config:
             schedule_enabled=os.getenv('SCHEDULE_ENABLED', 'false').lower() == 'true',
             schedule_time=os.getenv('SCHEDULE_TIME', '18:00'),
             market_review_enabled=os.getenv('MARKET_REVIEW_ENABLED', 'true').lower() == 'true',
+            tushare_rate_limit_per_minute=int(os.getenv('TUSHARE_RATE_LIMIT_PER_MINUTE', '80')),
+            eastmoney_rate_limit=float(os.getenv('EASTMONEY_RATE_LIMIT', '0.5')),
+            eastmoney_rate_burst=int(os.getenv('EASTMONEY_RATE_BURST', '2')),
+            baostock_rate_limit=float(os.getenv('BAOSTOCK_RATE_LIMIT', '2.0')),
+            baostock_rate_burst=int(os.getenv('BAOSTOCK_RATE_BURST', '5')),
+            yahoo_rate_limit=float(os.getenv('YAHOO_RATE_LIMIT', '1.0')),
+            yahoo_rate_burst=int(os.getenv('YAHOO_RATE_BURST', '3')),
+            circuit_breaker_failures=int(os.getenv('CIRCUIT_BREAKER_FAILURES', '3')),
+            circuit_breaker_cooldown=float(os.getenv('CIRCUIT_BREAKER_COOLDOWN', '300')),
+            source_health_window=int(os.getenv('SOURCE_HEALTH_WINDOW', '20')),
+            hedged_requests_enabled=os.getenv('HEDGED_REQUESTS_ENABLED', 'false').lower() == 'true',
+            hedge_delay_percentile=float(os.getenv('HEDGE_DELAY_PERCENTILE', '95')),
+            hedge_min_delay=float(os.getenv('HEDGE_MIN_DELAY', '2.0')),
+            hedge_budget_ratio=float(os.getenv('HEDGE_BUDGET_RATIO', '0.2')),
+            incremental_fetch_enabled=os.getenv('INCREMENTAL_FETCH_ENABLED', 'true').lower() == 'true',
+            incremental_overlap_bars=int(os.getenv('INCREMENTAL_OVERLAP_BARS', '3')),
+            spot_snapshot_ttl=int(os.getenv('SPOT_SNAPSHOT_TTL', '60')),
+            vcp_history_days=int(os.getenv('VCP_HISTORY_DAYS', '250')),
+            vcp_min_local_codes=int(os.getenv('VCP_MIN_LOCAL_CODES', '300')),
+            rs_min_universe=int(os.getenv('RS_MIN_UNIVERSE', '300')),
             webui_enabled=os.getenv('WEBUI_ENABLED', 'false').lower() == 'true',
             webui_host=os.getenv('WEBUI_HOST', '127.0.0.1'),
             webui_port=int(os.getenv('WEBUI_PORT', '8000')),
@@ -23,6 +23,8 @@ from .akshare_fetcher import AkshareFetcher
 from .tushare_fetcher import TushareFetcher
 from .baostock_fetcher import BaostockFetcher
 from .yfinance_fetcher import YfinanceFetcher
+from .spot_snapshot import SpotSnapshotService, get_spot_snapshot_service
+from .rate_limiter import TokenBucket, get_rate_limiter
 
 __all__ = [
     'BaseFetcher',
@@ -32,4 +34,8 @@ __all__ = [
     'TushareFetcher',
     'BaostockFetcher',
     'YfinanceFetcher',
+    'SpotSnapshotService',
+    'get_spot_snapshot_service',
+    'TokenBucket',
+    'get_rate_limiter',
 ]
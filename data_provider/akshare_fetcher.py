@@ -9,7 +9,7 @@ AkshareFetcher - 主数据源 (Priority 1)
 风险：爬虫机制易被反爬封禁
 
 防封禁策略：
-1. 每次请求前随机休眠 2-5 秒
+1. 请求前从东方财富共享令牌桶获取令牌（所有实例、所有线程共用一个限流器）
 2. 随机轮换 User-Agent
 3. 使用 tenacity 实现指数退避重试
 
@@ -34,7 +34,18 @@ from tenacity import (
     before_sleep_log,
 )
 
-from .base import BaseFetcher, DataFetchError, RateLimitError, STANDARD_COLUMNS
+from .base import (
+    BaseFetcher, DataFetchError, RateLimitError, STANDARD_COLUMNS,
+    cancellable_sleep, stop_if_fetch_cancelled,
+)
+from .rate_limiter import HOST_EASTMONEY
+from .replay import get_replay_harness
+from .spot_snapshot import (
+    SNAPSHOT_A_SHARE,
+    SNAPSHOT_ETF,
+    SNAPSHOT_HK,
+    get_spot_snapshot_service,
+)
 
 
 @dataclass
@@ -181,21 +192,6 @@ USER_AGENTS = [
 ]
 
 
-# 缓存实时行情数据（避免重复请求）
-_realtime_cache: Dict[str, Any] = {
-    'data': None,
-    'timestamp': 0,
-    'ttl': 60  # 60秒缓存有效期
-}
-
-# ETF 实时行情缓存
-_etf_realtime_cache: Dict[str, Any] = {
-    'data': None,
-    'timestamp': 0,
-    'ttl': 60  # 60秒缓存有效期
-}
-
-
 def _is_etf_code(stock_code: str) -> bool:
     """
     判断代码是否为 ETF 基金
@@ -246,25 +242,18 @@ class AkshareFetcher(BaseFetcher):
     数据来源：东方财富网爬虫
     
     关键策略：
-    - 每次请求前随机休眠 2.0-5.0 秒
+    - 请求前获取东方财富共享令牌桶的令牌
     - 随机 User-Agent 轮换
     - 失败后指数退避重试（最多3次）
     """
     
     name = "AkshareFetcher"
     priority = 1
+    rate_limit_host = HOST_EASTMONEY
     
-    def __init__(self, sleep_min: float = 2.0, sleep_max: float = 5.0):
-        """
-        初始化 AkshareFetcher
-        
-        Args:
-            sleep_min: 最小休眠时间（秒）
-            sleep_max: 最大休眠时间（秒）
-        """
-        self.sleep_min = sleep_min
-        self.sleep_max = sleep_max
-        self._last_request_time: Optional[float] = None
+    def __init__(self):
+        """初始化 AkshareFetcher"""
+        pass
     
     def _set_random_user_agent(self) -> None:
         """
@@ -282,32 +271,12 @@ class AkshareFetcher(BaseFetcher):
         except Exception as e:
             logger.debug(f"设置 User-Agent 失败: {e}")
     
-    def _enforce_rate_limit(self) -> None:
-        """
-        强制执行速率限制
-        
-        策略：
-        1. 检查距离上次请求的时间间隔
-        2. 如果间隔不足，补充休眠时间
-        3. 然后再执行随机 jitter 休眠
-        """
-        if self._last_request_time is not None:
-            elapsed = time.time() - self._last_request_time
-            min_interval = self.sleep_min
-            if elapsed < min_interval:
-                additional_sleep = min_interval - elapsed
-                logger.debug(f"补充休眠 {additional_sleep:.2f} 秒")
-                time.sleep(additional_sleep)
-        
-        # 执行随机 jitter 休眠
-        self.random_sleep(self.sleep_min, self.sleep_max)
-        self._last_request_time = time.time()
-    
     @retry(
-        stop=stop_after_attempt(3),  # 最多重试3次
+        stop=(stop_after_attempt(3) | stop_if_fetch_cancelled),  # 最多重试3次
         wait=wait_exponential(multiplier=1, min=2, max=30),  # 指数退避：2, 4, 8... 最大30秒
         retry=retry_if_exception_type((ConnectionError, TimeoutError)),
         before_sleep=before_sleep_log(logger, logging.WARNING),
+        sleep=cancellable_sleep,  # 对冲请求被取消时立即结束退避等待
     )
     def _fetch_raw_data(self, stock_code: str, start_date: str, end_date: str) -> pd.DataFrame:
         """
@@ -343,8 +312,8 @@ class AkshareFetcher(BaseFetcher):
         # 防封禁策略 1: 随机 User-Agent
         self._set_random_user_agent()
         
-        # 防封禁策略 2: 强制休眠
-        self._enforce_rate_limit()
+        # 防封禁策略 2: 按上游主机限流
+        self._acquire_rate_limit()
         
         logger.info(f"[API调用] ak.stock_zh_a_hist(symbol={stock_code}, period=daily, "
                    f"start_date={start_date.replace('-', '')}, end_date={end_date.replace('-', '')}, adjust=qfq)")
@@ -406,8 +375,8 @@ class AkshareFetcher(BaseFetcher):
         # 防封禁策略 1: 随机 User-Agent
         self._set_random_user_agent()
         
-        # 防封禁策略 2: 强制休眠
-        self._enforce_rate_limit()
+        # 防封禁策略 2: 按上游主机限流
+        self._acquire_rate_limit()
         
         logger.info(f"[API调用] ak.fund_etf_hist_em(symbol={stock_code}, period=daily, "
                    f"start_date={start_date.replace('-', '')}, end_date={end_date.replace('-', '')}, adjust=qfq)")
@@ -467,8 +436,8 @@ class AkshareFetcher(BaseFetcher):
         # 防封禁策略 1: 随机 User-Agent
         self._set_random_user_agent()
         
-        # 防封禁策略 2: 强制休眠
-        self._enforce_rate_limit()
+        # 防封禁策略 2: 按上游主机限流
+        self._acquire_rate_limit()
         
         # 确保代码格式正确（5位数字）
         code = stock_code.lower().replace('hk', '').zfill(5)
@@ -578,84 +547,38 @@ class AkshareFetcher(BaseFetcher):
         数据来源：ak.stock_zh_a_spot_em()
         包含：量比、换手率、市盈率、市净率、总市值、流通市值等
         """
-        import akshare as ak
-        
         try:
-            # 检查缓存
-            current_time = time.time()
-            if (_realtime_cache['data'] is not None and 
-                current_time - _realtime_cache['timestamp'] < _realtime_cache['ttl']):
-                df = _realtime_cache['data']
-                logger.debug(f"[缓存命中] 使用缓存的A股实时行情数据")
-            else:
-                last_error: Optional[Exception] = None
-                df = None
-                for attempt in range(1, 3):
-                    try:
-                        # 防封禁策略
-                        self._set_random_user_agent()
-                        self._enforce_rate_limit()
-
-                        logger.info(f"[API调用] ak.stock_zh_a_spot_em() 获取A股实时行情... (attempt {attempt}/2)")
-                        import time as _time
-                        api_start = _time.time()
-
-                        df = ak.stock_zh_a_spot_em()
-
-                        api_elapsed = _time.time() - api_start
-                        logger.info(f"[API返回] ak.stock_zh_a_spot_em 成功: 返回 {len(df)} 只股票, 耗时 {api_elapsed:.2f}s")
-                        break
-                    except Exception as e:
-                        last_error = e
-                        logger.warning(f"[API错误] ak.stock_zh_a_spot_em 获取失败 (attempt {attempt}/2): {e}")
-                        time.sleep(min(2 ** attempt, 5))
-
-                # 更新缓存：成功缓存数据；失败也缓存空数据，避免同一轮任务对同一接口反复请求
-                if df is None:
-                    logger.error(f"[API错误] ak.stock_zh_a_spot_em 最终失败: {last_error}")
-                    df = pd.DataFrame()
-                _realtime_cache['data'] = df
-                _realtime_cache['timestamp'] = current_time
-
-            if df is None or df.empty:
+            # 全市场快照由 SpotSnapshotService 统一缓存，多线程并发时只请求一次；
+            # 刷新后构建代码索引，此处为 O(1) 查询
+            index = get_spot_snapshot_service().get_index(SNAPSHOT_A_SHARE)
+            if len(index) == 0:
                 logger.warning(f"[实时行情] A股实时行情数据为空，跳过 {stock_code}")
                 return None
             
-            # 查找指定股票
-            row = df[df['代码'] == stock_code]
-            if row.empty:
+            def build(pos: int) -> RealtimeQuote:
+                return RealtimeQuote(
+                    code=stock_code,
+                    name=index.name(stock_code),
+                    price=index.get_float(pos, '最新价'),
+                    change_pct=index.get_float(pos, '涨跌幅'),
+                    change_amount=index.get_float(pos, '涨跌额'),
+                    volume_ratio=index.get_float(pos, '量比'),
+                    turnover_rate=index.get_float(pos, '换手率'),
+                    amplitude=index.get_float(pos, '振幅'),
+                    pe_ratio=index.get_float(pos, '市盈率-动态'),
+                    pb_ratio=index.get_float(pos, '市净率'),
+                    total_mv=index.get_float(pos, '总市值'),
+                    circ_mv=index.get_float(pos, '流通市值'),
+                    change_60d=index.get_float(pos, '60日涨跌幅'),
+                    high_52w=index.get_float(pos, '52周最高'),
+                    low_52w=index.get_float(pos, '52周最低'),
+                )
+            
+            quote = index.get_record('akshare', stock_code, build)
+            if quote is None:
                 logger.warning(f"[API返回] 未找到股票 {stock_code} 的实时行情")
                 return None
             
-            row = row.iloc[0]
-            
-            # 安全获取字段值
-            def safe_float(val, default=0.0):
-                try:
-                    if pd.isna(val):
-                        return default
-                    return float(val)
-                except:
-                    return default
-            
-            quote = RealtimeQuote(
-                code=stock_code,
-                name=str(row.get('名称', '')),
-                price=safe_float(row.get('最新价')),
-                change_pct=safe_float(row.get('涨跌幅')),
-                change_amount=safe_float(row.get('涨跌额')),
-                volume_ratio=safe_float(row.get('量比')),
-                turnover_rate=safe_float(row.get('换手率')),
-                amplitude=safe_float(row.get('振幅')),
-                pe_ratio=safe_float(row.get('市盈率-动态')),
-                pb_ratio=safe_float(row.get('市净率')),
-                total_mv=safe_float(row.get('总市值')),
-                circ_mv=safe_float(row.get('流通市值')),
-                change_60d=safe_float(row.get('60日涨跌幅')),
-                high_52w=safe_float(row.get('52周最高')),
-                low_52w=safe_float(row.get('52周最低')),
-            )
-            
             logger.info(f"[实时行情] {stock_code} {quote.name}: 价格={quote.price}, 涨跌={quote.change_pct}%, "
                        f"量比={quote.volume_ratio}, 换手率={quote.turnover_rate}%, "
                        f"PE={quote.pe_ratio}, PB={quote.pb_ratio}")
@@ -678,84 +601,37 @@ class AkshareFetcher(BaseFetcher):
         Returns:
             RealtimeQuote 对象，获取失败返回 None
         """
-        import akshare as ak
-        
         try:
-            # 检查缓存
-            current_time = time.time()
-            if (_etf_realtime_cache['data'] is not None and 
-                current_time - _etf_realtime_cache['timestamp'] < _etf_realtime_cache['ttl']):
-                df = _etf_realtime_cache['data']
-                logger.debug(f"[缓存命中] 使用缓存的ETF实时行情数据")
-            else:
-                last_error: Optional[Exception] = None
-                df = None
-                for attempt in range(1, 3):
-                    try:
-                        # 防封禁策略
-                        self._set_random_user_agent()
-                        self._enforce_rate_limit()
-
-                        logger.info(f"[API调用] ak.fund_etf_spot_em() 获取ETF实时行情... (attempt {attempt}/2)")
-                        import time as _time
-                        api_start = _time.time()
-
-                        df = ak.fund_etf_spot_em()
-
-                        api_elapsed = _time.time() - api_start
-                        logger.info(f"[API返回] ak.fund_etf_spot_em 成功: 返回 {len(df)} 只ETF, 耗时 {api_elapsed:.2f}s")
-                        break
-                    except Exception as e:
-                        last_error = e
-                        logger.warning(f"[API错误] ak.fund_etf_spot_em 获取失败 (attempt {attempt}/2): {e}")
-                        time.sleep(min(2 ** attempt, 5))
-
-                if df is None:
-                    logger.error(f"[API错误] ak.fund_etf_spot_em 最终失败: {last_error}")
-                    df = pd.DataFrame()
-                _etf_realtime_cache['data'] = df
-                _etf_realtime_cache['timestamp'] = current_time
-
-            if df is None or df.empty:
+            index = get_spot_snapshot_service().get_index(SNAPSHOT_ETF)
+            if len(index) == 0:
                 logger.warning(f"[实时行情] ETF实时行情数据为空，跳过 {stock_code}")
                 return None
             
-            # 查找指定 ETF
-            row = df[df['代码'] == stock_code]
-            if row.empty:
+            # ETF 行情数据构建（部分字段 ETF 可能不支持，使用默认值）
+            def build(pos: int) -> RealtimeQuote:
+                return RealtimeQuote(
+                    code=stock_code,
+                    name=index.name(stock_code),
+                    price=index.get_float(pos, '最新价'),
+                    change_pct=index.get_float(pos, '涨跌幅'),
+                    change_amount=index.get_float(pos, '涨跌额'),
+                    volume_ratio=index.get_float(pos, '量比'),  # ETF 可能无量比
+                    turnover_rate=index.get_float(pos, '换手率'),
+                    amplitude=index.get_float(pos, '振幅'),
+                    pe_ratio=0.0,  # ETF 通常无市盈率
+                    pb_ratio=0.0,  # ETF 通常无市净率
+                    total_mv=index.get_float(pos, '总市值'),
+                    circ_mv=index.get_float(pos, '流通市值'),
+                    change_60d=0.0,  # ETF 接口可能不提供
+                    high_52w=index.get_float(pos, '52周最高'),
+                    low_52w=index.get_float(pos, '52周最低'),
+                )
+            
+            quote = index.get_record('akshare', stock_code, build)
+            if quote is None:
                 logger.warning(f"[API返回] 未找到 ETF {stock_code} 的实时行情")
                 return None
             
-            row = row.iloc[0]
-            
-            # 安全获取字段值
-            def safe_float(val, default=0.0):
-                try:
-                    if pd.isna(val):
-                        return default
-                    return float(val)
-                except:
-                    return default
-            
-            # ETF 行情数据构建（部分字段 ETF 可能不支持，使用默认值）
-            quote = RealtimeQuote(
-                code=stock_code,
-                name=str(row.get('名称', '')),
-                price=safe_float(row.get('最新价')),
-                change_pct=safe_float(row.get('涨跌幅')),
-                change_amount=safe_float(row.get('涨跌额')),
-                volume_ratio=safe_float(row.get('量比', 0)),  # ETF 可能无量比
-                turnover_rate=safe_float(row.get('换手率')),
-                amplitude=safe_float(row.get('振幅')),
-                pe_ratio=0.0,  # ETF 通常无市盈率
-                pb_ratio=0.0,  # ETF 通常无市净率
-                total_mv=safe_float(row.get('总市值', 0)),
-                circ_mv=safe_float(row.get('流通市值', 0)),
-                change_60d=0.0,  # ETF 接口可能不提供
-                high_52w=safe_float(row.get('52周最高', 0)),
-                low_52w=safe_float(row.get('52周最低', 0)),
-            )
-            
             logger.info(f"[ETF实时行情] {stock_code} {quote.name}: 价格={quote.price}, 涨跌={quote.change_pct}%, "
                        f"换手率={quote.turnover_rate}%")
             return quote
@@ -777,60 +653,40 @@ class AkshareFetcher(BaseFetcher):
         Returns:
             RealtimeQuote 对象，获取失败返回 None
         """
-        import akshare as ak
-        
         try:
-            # 防封禁策略
-            self._set_random_user_agent()
-            self._enforce_rate_limit()
-            
             # 确保代码格式正确（5位数字）
             code = stock_code.lower().replace('hk', '').zfill(5)
             
-            logger.info(f"[API调用] ak.stock_hk_spot_em() 获取港股实时行情...")
-            import time as _time
-            api_start = _time.time()
-            
-            df = ak.stock_hk_spot_em()
-            
-            api_elapsed = _time.time() - api_start
-            logger.info(f"[API返回] ak.stock_hk_spot_em 成功: 返回 {len(df)} 只港股, 耗时 {api_elapsed:.2f}s")
-            
-            # 查找指定港股
-            row = df[df['代码'] == code]
-            if row.empty:
-                logger.warning(f"[API返回] 未找到港股 {code} 的实时行情")
+            index = get_spot_snapshot_service().get_index(SNAPSHOT_HK)
+            if len(index) == 0:
+                logger.warning(f"[实时行情] 港股实时行情数据为空，跳过 {stock_code}")
                 return None
             
-            row = row.iloc[0]
-            
-            # 安全获取字段值
-            def safe_float(val, default=0.0):
-                try:
-                    if pd.isna(val):
-                        return default
-                    return float(val)
-                except:
-                    return default
-            
             # 港股行情数据构建
-            quote = RealtimeQuote(
-                code=stock_code,
-                name=str(row.get('名称', '')),
-                price=safe_float(row.get('最新价')),
-                change_pct=safe_float(row.get('涨跌幅')),
-                change_amount=safe_float(row.get('涨跌额')),
-                volume_ratio=safe_float(row.get('量比', 0)),  # 港股可能无量比
-                turnover_rate=safe_float(row.get('换手率', 0)),
-                amplitude=safe_float(row.get('振幅', 0)),
-                pe_ratio=safe_float(row.get('市盈率', 0)),  # 港股可能有市盈率
-                pb_ratio=safe_float(row.get('市净率', 0)),  # 港股可能有市净率
-                total_mv=safe_float(row.get('总市值', 0)),
-                circ_mv=safe_float(row.get('流通市值', 0)),
-                change_60d=0.0,  # 港股接口可能不提供
-                high_52w=safe_float(row.get('52周最高', 0)),
-                low_52w=safe_float(row.get('52周最低', 0)),
-            )
+            def build(pos: int) -> RealtimeQuote:
+                return RealtimeQuote(
+                    code=stock_code,
+                    name=index.name(code),
+                    price=index.get_float(pos, '最新价'),
+                    change_pct=index.get_float(pos, '涨跌幅'),
+                    change_amount=index.get_float(pos, '涨跌额'),
+                    volume_ratio=index.get_float(pos, '量比'),  # 港股可能无量比
+                    turnover_rate=index.get_float(pos, '换手率'),
+                    amplitude=index.get_float(pos, '振幅'),
+                    pe_ratio=index.get_float(pos, '市盈率'),  # 港股可能有市盈率
+                    pb_ratio=index.get_float(pos, '市净率'),  # 港股可能有市净率
+                    total_mv=index.get_float(pos, '总市值'),
+                    circ_mv=index.get_float(pos, '流通市值'),
+                    change_60d=0.0,  # 港股接口可能不提供
+                    high_52w=index.get_float(pos, '52周最高'),
+                    low_52w=index.get_float(pos, '52周最低'),
+                )
+            
+            # 同一港股可能以 'hk00700' / '00700' 等不同写法查询，按原始代码缓存
+            quote = index.get_record(f'akshare:{stock_code}', code, build)
+            if quote is None:
+                logger.warning(f"[API返回] 未找到港股 {code} 的实时行情")
+                return None
             
             logger.info(f"[港股实时行情] {stock_code} {quote.name}: 价格={quote.price}, 涨跌={quote.change_pct}%, "
                        f"换手率={quote.turnover_rate}%")
@@ -865,13 +721,13 @@ class AkshareFetcher(BaseFetcher):
         try:
             # 防封禁策略
             self._set_random_user_agent()
-            self._enforce_rate_limit()
+            self._acquire_rate_limit()
             
             logger.info(f"[API调用] ak.stock_cyq_em(symbol={stock_code}) 获取筹码分布...")
             import time as _time
             api_start = _time.time()
             
-            df = ak.stock_cyq_em(symbol=stock_code)
+            df = get_replay_harness().call('chip', stock_code, (), lambda: ak.stock_cyq_em(symbol=stock_code))
             
             api_elapsed = _time.time() - api_start
             
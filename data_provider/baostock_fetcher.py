@@ -28,7 +28,11 @@ from tenacity import (
     before_sleep_log,
 )
 
-from .base import BaseFetcher, DataFetchError, STANDARD_COLUMNS
+from .base import (
+    BaseFetcher, DataFetchError, STANDARD_COLUMNS,
+    cancellable_sleep, stop_if_fetch_cancelled,
+)
+from .rate_limiter import HOST_BAOSTOCK
 
 logger = logging.getLogger(__name__)
 
@@ -53,6 +57,7 @@ class BaostockFetcher(BaseFetcher):
     
     name = "BaostockFetcher"
     priority = 3
+    rate_limit_host = HOST_BAOSTOCK
     
     def __init__(self):
         """初始化 BaostockFetcher"""
@@ -141,10 +146,11 @@ class BaostockFetcher(BaseFetcher):
             return f"sz.{code}"
     
     @retry(
-        stop=stop_after_attempt(3),
+        stop=(stop_after_attempt(3) | stop_if_fetch_cancelled),
         wait=wait_exponential(multiplier=1, min=2, max=30),
         retry=retry_if_exception_type((ConnectionError, TimeoutError)),
         before_sleep=before_sleep_log(logger, logging.WARNING),
+        sleep=cancellable_sleep,  # 对冲请求被取消时立即结束退避等待
     )
     def _fetch_raw_data(self, stock_code: str, start_date: str, end_date: str) -> pd.DataFrame:
         """
@@ -161,6 +167,9 @@ class BaostockFetcher(BaseFetcher):
         # 转换代码格式
         bs_code = self._convert_stock_code(stock_code)
         
+        # 按上游主机限流（所有线程共享）
+        self._acquire_rate_limit()
+        
         logger.debug(f"调用 Baostock query_history_k_data_plus({bs_code}, {start_date}, {end_date})")
         
         with self._baostock_session() as bs:
@@ -9,17 +9,18 @@
 - DataFetcherManager: 策略管理器，实现自动切换
 
 防封禁策略：
-1. 每个 Fetcher 内置流控逻辑
+1. 按上游主机共享令牌桶限流（见 rate_limiter）
 2. 失败自动切换到下一个数据源
 3. 指数退避重试机制
 """
 
 import logging
-import random
+import threading
 import time
 from abc import ABC, abstractmethod
-from datetime import datetime
-from typing import Optional, List, Tuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, date, timedelta
+from typing import Any, Dict, Optional, List, Tuple
 
 import pandas as pd
 import numpy as np
@@ -30,6 +31,12 @@ from tenacity import (
     retry_if_exception_type,
 )
 
+from indicators import compute_indicators
+
+from .rate_limiter import get_rate_limiter
+from .raw_cache import get_raw_cache
+from .source_health import STATE_OPEN, RequestTicket, SourceHealth
+
 # 配置日志
 logger = logging.getLogger(__name__)
 
@@ -37,6 +44,15 @@ logger = logging.getLogger(__name__)
 # === 标准化列名定义 ===
 STANDARD_COLUMNS = ['date', 'open', 'high', 'low', 'close', 'volume', 'amount', 'pct_chg']
 
+# 增量获取时拼接的本地历史条数（覆盖 MA20 的计算窗口）
+INDICATOR_WARMUP_BARS = 30
+
+# 增量获取时读取的本地历史条数（覆盖指标状态重建所需的 MA60 / EMA50 预热窗口）
+INDICATOR_HISTORY_BARS = 120
+
+# 增量获取时重叠区间收盘价允许的相对误差，超过视为复权修订
+REVISION_TOLERANCE = 1e-3
+
 
 class DataFetchError(Exception):
     """数据获取异常基类"""
@@ -53,6 +69,37 @@ class DataSourceUnavailableError(DataFetchError):
     pass
 
 
+class FetchCancelledError(DataFetchError):
+    """请求已取消（对冲请求中落败的一方）"""
+    pass
+
+
+# 当前线程所属请求的取消事件（对冲请求由 DataFetcherManager 设置）
+_fetch_context = threading.local()
+
+
+def check_fetch_cancelled() -> None:
+    """当前请求已被取消时抛出 FetchCancelledError"""
+    cancel = getattr(_fetch_context, 'cancel', None)
+    if cancel is not None and cancel.is_set():
+        raise FetchCancelledError("请求已取消")
+
+
+def stop_if_fetch_cancelled(retry_state) -> bool:
+    """tenacity 停止条件：当前请求已被取消时不再重试"""
+    cancel = getattr(_fetch_context, 'cancel', None)
+    return cancel is not None and cancel.is_set()
+
+
+def cancellable_sleep(seconds: float) -> None:
+    """tenacity 重试退避等待：当前请求被取消时立即结束等待"""
+    cancel = getattr(_fetch_context, 'cancel', None)
+    if cancel is None:
+        time.sleep(seconds)
+    else:
+        cancel.wait(seconds)
+
+
 class BaseFetcher(ABC):
     """
     数据源抽象基类
@@ -69,6 +116,8 @@ class BaseFetcher(ABC):
     
     name: str = "BaseFetcher"
     priority: int = 99  # 优先级数字越小越优先
+    rate_limit_host: Optional[str] = None  # 限流所属的上游主机（见 rate_limiter）
+    adjust: str = 'qfq'  # 复权方式（原始数据缓存键的一部分）
     
     @abstractmethod
     def _fetch_raw_data(self, stock_code: str, start_date: str, end_date: str) -> pd.DataFrame:
@@ -100,7 +149,8 @@ class BaseFetcher(ABC):
         stock_code: str, 
         start_date: Optional[str] = None,
         end_date: Optional[str] = None,
-        days: int = 30
+        days: int = 30,
+        history: Optional[pd.DataFrame] = None
     ) -> pd.DataFrame:
         """
         获取日线数据（统一入口）
@@ -116,6 +166,7 @@ class BaseFetcher(ABC):
             start_date: 开始日期（可选）
             end_date: 结束日期（可选，默认今天）
             days: 获取天数（当 start_date 未指定时使用）
+            history: 本地已存储的历史数据（增量获取时作为均线预热窗口，可选）
             
         Returns:
             标准化的 DataFrame，包含技术指标
@@ -126,15 +177,14 @@ class BaseFetcher(ABC):
         
         if start_date is None:
             # 默认获取最近 30 个交易日（按日历日估算，多取一些）
-            from datetime import timedelta
             start_dt = datetime.strptime(end_date, '%Y-%m-%d') - timedelta(days=days * 2)
             start_date = start_dt.strftime('%Y-%m-%d')
         
         logger.info(f"[{self.name}] 获取 {stock_code} 数据: {start_date} ~ {end_date}")
         
         try:
-            # Step 1: 获取原始数据
-            raw_df = self._fetch_raw_data(stock_code, start_date, end_date)
+            # Step 1: 获取原始数据（优先读取本地原始响应缓存）
+            raw_df = self._fetch_raw_data_cached(stock_code, start_date, end_date)
             
             if raw_df is None or raw_df.empty:
                 raise DataFetchError(f"[{self.name}] 未获取到 {stock_code} 的数据")
@@ -145,12 +195,23 @@ class BaseFetcher(ABC):
             # Step 3: 数据清洗
             df = self._clean_data(df)
             
+            # 对冲请求落败时不再计算指标 / 更新指标状态
+            check_fetch_cancelled()
+            
             # Step 4: 计算技术指标
-            df = self._calculate_indicators(df)
+            # 增量获取时基于每只股票的指标状态 O(1) 更新新增 / 修订的 K 线，
+            # 完整窗口获取时全量计算（指标状态在下次增量获取时由已入库的本地历史重建）
+            if history is not None and not history.empty:
+                df = self._calculate_indicators_with_history(df, history, stock_code)
+            else:
+                df = self._calculate_indicators(df)
             
             logger.info(f"[{self.name}] {stock_code} 获取成功，共 {len(df)} 条数据")
             return df
             
+        except FetchCancelledError:
+            logger.debug(f"[{self.name}] {stock_code} 请求已取消")
+            raise
         except Exception as e:
             logger.error(f"[{self.name}] 获取 {stock_code} 失败: {str(e)}")
             raise DataFetchError(f"[{self.name}] {stock_code}: {str(e)}") from e
@@ -192,37 +253,95 @@ class BaseFetcher(ABC):
         计算指标：
         - MA5, MA10, MA20: 移动平均线
         - Volume_Ratio: 量比（今日成交量 / 5日平均成交量）
-        """
-        df = df.copy()
         
-        # 移动平均线
-        df['ma5'] = df['close'].rolling(window=5, min_periods=1).mean()
-        df['ma10'] = df['close'].rolling(window=10, min_periods=1).mean()
-        df['ma20'] = df['close'].rolling(window=20, min_periods=1).mean()
+        使用共享指标库一次性计算；调用方传入的是 _clean_data / concat 产生的新 DataFrame，
+        这里直接写入列，不再额外复制
+        """
+        values = compute_indicators(
+            df['close'].to_numpy(dtype=float),
+            ('ma5', 'ma10', 'ma20', 'volume_ratio'),
+            volume=df['volume'].to_numpy(dtype=float),
+            min_periods=1,
+        )
         
-        # 量比：当日成交量 / 5日平均成交量
-        avg_volume_5 = df['volume'].rolling(window=5, min_periods=1).mean()
-        df['volume_ratio'] = df['volume'] / avg_volume_5.shift(1)
-        df['volume_ratio'] = df['volume_ratio'].fillna(1.0)
+        # 第一根 K 线没有可比较的均量，量比记为 1.0
+        values['volume_ratio'] = np.where(np.isnan(values['volume_ratio']), 1.0, values['volume_ratio'])
         
         # 保留2位小数
-        for col in ['ma5', 'ma10', 'ma20', 'volume_ratio']:
-            if col in df.columns:
-                df[col] = df[col].round(2)
+        for col, array in values.items():
+            df[col] = np.round(array, 2)
         
         return df
     
-    @staticmethod
-    def random_sleep(min_seconds: float = 1.0, max_seconds: float = 3.0) -> None:
+    def _fetch_raw_data_cached(self, stock_code: str, start_date: str, end_date: str) -> pd.DataFrame:
+        """
+        获取原始数据（带本地磁盘缓存）
+        
+        已收盘的历史区间永久命中，当日区间按短 TTL 命中，未命中时请求网络并写入缓存。
+        录制 / 回放模式下不读缓存，保证每次调用都经过录制 / 回放工具
+        """
+        from .replay import get_replay_harness
+        harness = get_replay_harness()
+        
+        cache = get_raw_cache()
+        if not harness.active:
+            raw_df = cache.load(self.name, stock_code, self.adjust, start_date, end_date)
+            if raw_df is not None:
+                logger.info(f"[{self.name}] {stock_code} 命中本地原始数据缓存")
+                return raw_df
+        
+        raw_df = harness.call(
+            f"{self.name}.daily", stock_code, (start_date, end_date, self.adjust),
+            lambda: self._fetch_raw_data(stock_code, start_date, end_date)
+        )
+        # 对冲请求落败的一方不写缓存，避免覆盖胜出方的结果
+        check_fetch_cancelled()
+        cache.store(self.name, stock_code, self.adjust, start_date, end_date, raw_df)
+        return raw_df
+    
+    def _calculate_indicators_with_history(
+        self,
+        df: pd.DataFrame,
+        history: pd.DataFrame,
+        stock_code: Optional[str] = None
+    ) -> pd.DataFrame:
+        """
+        基于本地历史计算技术指标
+        
+        增量获取只返回最近几根 K 线，直接计算会让 MA20 等指标退化为短窗口均值。
+        优先使用增量指标状态（每根新增 / 修订的 K 线 O(1) 更新）；
+        状态不可用时取新数据之前的若干条本地历史作为预热窗口，计算后只返回新数据部分。
+        """
+        if stock_code is not None:
+            try:
+                from indicator_state import get_indicator_state_store
+                return get_indicator_state_store().apply(stock_code, df, history)
+            except Exception as e:
+                logger.warning(f"[{self.name}] {stock_code} 增量指标计算失败，回退到全量计算: {e}")
+        
+        warmup_cols = [col for col in STANDARD_COLUMNS if col in history.columns]
+        warmup = self._clean_data(history[warmup_cols])
+        warmup = warmup[warmup['date'] < df['date'].min()].tail(INDICATOR_WARMUP_BARS)
+        
+        combined = pd.concat([warmup, df], ignore_index=True)
+        combined = self._calculate_indicators(combined)
+        
+        return combined.iloc[len(warmup):].reset_index(drop=True)
+    
+    def _acquire_rate_limit(self) -> None:
         """
-        智能随机休眠（Jitter）
+        请求前获取所属上游主机的令牌
         
-        防封禁策略：模拟人类行为的随机延迟
-        在请求之间加入不规则的等待时间
+        防封禁策略：同一上游主机的所有 Fetcher 实例、所有线程共享一个令牌桶，
+        按配置的速率放行请求（替代原先每个实例独立的随机休眠）；
+        对冲请求落败被取消时不再占用令牌，抛出 FetchCancelledError
         """
-        sleep_time = random.uniform(min_seconds, max_seconds)
-        logger.debug(f"随机休眠 {sleep_time:.2f} 秒...")
-        time.sleep(sleep_time)
+        check_fetch_cancelled()
+        if self.rate_limit_host is None:
+            return
+        cancel = getattr(_fetch_context, 'cancel', None)
+        if not get_rate_limiter(self.rate_limit_host).acquire(cancel=cancel):
+            raise FetchCancelledError("请求已取消")
 
 
 class DataFetcherManager:
@@ -235,7 +354,9 @@ class DataFetcherManager:
     3. 提供统一的数据获取接口
     
     切换策略：
-    - 优先使用高优先级数据源
+    - 可选对冲：主数据源响应过慢时同时请求下一个健康的数据源，取先返回者
+    - 按观测到的健康度排序（熔断中的排最后，成功率高的优先，同档按优先级）
+    - 连续失败的数据源熔断一段冷却时间，期间直接跳过
     - 失败后自动切换到下一个
     - 所有数据源都失败时抛出异常
     """
@@ -248,6 +369,19 @@ class DataFetcherManager:
             fetchers: 数据源列表（可选，默认按优先级自动创建）
         """
         self._fetchers: List[BaseFetcher] = []
+        self._health: Dict[str, SourceHealth] = {}
+        
+        # 对冲请求（可选，默认关闭）
+        from config import get_config
+        config = get_config()
+        self._hedge_enabled = config.hedged_requests_enabled
+        self._hedge_percentile = config.hedge_delay_percentile
+        self._hedge_min_delay = config.hedge_min_delay
+        self._hedge_budget_ratio = config.hedge_budget_ratio
+        self._hedge_lock = threading.Lock()
+        self._hedge_pool: Optional[ThreadPoolExecutor] = None
+        self._hedge_requests = 0
+        self._hedges_sent = 0
         
         if fetchers:
             # 按优先级排序
@@ -255,6 +389,21 @@ class DataFetcherManager:
         else:
             # 默认数据源将在首次使用时延迟加载
             self._init_default_fetchers()
+        
+        for fetcher in self._fetchers:
+            self._register_health(fetcher)
+    
+    def _register_health(self, fetcher: BaseFetcher) -> None:
+        """为数据源创建健康度统计"""
+        from config import get_config
+        config = get_config()
+        
+        self._health[fetcher.name] = SourceHealth(
+            fetcher.name,
+            window=config.source_health_window,
+            failure_threshold=config.circuit_breaker_failures,
+            cooldown=config.circuit_breaker_cooldown,
+        )
     
     def _init_default_fetchers(self) -> None:
         """
@@ -291,21 +440,37 @@ class DataFetcherManager:
         """添加数据源并重新排序"""
         self._fetchers.append(fetcher)
         self._fetchers.sort(key=lambda f: f.priority)
+        self._register_health(fetcher)
+    
+    def _ranked_fetchers(self) -> List[BaseFetcher]:
+        """
+        按健康度排序数据源
+        
+        排序键：(是否熔断, -成功率（按 10% 分档）, 优先级)
+        成功率分档可避免偶发一两次失败就打乱静态优先级
+        """
+        def rank(fetcher: BaseFetcher):
+            health = self._health[fetcher.name]
+            is_open = health.state == STATE_OPEN
+            return (is_open, -round(health.success_rate(), 1), fetcher.priority)
+        
+        return sorted(self._fetchers, key=rank)
     
     def get_daily_data(
         self, 
         stock_code: str,
         start_date: Optional[str] = None,
         end_date: Optional[str] = None,
-        days: int = 30
+        days: int = 30,
+        history: Optional[pd.DataFrame] = None
     ) -> Tuple[pd.DataFrame, str]:
         """
         获取日线数据（自动切换数据源）
         
         故障切换策略：
-        1. 从最高优先级数据源开始尝试
+        1. 按健康度排序后依次尝试，熔断中的数据源直接跳过
         2. 捕获异常后自动切换到下一个
-        3. 记录每个数据源的失败原因
+        3. 记录每个数据源的成功/失败与耗时，连续失败时熔断
         4. 所有数据源失败后抛出详细异常
         
         Args:
@@ -313,6 +478,7 @@ class DataFetcherManager:
             start_date: 开始日期
             end_date: 结束日期
             days: 获取天数
+            history: 本地历史数据（用于增量获取时的指标预热，可选）
             
         Returns:
             Tuple[DataFrame, str]: (数据, 成功的数据源名称)
@@ -321,21 +487,30 @@ class DataFetcherManager:
             DataFetchError: 所有数据源都失败时抛出
         """
         errors = []
+        fetch_kwargs = {
+            'stock_code': stock_code,
+            'start_date': start_date,
+            'end_date': end_date,
+            'days': days,
+            'history': history,
+        }
+        remaining = self._ranked_fetchers()
         
-        for fetcher in self._fetchers:
+        if self._hedge_enabled:
+            df, source_name, remaining = self._hedged_fetch(remaining, fetch_kwargs, errors)
+            if df is not None:
+                return df, source_name
+        
+        for fetcher in remaining:
+            ticket = self._health[fetcher.name].allow_request()
+            if ticket is None:
+                logger.debug(f"[{fetcher.name}] 熔断中，跳过 {stock_code}")
+                errors.append(f"[{fetcher.name}] 熔断中，已跳过")
+                continue
+            
             try:
-                logger.info(f"尝试使用 [{fetcher.name}] 获取 {stock_code}...")
-                df = fetcher.get_daily_data(
-                    stock_code=stock_code,
-                    start_date=start_date,
-                    end_date=end_date,
-                    days=days
-                )
-                
-                if df is not None and not df.empty:
-                    logger.info(f"[{fetcher.name}] 成功获取 {stock_code}")
-                    return df, fetcher.name
-                    
+                df = self._fetch_with_health(fetcher, fetch_kwargs, ticket)
+                return df, fetcher.name
             except Exception as e:
                 error_msg = f"[{fetcher.name}] 失败: {str(e)}"
                 logger.warning(error_msg)
@@ -348,6 +523,300 @@ class DataFetcherManager:
         logger.error(error_summary)
         raise DataFetchError(error_summary)
     
+    def _fetch_with_health(
+        self,
+        fetcher: BaseFetcher,
+        fetch_kwargs: Dict[str, Any],
+        ticket: Optional[RequestTicket],
+        cancel: Optional[threading.Event] = None
+    ) -> pd.DataFrame:
+        """
+        调用单个数据源并记录健康度（成功/失败与耗时）
+        
+        Args:
+            ticket: allow_request 返回的请求凭证（半开探测请求据此恢复或重新熔断）
+            cancel: 取消事件（对冲请求使用）；被设置后数据源在重试间隔、限流等待、
+                    写缓存与计算指标前停止，且本次请求不计入健康度统计
+        
+        Raises:
+            FetchCancelledError: 请求已被取消
+            DataFetchError: 数据源返回空数据
+            Exception: 数据源抛出的原始异常
+        """
+        health = self._health[fetcher.name]
+        stock_code = fetch_kwargs['stock_code']
+        
+        previous = getattr(_fetch_context, 'cancel', None)
+        _fetch_context.cancel = cancel
+        start = time.monotonic()
+        try:
+            if cancel is not None and cancel.is_set():
+                raise FetchCancelledError("请求已取消")
+            logger.info(f"尝试使用 [{fetcher.name}] 获取 {stock_code}...")
+            df = fetcher.get_daily_data(**fetch_kwargs)
+        except Exception as e:
+            if cancel is not None and cancel.is_set():
+                health.release_probe(ticket)
+                logger.info(f"[对冲] [{fetcher.name}] 已取消 {stock_code} 的请求")
+                raise FetchCancelledError("请求已取消") from e
+            health.record_failure(time.monotonic() - start, ticket)
+            raise
+        finally:
+            _fetch_context.cancel = previous
+        
+        if df is None or df.empty:
+            health.record_failure(time.monotonic() - start, ticket)
+            raise DataFetchError("返回空数据")
+        
+        health.record_success(time.monotonic() - start, ticket)
+        logger.info(f"[{fetcher.name}] 成功获取 {stock_code}")
+        return df
+    
+    def _hedged_fetch(
+        self,
+        ranked: List[BaseFetcher],
+        fetch_kwargs: Dict[str, Any],
+        errors: List[str]
+    ) -> Tuple[Optional[pd.DataFrame], Optional[str], List[BaseFetcher]]:
+        """
+        对冲请求：主数据源超过延迟阈值未返回时，同时请求下一个健康的数据源
+        
+        策略：
+        1. 延迟阈值取主数据源历史成功耗时的百分位（HEDGE_DELAY_PERCENTILE），不低于 HEDGE_MIN_DELAY
+        2. 先返回有效数据的一方胜出，另一方被取消：在下一次重试、限流等待、
+           写缓存与计算指标前停止，不再占用线程池与令牌
+        3. 对冲次数受预算限制（不超过请求数的 HEDGE_BUDGET_RATIO），
+           且只在备选数据源所属主机的令牌桶有空闲令牌时发起，不会无限放大请求量
+        
+        Returns:
+            (数据, 数据源名称, 未尝试的数据源列表)；都失败时数据为 None，
+            调用方继续对剩余数据源顺序故障切换
+        """
+        stock_code = fetch_kwargs['stock_code']
+        
+        primary = None
+        primary_ticket = None
+        rest: List[BaseFetcher] = []
+        for i, fetcher in enumerate(ranked):
+            primary_ticket = self._health[fetcher.name].allow_request()
+            if primary_ticket is not None:
+                primary = fetcher
+                rest = ranked[i + 1:]
+                break
+            errors.append(f"[{fetcher.name}] 熔断中，已跳过")
+        if primary is None:
+            return None, None, []
+        
+        with self._hedge_lock:
+            self._hedge_requests += 1
+        
+        pool = self._get_hedge_pool()
+        cancel = threading.Event()
+        futures = {
+            pool.submit(self._fetch_with_health, primary, fetch_kwargs, primary_ticket, cancel):
+                (primary, primary_ticket)
+        }
+        
+        delay = self._hedge_delay(primary)
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            picked = self._pick_hedge_fetcher(rest)
+            if picked is not None:
+                secondary, secondary_ticket = picked
+                logger.info(f"[对冲] [{primary.name}] {delay:.2f}s 内未返回 {stock_code}，"
+                            f"同时请求 [{secondary.name}]")
+                future = pool.submit(self._fetch_with_health, secondary, fetch_kwargs, secondary_ticket, cancel)
+                futures[future] = (secondary, secondary_ticket)
+                rest = [f for f in rest if f is not secondary]
+        
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                fetcher, _ = futures[future]
+                try:
+                    df = future.result()
+                except Exception as e:
+                    error_msg = f"[{fetcher.name}] 失败: {str(e)}"
+                    logger.warning(error_msg)
+                    errors.append(error_msg)
+                    continue
+                
+                if pending:
+                    logger.info(f"[对冲] [{fetcher.name}] 先返回 {stock_code}，取消其余请求")
+                    cancel.set()
+                    for loser in pending:
+                        # 尚未开始执行的请求直接取消，并释放其占用的半开探测名额
+                        if loser.cancel():
+                            loser_fetcher, loser_ticket = futures[loser]
+                            self._health[loser_fetcher.name].release_probe(loser_ticket)
+                return df, fetcher.name, rest
+        
+        return None, None, rest
+    
+    def _hedge_delay(self, fetcher: BaseFetcher) -> float:
+        """对冲延迟阈值：主数据源成功耗时的百分位，不低于最小延迟"""
+        latency = self._health[fetcher.name].latency_percentile(self._hedge_percentile)
+        if latency is None:
+            return self._hedge_min_delay
+        return max(latency, self._hedge_min_delay)
+    
+    def _pick_hedge_fetcher(
+        self,
+        candidates: List[BaseFetcher]
+    ) -> Optional[Tuple[BaseFetcher, RequestTicket]]:
+        """
+        选择对冲数据源
+        
+        条件：对冲预算未用完、所属主机当前有空闲令牌、未熔断
+        
+        Returns:
+            (数据源, 请求凭证)，没有可用的对冲数据源时返回 None
+        """
+        with self._hedge_lock:
+            if self._hedges_sent >= self._hedge_budget_ratio * self._hedge_requests + 1:
+                logger.debug("[对冲] 对冲预算已用完，不发起对冲")
+                return None
+        
+        for fetcher in candidates:
+            host = fetcher.rate_limit_host
+            if host is not None and get_rate_limiter(host).available() < 1:
+                continue
+            # 最后检查熔断器：半开状态下 allow_request 会占用探测名额
+            ticket = self._health[fetcher.name].allow_request()
+            if ticket is None:
+                continue
+            with self._hedge_lock:
+                self._hedges_sent += 1
+            return fetcher, ticket
+        
+        return None
+    
+    def _get_hedge_pool(self) -> ThreadPoolExecutor:
+        """获取对冲请求线程池（延迟创建）"""
+        with self._hedge_lock:
+            if self._hedge_pool is None:
+                from config import get_config
+                workers = max(4, get_config().max_workers * 2)
+                self._hedge_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hedge')
+            return self._hedge_pool
+    
+    def close(self) -> None:
+        """关闭对冲请求线程池（未开始的请求直接取消，下次对冲时重新创建）"""
+        with self._hedge_lock:
+            pool, self._hedge_pool = self._hedge_pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+    
+    def get_daily_data_incremental(
+        self,
+        stock_code: str,
+        history: Optional[pd.DataFrame] = None,
+        days: int = 30,
+        overlap_bars: int = 3
+    ) -> Tuple[pd.DataFrame, str]:
+        """
+        增量获取日线数据（只请求本地最后一根 K 线之后的缺口）
+        
+        策略：
+        1. 本地无数据（新股票）或缺口超过完整窗口：回退到完整窗口获取
+        2. 否则从本地倒数第 overlap_bars 根 K 线开始请求，重叠部分用于捕获数据修订
+        3. 重叠区间收盘价与本地不一致（如除权导致前复权价格整体变化）：回退到完整窗口
+        
+        Args:
+            stock_code: 股票代码
+            history: 本地最近的日线数据（按日期升序，需包含 date/close/data_source 列）
+            days: 完整窗口的获取天数
+            overlap_bars: 与本地数据重叠的 K 线条数
+            
+        Returns:
+            Tuple[DataFrame, str]: (数据, 成功的数据源名称)
+        """
+        if history is None or history.empty:
+            logger.info(f"[{stock_code}] 本地无历史数据，获取完整窗口")
+            return self.get_daily_data(stock_code, days=days)
+        
+        last_date = pd.Timestamp(history['date'].iloc[-1]).date()
+        full_window_start = date.today() - timedelta(days=days * 2)
+        if last_date <= full_window_start:
+            logger.info(f"[{stock_code}] 本地数据截至 {last_date}，缺口超过完整窗口，获取完整窗口")
+            return self.get_daily_data(stock_code, days=days)
+        
+        overlap_bars = max(1, min(overlap_bars, len(history)))
+        start_date = pd.Timestamp(history['date'].iloc[-overlap_bars]).strftime('%Y-%m-%d')
+        logger.info(f"[{stock_code}] 增量获取: 本地数据截至 {last_date}，从 {start_date} 开始请求")
+        
+        df, source_name = self.get_daily_data(stock_code, start_date=start_date, history=history)
+        
+        if self._has_revision(df, history, source_name):
+            logger.info(f"[{stock_code}] 重叠区间数据与本地不一致（可能发生除权），改为获取完整窗口")
+            # 首次增量计算基于修订前的本地历史，其待提交的指标状态不能再落库
+            self._discard_indicator_state(stock_code)
+            return self.get_daily_data(stock_code, days=days)
+        
+        return df, source_name
+    
+    @staticmethod
+    def _discard_indicator_state(stock_code: str) -> None:
+        """丢弃股票的待提交指标状态（失败只记录日志）"""
+        try:
+            from indicator_state import get_indicator_state_store
+            get_indicator_state_store().discard(stock_code)
+        except Exception as e:
+            logger.debug(f"[{stock_code}] 丢弃待提交指标状态失败: {e}")
+    
+    @staticmethod
+    def _has_revision(df: pd.DataFrame, history: pd.DataFrame, source_name: str) -> bool:
+        """
+        检查重叠区间的收盘价是否被数据源修订
+        
+        只比较同一数据源写入的本地数据，避免不同数据源复权口径差异造成误判
+        """
+        if 'data_source' in history.columns:
+            history = history[history['data_source'] == source_name]
+        if history.empty:
+            return False
+        
+        stored = history.assign(date=pd.to_datetime(history['date'])).set_index('date')['close']
+        fetched = df.set_index(pd.to_datetime(df['date']))['close']
+        overlap = stored.index.intersection(fetched.index)
+        if overlap.empty:
+            return False
+        
+        stored_close = stored.loc[overlap].to_numpy(dtype=float)
+        fetched_close = fetched.loc[overlap].to_numpy(dtype=float)
+        diff = np.abs(fetched_close - stored_close) / np.maximum(np.abs(stored_close), 1e-9)
+        return bool(np.nanmax(diff) > REVISION_TOLERANCE)
+    
+    def get_source_stats(self) -> List[Dict[str, Any]]:
+        """
+        获取各数据源的健康度统计（按当前排序）
+        
+        Returns:
+            每个数据源一个字典：name, priority, state, success_rate, window_size,
+            total_requests, total_failures, consecutive_failures, latency_p50, latency_p95
+        """
+        stats = []
+        for fetcher in self._ranked_fetchers():
+            item = self._health[fetcher.name].snapshot()
+            item['priority'] = fetcher.priority
+            stats.append(item)
+        return stats
+    
+    def log_source_stats(self) -> None:
+        """输出数据源健康度统计日志"""
+        if self._hedge_enabled:
+            logger.info(f"[数据源统计] 对冲请求: {self._hedges_sent}/{self._hedge_requests}")
+        for item in self.get_source_stats():
+            if item['total_requests'] == 0:
+                continue
+            p50 = f"{item['latency_p50']:.2f}s" if item['latency_p50'] is not None else "-"
+            p95 = f"{item['latency_p95']:.2f}s" if item['latency_p95'] is not None else "-"
+            logger.info(f"[数据源统计] {item['name']}: 状态={item['state']}, "
+                        f"成功率={item['success_rate']:.0%}（最近 {item['window_size']} 次）, "
+                        f"请求={item['total_requests']}, 失败={item['total_failures']}, "
+                        f"耗时 p50={p50} p95={p95}")
+    
     @property
     def available_fetchers(self) -> List[str]:
         """返回可用数据源名称列表"""
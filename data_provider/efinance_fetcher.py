@@ -14,7 +14,7 @@ EfinanceFetcher - 优先数据源 (Priority 0)
 3. 更稳定的接口封装
 
 防封禁策略：
-1. 每次请求前随机休眠 1.5-3.0 秒
+1. 请求前从东方财富共享令牌桶获取令牌（所有实例、所有线程共用一个限流器）
 2. 随机轮换 User-Agent
 3. 使用 tenacity 实现指数退避重试
 """
@@ -35,7 +35,12 @@ from tenacity import (
     before_sleep_log,
 )
 
-from .base import BaseFetcher, DataFetchError, RateLimitError, STANDARD_COLUMNS
+from .base import (
+    BaseFetcher, DataFetchError, RateLimitError, STANDARD_COLUMNS,
+    cancellable_sleep, stop_if_fetch_cancelled,
+)
+from .rate_limiter import HOST_EASTMONEY
+from .spot_snapshot import SNAPSHOT_A_SHARE, get_spot_snapshot_service
 
 
 @dataclass
@@ -93,14 +98,6 @@ USER_AGENTS = [
 ]
 
 
-# 缓存实时行情数据（避免重复请求）
-_realtime_cache: Dict[str, Any] = {
-    'data': None,
-    'timestamp': 0,
-    'ttl': 60  # 60秒缓存有效期
-}
-
-
 def _is_etf_code(stock_code: str) -> bool:
     """
     判断代码是否为 ETF 基金
@@ -133,25 +130,18 @@ class EfinanceFetcher(BaseFetcher):
     - ef.stock.get_realtime_quotes(): 获取实时行情
     
     关键策略：
-    - 每次请求前随机休眠 1.5-3.0 秒
+    - 请求前获取东方财富共享令牌桶的令牌
     - 随机 User-Agent 轮换
     - 失败后指数退避重试（最多3次）
     """
     
     name = "EfinanceFetcher"
     priority = 0  # 最高优先级，排在 AkshareFetcher 之前
+    rate_limit_host = HOST_EASTMONEY
     
-    def __init__(self, sleep_min: float = 1.5, sleep_max: float = 3.0):
-        """
-        初始化 EfinanceFetcher
-        
-        Args:
-            sleep_min: 最小休眠时间（秒）
-            sleep_max: 最大休眠时间（秒）
-        """
-        self.sleep_min = sleep_min
-        self.sleep_max = sleep_max
-        self._last_request_time: Optional[float] = None
+    def __init__(self):
+        """初始化 EfinanceFetcher"""
+        pass
     
     def _set_random_user_agent(self) -> None:
         """
@@ -166,32 +156,12 @@ class EfinanceFetcher(BaseFetcher):
         except Exception as e:
             logger.debug(f"设置 User-Agent 失败: {e}")
     
-    def _enforce_rate_limit(self) -> None:
-        """
-        强制执行速率限制
-        
-        策略：
-        1. 检查距离上次请求的时间间隔
-        2. 如果间隔不足，补充休眠时间
-        3. 然后再执行随机 jitter 休眠
-        """
-        if self._last_request_time is not None:
-            elapsed = time.time() - self._last_request_time
-            min_interval = self.sleep_min
-            if elapsed < min_interval:
-                additional_sleep = min_interval - elapsed
-                logger.debug(f"补充休眠 {additional_sleep:.2f} 秒")
-                time.sleep(additional_sleep)
-        
-        # 执行随机 jitter 休眠
-        self.random_sleep(self.sleep_min, self.sleep_max)
-        self._last_request_time = time.time()
-    
     @retry(
-        stop=stop_after_attempt(3),  # 最多重试3次
+        stop=(stop_after_attempt(3) | stop_if_fetch_cancelled),  # 最多重试3次
         wait=wait_exponential(multiplier=1, min=2, max=30),  # 指数退避：2, 4, 8... 最大30秒
         retry=retry_if_exception_type((ConnectionError, TimeoutError)),
         before_sleep=before_sleep_log(logger, logging.WARNING),
+        sleep=cancellable_sleep,  # 对冲请求被取消时立即结束退避等待
     )
     def _fetch_raw_data(self, stock_code: str, start_date: str, end_date: str) -> pd.DataFrame:
         """
@@ -232,8 +202,8 @@ class EfinanceFetcher(BaseFetcher):
         # 防封禁策略 1: 随机 User-Agent
         self._set_random_user_agent()
         
-        # 防封禁策略 2: 强制休眠
-        self._enforce_rate_limit()
+        # 防封禁策略 2: 按上游主机限流
+        self._acquire_rate_limit()
         
         # 格式化日期（efinance 使用 YYYYMMDD 格式）
         beg_date = start_date.replace('-', '')
@@ -300,8 +270,8 @@ class EfinanceFetcher(BaseFetcher):
         # 防封禁策略 1: 随机 User-Agent
         self._set_random_user_agent()
         
-        # 防封禁策略 2: 强制休眠
-        self._enforce_rate_limit()
+        # 防封禁策略 2: 按上游主机限流
+        self._acquire_rate_limit()
         
         # 格式化日期
         beg_date = start_date.replace('-', '')
@@ -394,7 +364,8 @@ class EfinanceFetcher(BaseFetcher):
         """
         获取实时行情数据
         
-        数据来源：ef.stock.get_realtime_quotes()
+        数据来源：共享的A股全市场行情快照（SpotSnapshotService），
+        快照统一使用 akshare 列名，akshare 不可用时由 ef.stock.get_realtime_quotes() 兜底
         
         Args:
             stock_code: 股票代码
@@ -402,88 +373,33 @@ class EfinanceFetcher(BaseFetcher):
         Returns:
             EfinanceRealtimeQuote 对象，获取失败返回 None
         """
-        import efinance as ef
-        
         try:
-            # 检查缓存
-            current_time = time.time()
-            if (_realtime_cache['data'] is not None and 
-                current_time - _realtime_cache['timestamp'] < _realtime_cache['ttl']):
-                df = _realtime_cache['data']
-                logger.debug(f"[缓存命中] 使用缓存的实时行情数据")
-            else:
-                # 防封禁策略
-                self._set_random_user_agent()
-                self._enforce_rate_limit()
-                
-                logger.info(f"[API调用] ef.stock.get_realtime_quotes() 获取实时行情...")
-                import time as _time
-                api_start = _time.time()
-                
-                # efinance 的实时行情 API
-                df = ef.stock.get_realtime_quotes()
-                
-                api_elapsed = _time.time() - api_start
-                logger.info(f"[API返回] ef.stock.get_realtime_quotes 成功: 返回 {len(df)} 只股票, 耗时 {api_elapsed:.2f}s")
-                
-                # 更新缓存
-                _realtime_cache['data'] = df
-                _realtime_cache['timestamp'] = current_time
-            
-            # 查找指定股票
-            # efinance 返回的列名可能是 '股票代码' 或 'code'
-            code_col = '股票代码' if '股票代码' in df.columns else 'code'
-            row = df[df[code_col] == stock_code]
-            if row.empty:
-                logger.warning(f"[API返回] 未找到股票 {stock_code} 的实时行情")
+            # 快照刷新后构建代码索引，此处为 O(1) 查询
+            index = get_spot_snapshot_service().get_index(SNAPSHOT_A_SHARE)
+            if len(index) == 0:
+                logger.warning(f"[实时行情] A股实时行情数据为空，跳过 {stock_code}")
                 return None
             
-            row = row.iloc[0]
-            
-            # 安全获取字段值
-            def safe_float(val, default=0.0):
-                try:
-                    if pd.isna(val):
-                        return default
-                    return float(val)
-                except:
-                    return default
-            
-            def safe_int(val, default=0):
-                try:
-                    if pd.isna(val):
-                        return default
-                    return int(float(val))
-                except:
-                    return default
-            
-            # 获取列名（可能是中文或英文）
-            name_col = '股票名称' if '股票名称' in df.columns else 'name'
-            price_col = '最新价' if '最新价' in df.columns else 'price'
-            pct_col = '涨跌幅' if '涨跌幅' in df.columns else 'pct_chg'
-            chg_col = '涨跌额' if '涨跌额' in df.columns else 'change'
-            vol_col = '成交量' if '成交量' in df.columns else 'volume'
-            amt_col = '成交额' if '成交额' in df.columns else 'amount'
-            turn_col = '换手率' if '换手率' in df.columns else 'turnover_rate'
-            amp_col = '振幅' if '振幅' in df.columns else 'amplitude'
-            high_col = '最高' if '最高' in df.columns else 'high'
-            low_col = '最低' if '最低' in df.columns else 'low'
-            open_col = '开盘' if '开盘' in df.columns else 'open'
-            
-            quote = EfinanceRealtimeQuote(
-                code=stock_code,
-                name=str(row.get(name_col, '')),
-                price=safe_float(row.get(price_col)),
-                change_pct=safe_float(row.get(pct_col)),
-                change_amount=safe_float(row.get(chg_col)),
-                volume=safe_int(row.get(vol_col)),
-                amount=safe_float(row.get(amt_col)),
-                turnover_rate=safe_float(row.get(turn_col)),
-                amplitude=safe_float(row.get(amp_col)),
-                high=safe_float(row.get(high_col)),
-                low=safe_float(row.get(low_col)),
-                open_price=safe_float(row.get(open_col)),
-            )
+            def build(pos: int) -> EfinanceRealtimeQuote:
+                return EfinanceRealtimeQuote(
+                    code=stock_code,
+                    name=index.name(stock_code),
+                    price=index.get_float(pos, '最新价'),
+                    change_pct=index.get_float(pos, '涨跌幅'),
+                    change_amount=index.get_float(pos, '涨跌额'),
+                    volume=index.get_int(pos, '成交量'),
+                    amount=index.get_float(pos, '成交额'),
+                    turnover_rate=index.get_float(pos, '换手率'),
+                    amplitude=index.get_float(pos, '振幅'),
+                    high=index.get_float(pos, '最高'),
+                    low=index.get_float(pos, '最低'),
+                    open_price=index.get_float(pos, '今开'),
+                )
+            
+            quote = index.get_record('efinance', stock_code, build)
+            if quote is None:
+                logger.warning(f"[API返回] 未找到股票 {stock_code} 的实时行情")
+                return None
             
             logger.info(f"[实时行情] {stock_code} {quote.name}: 价格={quote.price}, 涨跌={quote.change_pct}%, "
                        f"换手率={quote.turnover_rate}%")
@@ -511,7 +427,7 @@ class EfinanceFetcher(BaseFetcher):
         try:
             # 防封禁策略
             self._set_random_user_agent()
-            self._enforce_rate_limit()
+            self._acquire_rate_limit()
             
             logger.info(f"[API调用] ef.stock.get_base_info(stock_codes={stock_code}) 获取基本信息...")
             import time as _time
@@ -556,7 +472,7 @@ class EfinanceFetcher(BaseFetcher):
         try:
             # 防封禁策略
             self._set_random_user_agent()
-            self._enforce_rate_limit()
+            self._acquire_rate_limit()
             
             logger.info(f"[API调用] ef.stock.get_belong_board(stock_code={stock_code}) 获取所属板块...")
             import time as _time
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+按上游主机的令牌桶限流
+===================================
+
+职责：
+1. 每个上游主机（东方财富、Tushare、Baostock、Yahoo）一个进程级令牌桶
+2. 所有 Fetcher 实例、所有工作线程共享同一个令牌桶，线程安全
+3. 替代原先每个实例独立的随机休眠（jitter），按真实允许的吞吐量放行请求
+
+主机划分：
+- eastmoney：akshare / efinance 的东方财富接口、全市场行情快照、VCP 扫描
+- tushare：Tushare Pro（按每分钟配额换算）
+- baostock：Baostock
+- yahoo：Yahoo Finance
+
+令牌桶语义：
+- rate：每秒补充的令牌数（即长期平均请求速率）
+- burst：桶容量（允许的瞬时突发请求数）
+- acquire() 采用预约方式：先扣减令牌（可为负），再在锁外休眠到令牌可用，
+  等待中的线程按到达顺序依次放行，不会出现惊群
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# 上游主机
+HOST_EASTMONEY = 'eastmoney'
+HOST_TUSHARE = 'tushare'
+HOST_BAOSTOCK = 'baostock'
+HOST_YAHOO = 'yahoo'
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶
+    
+    使用 time.monotonic() 计时，不受系统时间调整影响
+    """
+    
+    def __init__(self, name: str, rate: float, burst: int = 1):
+        """
+        初始化令牌桶
+        
+        Args:
+            name: 名称（用于日志）
+            rate: 每秒补充的令牌数
+            burst: 桶容量（最多累积的令牌数）
+        """
+        if rate <= 0:
+            raise ValueError(f"限流速率必须大于 0: {name}={rate}")
+        
+        self.name = name
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self, now: float) -> None:
+        """按流逝时间补充令牌（调用方需持有锁）"""
+        elapsed = now - self._updated_at
+        if elapsed > 0:
+            self._tokens = min(float(self.burst), self._tokens + elapsed * self.rate)
+            self._updated_at = now
+    
+    def acquire(
+        self,
+        tokens: float = 1.0,
+        timeout: Optional[float] = None,
+        cancel: Optional[threading.Event] = None
+    ) -> bool:
+        """
+        获取令牌，令牌不足时阻塞等待
+        
+        Args:
+            tokens: 需要的令牌数
+            timeout: 最长等待时间（秒，None 表示一直等待）
+            cancel: 取消事件（等待期间被设置时归还预约的令牌并返回 False）
+        
+        Returns:
+            是否获取成功（设置 timeout 且等待时间超限、或等待期间被取消时返回 False）
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, (tokens - self._tokens) / self.rate)
+            if timeout is not None and wait > timeout:
+                return False
+            # 预约令牌：后到的线程会看到更大的欠额，从而等待更久
+            self._tokens -= tokens
+        
+        if wait > 0:
+            logger.debug(f"[限流] {self.name} 令牌不足，等待 {wait:.2f} 秒")
+            if cancel is None:
+                time.sleep(wait)
+            elif cancel.wait(wait):
+                with self._lock:
+                    self._refill(time.monotonic())
+                    self._tokens = min(float(self.burst), self._tokens + tokens)
+                return False
+        return True
+    
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """
+        非阻塞获取令牌
+        
+        Returns:
+            令牌充足时扣减并返回 True，否则立即返回 False
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+    
+    def available(self) -> float:
+        """当前可用令牌数（负数表示已有线程在排队）"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+_limiters: Dict[str, TokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+
+def _default_limit(host: str) -> Tuple[float, int]:
+    """从配置读取主机的 (rate, burst)"""
+    from config import get_config
+    config = get_config()
+    
+    if host == HOST_EASTMONEY:
+        return config.eastmoney_rate_limit, config.eastmoney_rate_burst
+    if host == HOST_TUSHARE:
+        # Tushare 配额按分钟计，burst 固定为 1，请求均匀分布，避免分钟初集中突发
+        return config.tushare_rate_limit_per_minute / 60.0, 1
+    if host == HOST_BAOSTOCK:
+        return config.baostock_rate_limit, config.baostock_rate_burst
+    if host == HOST_YAHOO:
+        return config.yahoo_rate_limit, config.yahoo_rate_burst
+    raise ValueError(f"未知的上游主机: {host}")
+
+
+def get_rate_limiter(host: str) -> TokenBucket:
+    """
+    获取指定上游主机的共享令牌桶（首次使用时按配置创建）
+    
+    Args:
+        host: 上游主机（HOST_EASTMONEY / HOST_TUSHARE / HOST_BAOSTOCK / HOST_YAHOO）
+    """
+    limiter = _limiters.get(host)
+    if limiter is not None:
+        return limiter
+    
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            rate, burst = _default_limit(host)
+            limiter = TokenBucket(host, rate, burst)
+            _limiters[host] = limiter
+            logger.debug(f"[限流] 创建 {host} 令牌桶: rate={rate:.2f}/s, burst={burst}")
+        return limiter
+
+
+def reset_rate_limiters() -> None:
+    """清空所有令牌桶（用于测试或配置变更后重建）"""
+    with _limiters_lock:
+        _limiters.clear()
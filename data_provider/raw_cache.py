@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+数据源原始响应的本地磁盘缓存
+===================================
+
+职责：
+1. 在 BaseFetcher 调用 _fetch_raw_data 之前查询本地缓存，命中则不访问网络
+2. 缓存键：数据源 + 股票代码 + 复权方式 + 日期区间，文件名为键的 SHA1（内容寻址）
+3. 过期策略：
+   - 结束日期早于今天、且缓存写入时间晚于结束日期当天收盘结算（SESSION_SETTLED_AT）：
+     视为不可变，永久有效
+   - 其他情况（当日区间，或在结束日期当天盘中 / 结算前写入的历史区间）：
+     短 TTL（默认 5 分钟），盘中数据和未结算的复权价格会持续变化
+
+存储格式：
+- 优先使用 Parquet（需要安装 pyarrow），否则退化为 pickle
+- 写入先落到临时文件再原子替换，多线程/多进程并发写不会产生半截文件
+
+注意：
+- 前复权（qfq）历史价格在除权除息后会整体变化，不可变缓存不会感知，
+  如需强制刷新可删除缓存目录（RAW_CACHE_DIR）
+- 列名不是字符串的 DataFrame（如 yfinance 的 MultiIndex 列）无法写入 Parquet，直接跳过缓存
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+try:
+    import pyarrow  # noqa: F401
+    _PARQUET_AVAILABLE = True
+except ImportError:
+    _PARQUET_AVAILABLE = False
+
+
+# 收盘结算时间：结束日期当天此时刻（再加 SETTLE_MARGIN）之后写入的缓存才视为不可变
+SESSION_SETTLED_AT = dt_time(15, 30)
+SETTLE_MARGIN = timedelta(minutes=30)
+
+
+class RawResponseCache:
+    """
+    原始响应缓存 - 单例模式
+    
+    目录结构：
+        {cache_dir}/{source}/{sha1[:2]}/{sha1}.parquet
+    """
+    
+    _instance: Optional['RawResponseCache'] = None
+    _instance_lock = threading.Lock()
+    
+    def __init__(self, cache_dir: Optional[str] = None, ttl: Optional[float] = None, enabled: Optional[bool] = None):
+        """
+        初始化缓存
+        
+        Args:
+            cache_dir: 缓存目录（可选，默认从配置读取）
+            ttl: 当日区间的缓存有效期（秒，可选，默认从配置读取）
+            enabled: 是否启用（可选，默认从配置读取）
+        """
+        if cache_dir is None or ttl is None or enabled is None:
+            from config import get_config
+            config = get_config()
+            cache_dir = config.raw_cache_dir if cache_dir is None else cache_dir
+            ttl = config.raw_cache_ttl if ttl is None else ttl
+            enabled = config.raw_cache_enabled if enabled is None else enabled
+        
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self.enabled = enabled
+        self.suffix = '.parquet' if _PARQUET_AVAILABLE else '.pkl'
+        
+        if self.enabled and not _PARQUET_AVAILABLE:
+            logger.info("[原始缓存] 未安装 pyarrow，使用 pickle 格式缓存")
+    
+    @classmethod
+    def get_instance(cls) -> 'RawResponseCache':
+        """获取单例实例"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+    
+    @classmethod
+    def reset_instance(cls) -> None:
+        """重置单例（用于测试）"""
+        cls._instance = None
+    
+    def _path_for(self, source: str, stock_code: str, adjust: str, start_date: str, end_date: str) -> Path:
+        """根据缓存键计算文件路径"""
+        key = f"{source}|{stock_code}|{adjust}|{start_date}|{end_date}"
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return self.cache_dir / source / digest[:2] / f"{digest}{self.suffix}"
+    
+    def _is_fresh(self, path: Path, end_date: str) -> bool:
+        """结束日期收盘结算后写入的历史区间永久有效，其余按 TTL 判断"""
+        mtime = path.stat().st_mtime
+        if end_date < date.today().strftime('%Y-%m-%d'):
+            try:
+                settled_at = datetime.combine(
+                    datetime.strptime(end_date, '%Y-%m-%d').date(), SESSION_SETTLED_AT
+                ) + SETTLE_MARGIN
+            except ValueError:
+                settled_at = None
+            if settled_at is not None and mtime >= settled_at.timestamp():
+                return True
+        return time.time() - mtime < self.ttl
+    
+    def load(self, source: str, stock_code: str, adjust: str, start_date: str, end_date: str) -> Optional[pd.DataFrame]:
+        """
+        读取缓存
+        
+        Returns:
+            缓存的原始 DataFrame，未命中或已过期返回 None
+        """
+        if not self.enabled:
+            return None
+        
+        path = self._path_for(source, stock_code, adjust, start_date, end_date)
+        try:
+            if not path.exists() or not self._is_fresh(path, end_date):
+                return None
+            if self.suffix == '.parquet':
+                df = pd.read_parquet(path)
+            else:
+                df = pd.read_pickle(path)
+        except Exception as e:
+            logger.debug(f"[原始缓存] 读取 {path} 失败: {e}")
+            return None
+        
+        logger.debug(f"[原始缓存] 命中 {source} {stock_code} {start_date}~{end_date}")
+        return df
+    
+    def store(self, source: str, stock_code: str, adjust: str, start_date: str, end_date: str, df: pd.DataFrame) -> None:
+        """写入缓存（失败只记录日志，不影响主流程）"""
+        if not self.enabled or df is None or df.empty:
+            return
+        
+        if self.suffix == '.parquet' and not all(isinstance(col, str) for col in df.columns):
+            logger.debug(f"[原始缓存] {source} {stock_code} 列名非字符串，跳过缓存")
+            return
+        
+        path = self._path_for(source, stock_code, adjust, start_date, end_date)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+            os.close(fd)
+            try:
+                if self.suffix == '.parquet':
+                    df.to_parquet(tmp_path)
+                else:
+                    df.to_pickle(tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        except Exception as e:
+            logger.debug(f"[原始缓存] 写入 {path} 失败: {e}")
+
+
+def get_raw_cache() -> RawResponseCache:
+    """获取原始响应缓存实例的快捷方式"""
+    return RawResponseCache.get_instance()
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+数据源录制 / 回放工具
+===================================
+
+职责：
+1. 录制模式（record）：真实请求数据源，把每次响应保存为本地 fixture 文件
+2. 回放模式（replay）：不访问网络，直接从 fixture 返回响应，可注入延迟和失败
+3. 关闭模式（off，默认）：直接调用，不做任何处理
+
+覆盖的调用：
+- BaseFetcher._fetch_raw_data（所有数据源的日线原始数据）
+- 全市场实时行情快照（get_realtime_quote 的数据来源）
+- AkshareFetcher.get_chip_distribution（ak.stock_cyq_em）
+- MarketAnalyzer 的 akshare 调用（指数行情、涨跌统计、板块排行）
+
+用途：
+- 在无网络的机器上运行完整的 StockAnalysisPipeline
+- 可复现的吞吐量基准测试、故障切换延迟测试
+
+fixture 存储：
+    {replay_dir}/{namespace}/{code}__{参数哈希}.pkl
+    内容为 {'result': 响应对象, 'elapsed': 录制时的真实耗时（秒）}
+    回放时找不到精确匹配的参数（如日期区间随运行日期变化），
+    回退到同一 namespace + code 下最新录制的 fixture
+
+配置：
+- REPLAY_MODE: off / record / replay
+- REPLAY_DIR: fixture 目录
+- REPLAY_LATENCY_SCALE: 回放时按录制耗时的倍数休眠（0 表示不休眠，1 表示还原真实耗时）
+- REPLAY_FAILURE_RATE: 回放时随机注入失败的概率（0-1）
+- REPLAY_SEED: 随机数种子（保证注入的失败序列可复现）
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import random
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional, Tuple
+
+from .base import DataFetchError
+
+logger = logging.getLogger(__name__)
+
+
+MODE_OFF = 'off'
+MODE_RECORD = 'record'
+MODE_REPLAY = 'replay'
+
+
+class ReplayHarness:
+    """
+    录制 / 回放工具 - 单例模式
+    """
+    
+    _instance: Optional['ReplayHarness'] = None
+    _instance_lock = threading.Lock()
+    
+    def __init__(
+        self,
+        mode: Optional[str] = None,
+        replay_dir: Optional[str] = None,
+        latency_scale: Optional[float] = None,
+        failure_rate: Optional[float] = None,
+        seed: Optional[int] = None
+    ):
+        """
+        初始化录制 / 回放工具
+        
+        Args:
+            mode: off / record / replay（可选，默认从配置读取，下同）
+            replay_dir: fixture 目录
+            latency_scale: 回放延迟倍数
+            failure_rate: 回放失败注入概率
+            seed: 随机数种子
+        """
+        from config import get_config
+        config = get_config()
+        
+        self.mode = (mode or config.replay_mode).lower()
+        if self.mode not in (MODE_OFF, MODE_RECORD, MODE_REPLAY):
+            logger.warning(f"[回放] 未知的 REPLAY_MODE: {self.mode}，按 off 处理")
+            self.mode = MODE_OFF
+        
+        self.replay_dir = Path(replay_dir or config.replay_dir)
+        self.latency_scale = config.replay_latency_scale if latency_scale is None else latency_scale
+        self.failure_rate = config.replay_failure_rate if failure_rate is None else failure_rate
+        self._random = random.Random(config.replay_seed if seed is None else seed)
+        self._random_lock = threading.Lock()
+        
+        if self.mode != MODE_OFF:
+            logger.info(f"[回放] 模式: {self.mode}, 目录: {self.replay_dir}")
+    
+    @classmethod
+    def get_instance(cls) -> 'ReplayHarness':
+        """获取单例实例"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+    
+    @classmethod
+    def reset_instance(cls) -> None:
+        """重置单例（用于测试）"""
+        cls._instance = None
+    
+    @property
+    def active(self) -> bool:
+        """是否处于录制或回放模式"""
+        return self.mode != MODE_OFF
+    
+    def call(self, namespace: str, code: str, params: Tuple, fn: Callable[[], Any]) -> Any:
+        """
+        按当前模式执行一次数据源调用
+        
+        Args:
+            namespace: 调用类型，如 'AkshareFetcher.daily'、'spot'、'chip'、'market'
+            code: 股票代码或调用名称（fixture 按它分组）
+            params: 影响响应的其余参数（日期区间、复权方式等）
+            fn: 真实调用
+        
+        Returns:
+            响应对象
+        
+        Raises:
+            DataFetchError: 回放模式下 fixture 缺失或命中注入的失败
+        """
+        if self.mode == MODE_OFF:
+            return fn()
+        
+        if self.mode == MODE_RECORD:
+            start = time.monotonic()
+            result = fn()
+            self._save(namespace, code, params, result, time.monotonic() - start)
+            return result
+        
+        return self._replay(namespace, code, params)
+    
+    def _fixture_dir(self, namespace: str) -> Path:
+        return self.replay_dir / _safe_name(namespace)
+    
+    def _fixture_path(self, namespace: str, code: str, params: Tuple) -> Path:
+        digest = hashlib.sha1(repr(params).encode('utf-8')).hexdigest()[:12]
+        return self._fixture_dir(namespace) / f"{_safe_name(code)}__{digest}.pkl"
+    
+    def _save(self, namespace: str, code: str, params: Tuple, result: Any, elapsed: float) -> None:
+        """保存 fixture（原子写入，失败只记录日志）"""
+        path = self._fixture_path(namespace, code, params)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump({'result': result, 'elapsed': elapsed}, f)
+            os.replace(tmp_path, path)
+            logger.debug(f"[回放] 已录制 {namespace} {code} -> {path.name}")
+        except Exception as e:
+            logger.warning(f"[回放] 录制 {namespace} {code} 失败: {e}")
+    
+    def _find_fixture(self, namespace: str, code: str, params: Tuple) -> Optional[Path]:
+        """查找 fixture：优先精确匹配参数，其次同一 code 下最新录制的文件"""
+        path = self._fixture_path(namespace, code, params)
+        if path.exists():
+            return path
+        
+        candidates = list(self._fixture_dir(namespace).glob(f"{_safe_name(code)}__*.pkl"))
+        if not candidates:
+            return None
+        return max(candidates, key=lambda p: p.stat().st_mtime)
+    
+    def _replay(self, namespace: str, code: str, params: Tuple) -> Any:
+        """从 fixture 返回响应，按配置注入延迟和失败"""
+        path = self._find_fixture(namespace, code, params)
+        if path is None:
+            raise DataFetchError(f"[回放] 缺少 fixture: {namespace} {code}")
+        
+        with open(path, 'rb') as f:
+            fixture = pickle.load(f)
+        
+        if self.latency_scale > 0:
+            time.sleep(fixture.get('elapsed', 0.0) * self.latency_scale)
+        
+        with self._random_lock:
+            inject_failure = self.failure_rate > 0 and self._random.random() < self.failure_rate
+        if inject_failure:
+            raise DataFetchError(f"[回放] 注入失败: {namespace} {code}")
+        
+        return fixture['result']
+
+
+def _safe_name(name: str) -> str:
+    """把任意字符串转换为安全的文件名"""
+    return re.sub(r'[^\w.-]', '_', name)
+
+
+def get_replay_harness() -> ReplayHarness:
+    """获取录制 / 回放工具实例的快捷方式"""
+    return ReplayHarness.get_instance()
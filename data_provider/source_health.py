@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+数据源健康度统计与熔断器
+===================================
+
+职责：
+1. 按数据源记录最近 N 次请求的成功率与耗时（滚动窗口，超过冷却时间的记录自动过期，
+   被降级的数据源在一段时间后会回到原有优先级重新尝试）
+2. 熔断器：连续失败达到阈值后熔断一段冷却时间，期间直接跳过该数据源
+3. 冷却结束后进入半开状态，只放行一次探测请求：成功则恢复，失败则重新熔断。
+   allow_request 返回请求凭证，只有持有探测凭证的请求回报结果时才会恢复或重新熔断；
+   熔断前已发出、熔断后才返回的请求只计入统计
+
+状态说明：
+- closed：正常
+- open：熔断中，跳过
+- half_open：冷却结束，等待一次探测请求
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class RequestTicket:
+    """
+    allow_request 放行的请求凭证
+    
+    调用方在回报结果（record_success / record_failure / release_probe）时原样传回，
+    用于区分半开探测请求与熔断前已发出的普通请求
+    """
+    
+    __slots__ = ('probe',)
+    
+    def __init__(self, probe: bool = False):
+        self.probe = probe
+
+
+class SourceHealth:
+    """
+    单个数据源的健康度统计（线程安全）
+    """
+    
+    def __init__(self, name: str, window: int = 20, failure_threshold: int = 3, cooldown: float = 300.0):
+        """
+        初始化健康度统计
+        
+        Args:
+            name: 数据源名称
+            window: 滚动窗口大小（最近 N 次请求）
+            failure_threshold: 连续失败多少次后熔断
+            cooldown: 熔断冷却时间（秒）
+        """
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        
+        # (记录时间, 是否成功, 耗时秒)
+        self._records: Deque[Tuple[float, bool, float]] = deque(maxlen=max(1, window))
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_ticket: Optional[RequestTicket] = None
+        self._total_requests = 0
+        self._total_failures = 0
+        self._lock = threading.Lock()
+    
+    def _prune_locked(self, now: float) -> None:
+        """移除超过冷却时间的旧记录（调用方需持有锁）"""
+        while self._records and now - self._records[0][0] > self.cooldown:
+            self._records.popleft()
+    
+    def _outcomes_locked(self) -> Tuple[List[bool], List[float]]:
+        """返回窗口内的 (成功标记列表, 成功请求耗时列表)（调用方需持有锁）"""
+        self._prune_locked(time.monotonic())
+        outcomes = [ok for _, ok, _ in self._records]
+        latencies = [latency for _, ok, latency in self._records if ok]
+        return outcomes, latencies
+    
+    def _state_locked(self, now: float) -> str:
+        """计算当前熔断状态（调用方需持有锁）"""
+        if self._opened_at is None:
+            return STATE_CLOSED
+        if now - self._opened_at < self.cooldown:
+            return STATE_OPEN
+        return STATE_HALF_OPEN
+    
+    @property
+    def state(self) -> str:
+        """当前熔断状态"""
+        with self._lock:
+            return self._state_locked(time.monotonic())
+    
+    def allow_request(self) -> Optional[RequestTicket]:
+        """
+        是否允许向该数据源发起请求
+        
+        半开状态下只放行一个探测请求，其他线程继续跳过
+        
+        Returns:
+            放行时返回请求凭证（回报结果时传回），熔断中返回 None
+        """
+        with self._lock:
+            state = self._state_locked(time.monotonic())
+            if state == STATE_CLOSED:
+                return RequestTicket()
+            if state == STATE_HALF_OPEN and self._probe_ticket is None:
+                self._probe_ticket = RequestTicket(probe=True)
+                logger.info(f"[熔断] [{self.name}] 冷却结束，放行一次探测请求")
+                return self._probe_ticket
+            return None
+    
+    def _is_probe_locked(self, ticket: Optional[RequestTicket]) -> bool:
+        """凭证是否为当前半开探测请求（调用方需持有锁）"""
+        return ticket is not None and ticket is self._probe_ticket
+    
+    def record_success(self, latency: float, ticket: Optional[RequestTicket] = None) -> None:
+        """
+        记录一次成功请求
+        
+        熔断期间只有探测请求成功才会恢复；熔断前发出的请求迟到的成功只计入统计
+        """
+        with self._lock:
+            self._records.append((time.monotonic(), True, latency))
+            self._total_requests += 1
+            self._consecutive_failures = 0
+            if self._is_probe_locked(ticket):
+                logger.info(f"[熔断] [{self.name}] 探测成功，恢复正常")
+                self._opened_at = None
+                self._probe_ticket = None
+    
+    def record_failure(self, latency: float, ticket: Optional[RequestTicket] = None) -> None:
+        """
+        记录一次失败请求，连续失败达到阈值时熔断
+        
+        熔断期间只有探测请求失败才会重新熔断；熔断前发出的请求迟到的失败只计入统计，
+        不会重置冷却时间，也不会占用或释放探测名额
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._records.append((now, False, latency))
+            self._total_requests += 1
+            self._total_failures += 1
+            self._consecutive_failures += 1
+            
+            if self._is_probe_locked(ticket):
+                self._probe_ticket = None
+                self._opened_at = now
+                logger.warning(f"[熔断] [{self.name}] 探测失败，重新熔断 {self.cooldown:.0f} 秒")
+            elif self._opened_at is None and self._consecutive_failures >= self.failure_threshold:
+                self._opened_at = now
+                logger.warning(f"[熔断] [{self.name}] 连续失败 {self._consecutive_failures} 次，"
+                               f"熔断 {self.cooldown:.0f} 秒")
+    
+    def release_probe(self, ticket: Optional[RequestTicket]) -> None:
+        """请求被取消（未产生结果）时释放其占用的半开探测名额，不计入成功/失败统计"""
+        with self._lock:
+            if self._is_probe_locked(ticket):
+                self._probe_ticket = None
+    
+    def success_rate(self) -> float:
+        """滚动窗口内的成功率（无记录时视为 1.0）"""
+        with self._lock:
+            outcomes, _ = self._outcomes_locked()
+        if not outcomes:
+            return 1.0
+        return sum(outcomes) / len(outcomes)
+    
+    def latency_percentile(self, q: float) -> Optional[float]:
+        """
+        滚动窗口内成功请求耗时的百分位数
+        
+        Args:
+            q: 百分位（0-100）
+        
+        Returns:
+            耗时（秒），无成功记录时返回 None
+        """
+        with self._lock:
+            _, latencies = self._outcomes_locked()
+        if not latencies:
+            return None
+        return float(np.percentile(latencies, q))
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """返回统计快照（用于日志）"""
+        with self._lock:
+            state = self._state_locked(time.monotonic())
+            outcomes, latencies = self._outcomes_locked()
+            consecutive_failures = self._consecutive_failures
+            total_requests = self._total_requests
+            total_failures = self._total_failures
+        
+        return {
+            'name': self.name,
+            'state': state,
+            'success_rate': (sum(outcomes) / len(outcomes)) if outcomes else 1.0,
+            'window_size': len(outcomes),
+            'total_requests': total_requests,
+            'total_failures': total_failures,
+            'consecutive_failures': consecutive_failures,
+            'latency_p50': float(np.percentile(latencies, 50)) if latencies else None,
+            'latency_p95': float(np.percentile(latencies, 95)) if latencies else None,
+        }
@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+全市场实时行情快照服务
+===================================
+
+职责：
+1. 统一管理全市场实时行情快照（A股 / ETF / 港股）的 TTL 缓存
+2. 单飞刷新（Single-flight）：多个工作线程同时发现缓存过期时，
+   只有一个线程发起网络请求，其余线程等待并复用结果
+3. 供 AkshareFetcher、EfinanceFetcher、MarketAnalyzer、vcp_scanner 共用，
+   避免同一张 ~5000 行的行情表被重复下载
+4. 每次刷新后构建一次代码索引（SpotQuoteIndex），单只股票查询为 O(1)，
+   不再对整张表做 df[df['代码'] == code] 扫描
+
+数据来源：
+- A股：ak.stock_zh_a_spot_em()，失败时回退 ef.stock.get_realtime_quotes()
+  （efinance 返回的列名会统一映射为 akshare 列名）
+- ETF：ak.fund_etf_spot_em()
+- 港股：ak.stock_hk_spot_em()
+
+注意：返回的 DataFrame 在多个调用方之间共享，调用方不得原地修改
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .base import DataFetchError
+from .rate_limiter import HOST_EASTMONEY, get_rate_limiter
+from .replay import get_replay_harness
+
+logger = logging.getLogger(__name__)
+
+
+# 快照类型
+SNAPSHOT_A_SHARE = 'a_share'
+SNAPSHOT_ETF = 'etf'
+SNAPSHOT_HK = 'hk'
+
+# 快照中的代码列、名称列（统一使用 akshare 列名）
+CODE_COLUMN = '代码'
+NAME_COLUMN = '名称'
+
+# efinance 实时行情列名 -> akshare 列名
+_EFINANCE_COLUMN_MAPPING = {
+    '股票代码': '代码',
+    '股票名称': '名称',
+    '动态市盈率': '市盈率-动态',
+    '昨日收盘': '昨收',
+}
+
+
+def _load_a_share_spot() -> pd.DataFrame:
+    """获取A股全市场实时行情（akshare 优先，efinance 兜底）"""
+    import akshare as ak
+    
+    try:
+        get_rate_limiter(HOST_EASTMONEY).acquire()
+        logger.info("[API调用] ak.stock_zh_a_spot_em() 获取A股实时行情...")
+        api_start = time.time()
+        df = ak.stock_zh_a_spot_em()
+        if df is not None and not df.empty:
+            logger.info(f"[API返回] ak.stock_zh_a_spot_em 成功: 返回 {len(df)} 只股票, "
+                        f"耗时 {time.time() - api_start:.2f}s")
+            return df
+        logger.warning("[API返回] ak.stock_zh_a_spot_em 返回空数据")
+    except Exception as e:
+        logger.warning(f"[API错误] ak.stock_zh_a_spot_em 获取失败: {e}，尝试 efinance")
+    
+    import efinance as ef
+    
+    get_rate_limiter(HOST_EASTMONEY).acquire()
+    logger.info("[API调用] ef.stock.get_realtime_quotes() 获取A股实时行情...")
+    api_start = time.time()
+    df = ef.stock.get_realtime_quotes()
+    logger.info(f"[API返回] ef.stock.get_realtime_quotes 成功: 返回 {len(df)} 只股票, "
+                f"耗时 {time.time() - api_start:.2f}s")
+    return df.rename(columns=_EFINANCE_COLUMN_MAPPING)
+
+
+def _load_etf_spot() -> pd.DataFrame:
+    """获取 ETF 全市场实时行情"""
+    import akshare as ak
+    
+    get_rate_limiter(HOST_EASTMONEY).acquire()
+    logger.info("[API调用] ak.fund_etf_spot_em() 获取ETF实时行情...")
+    api_start = time.time()
+    df = ak.fund_etf_spot_em()
+    logger.info(f"[API返回] ak.fund_etf_spot_em 成功: 返回 {len(df)} 只ETF, "
+                f"耗时 {time.time() - api_start:.2f}s")
+    return df
+
+
+def _load_hk_spot() -> pd.DataFrame:
+    """获取港股全市场实时行情"""
+    import akshare as ak
+    
+    get_rate_limiter(HOST_EASTMONEY).acquire()
+    logger.info("[API调用] ak.stock_hk_spot_em() 获取港股实时行情...")
+    api_start = time.time()
+    df = ak.stock_hk_spot_em()
+    logger.info(f"[API返回] ak.stock_hk_spot_em 成功: 返回 {len(df)} 只港股, "
+                f"耗时 {time.time() - api_start:.2f}s")
+    return df
+
+
+class SpotQuoteIndex:
+    """
+    行情快照的代码索引（每次刷新构建一次，只读）
+    
+    - 代码 -> 行号的字典映射，查询 O(1)
+    - 数值列预先转换为 float64 数组（无法解析的值记为 0.0，
+      与各 Fetcher 中 safe_float 的默认值一致）
+    - 按 (命名空间, 代码) 缓存调用方构建的行情对象，同一快照内重复查询不再分配对象
+    """
+    
+    def __init__(self, df: Optional[pd.DataFrame] = None):
+        self._positions: Dict[str, int] = {}
+        self._names: Dict[str, str] = {}
+        self._floats: Dict[str, np.ndarray] = {}
+        self._records: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+        
+        if df is None or df.empty or CODE_COLUMN not in df.columns:
+            return
+        
+        codes = df[CODE_COLUMN].astype(str).tolist()
+        # 代码重复时保留第一行，与原先 row.iloc[0] 的行为一致
+        for pos in range(len(codes) - 1, -1, -1):
+            self._positions[codes[pos]] = pos
+        
+        if NAME_COLUMN in df.columns:
+            names = df[NAME_COLUMN].tolist()
+            self._names = {
+                code: ('' if pd.isna(names[pos]) else str(names[pos]))
+                for code, pos in self._positions.items()
+            }
+        
+        for col in df.columns:
+            if col in (CODE_COLUMN, NAME_COLUMN):
+                continue
+            values = pd.to_numeric(df[col], errors='coerce')
+            self._floats[col] = values.fillna(0.0).to_numpy(dtype=np.float64)
+    
+    def __len__(self) -> int:
+        return len(self._positions)
+    
+    def __contains__(self, code: str) -> bool:
+        return code in self._positions
+    
+    def find(self, code: str) -> Optional[int]:
+        """返回股票在快照中的行号，不存在时返回 None"""
+        return self._positions.get(code)
+    
+    def name(self, code: str) -> str:
+        """返回股票名称"""
+        return self._names.get(code, '')
+    
+    def get_float(self, pos: int, column: str, default: float = 0.0) -> float:
+        """按行号读取数值字段，列不存在时返回默认值"""
+        values = self._floats.get(column)
+        if values is None:
+            return default
+        return float(values[pos])
+    
+    def get_int(self, pos: int, column: str, default: int = 0) -> int:
+        """按行号读取整数字段，列不存在时返回默认值"""
+        values = self._floats.get(column)
+        if values is None:
+            return default
+        return int(values[pos])
+    
+    def get_record(self, namespace: str, code: str, builder: Callable[[int], Any]) -> Optional[Any]:
+        """
+        获取（并缓存）调用方构建的行情对象
+        
+        Args:
+            namespace: 对象类型命名空间（不同 Fetcher 的行情类不同）
+            code: 股票代码
+            builder: 根据行号构建行情对象的函数，仅在首次查询时调用
+        
+        Returns:
+            行情对象，代码不在快照中时返回 None
+        """
+        pos = self._positions.get(code)
+        if pos is None:
+            return None
+        
+        key = (namespace, code)
+        record = self._records.get(key)
+        if record is None:
+            record = builder(pos)
+            with self._lock:
+                record = self._records.setdefault(key, record)
+        return record
+
+
+class SpotSnapshotService:
+    """
+    全市场实时行情快照服务 - 单例模式
+    
+    缓存策略：
+    - 每种快照独立维护 TTL 缓存（默认 60 秒）
+    - 获取失败时缓存空 DataFrame，避免同一轮任务对失败接口反复请求
+    
+    并发策略（单飞刷新）：
+    - 每种快照有独立的刷新锁
+    - 缓存过期时，第一个拿到刷新锁的线程发起请求
+    - 其他线程阻塞在刷新锁上，拿到锁后发现缓存已刷新，直接返回
+    """
+    
+    _instance: Optional['SpotSnapshotService'] = None
+    _instance_lock = threading.Lock()
+    
+    # 单次刷新的最大尝试次数
+    MAX_ATTEMPTS = 2
+    
+    def __init__(self, ttl: Optional[float] = None):
+        """
+        初始化快照服务
+        
+        Args:
+            ttl: 缓存有效期（秒，可选，默认从配置读取）
+        """
+        if ttl is None:
+            from config import get_config
+            ttl = get_config().spot_snapshot_ttl
+        
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[pd.DataFrame, SpotQuoteIndex, float]] = {}
+        self._refresh_locks: Dict[str, threading.Lock] = {}
+        self._loaders: Dict[str, Callable[[], pd.DataFrame]] = {
+            SNAPSHOT_A_SHARE: _load_a_share_spot,
+            SNAPSHOT_ETF: _load_etf_spot,
+            SNAPSHOT_HK: _load_hk_spot,
+        }
+    
+    @classmethod
+    def get_instance(cls) -> 'SpotSnapshotService':
+        """获取单例实例"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+    
+    @classmethod
+    def reset_instance(cls) -> None:
+        """重置单例（用于测试）"""
+        cls._instance = None
+    
+    def get_snapshot(self, kind: str = SNAPSHOT_A_SHARE, retry_empty: bool = False) -> pd.DataFrame:
+        """
+        获取全市场实时行情快照
+        
+        Args:
+            kind: 快照类型（a_share / etf / hk）
+            retry_empty: 缓存中是失败留下的空数据时，是否立即重新请求
+        
+        Returns:
+            行情 DataFrame（共享只读，获取失败时为空 DataFrame）
+        """
+        return self._get_entry(kind, retry_empty)[0]
+    
+    def get_index(self, kind: str = SNAPSHOT_A_SHARE, retry_empty: bool = False) -> SpotQuoteIndex:
+        """
+        获取行情快照的代码索引（与 get_snapshot 共享同一次刷新）
+        
+        Args:
+            kind: 快照类型（a_share / etf / hk）
+            retry_empty: 缓存中是失败留下的空数据时，是否立即重新请求
+        
+        Returns:
+            SpotQuoteIndex（获取失败时为空索引）
+        """
+        return self._get_entry(kind, retry_empty)[1]
+    
+    def invalidate(self, kind: Optional[str] = None) -> None:
+        """
+        使缓存失效
+        
+        Args:
+            kind: 快照类型（None 表示全部）
+        """
+        with self._lock:
+            if kind is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(kind, None)
+    
+    def _get_entry(self, kind: str, retry_empty: bool) -> Tuple[pd.DataFrame, SpotQuoteIndex]:
+        """获取 (快照, 索引)，缓存过期时单飞刷新"""
+        if kind not in self._loaders:
+            raise ValueError(f"未知的行情快照类型: {kind}")
+        
+        entry = self._get_fresh(kind, retry_empty)
+        if entry is not None:
+            logger.debug(f"[缓存命中] 使用缓存的 {kind} 实时行情快照")
+            return entry
+        
+        with self._get_refresh_lock(kind):
+            # 等待期间其他线程可能已经完成刷新
+            entry = self._get_fresh(kind, retry_empty)
+            if entry is not None:
+                logger.debug(f"[缓存命中] 复用其他线程刚刷新的 {kind} 实时行情快照")
+                return entry
+            
+            # 索引在刷新锁内构建一次，所有线程共享
+            df = self._refresh(kind)
+            index = SpotQuoteIndex(df)
+            with self._lock:
+                self._entries[kind] = (df, index, time.time())
+            return df, index
+    
+    def _get_fresh(self, kind: str, retry_empty: bool) -> Optional[Tuple[pd.DataFrame, SpotQuoteIndex]]:
+        """返回未过期的缓存快照及索引，不存在或已过期时返回 None"""
+        with self._lock:
+            entry = self._entries.get(kind)
+        
+        if entry is None:
+            return None
+        
+        df, index, timestamp = entry
+        if time.time() - timestamp >= self.ttl:
+            return None
+        if retry_empty and df.empty:
+            return None
+        return df, index
+    
+    def _get_refresh_lock(self, kind: str) -> threading.Lock:
+        """获取指定快照类型的刷新锁"""
+        with self._lock:
+            lock = self._refresh_locks.get(kind)
+            if lock is None:
+                lock = threading.Lock()
+                self._refresh_locks[kind] = lock
+            return lock
+    
+    def _refresh(self, kind: str) -> pd.DataFrame:
+        """
+        从网络刷新快照（带重试）
+        
+        Returns:
+            行情 DataFrame，最终失败时返回空 DataFrame
+        """
+        loader = self._loaders[kind]
+        last_error: Optional[Exception] = None
+        
+        for attempt in range(1, self.MAX_ATTEMPTS + 1):
+            try:
+                df = get_replay_harness().call('spot', kind, (), loader)
+                if df is not None and not df.empty:
+                    return df
+                last_error = DataFetchError(f"{kind} 行情快照为空")
+            except Exception as e:
+                last_error = e
+            
+            logger.warning(f"[API错误] {kind} 实时行情快照获取失败 "
+                           f"(attempt {attempt}/{self.MAX_ATTEMPTS}): {last_error}")
+            if attempt < self.MAX_ATTEMPTS:
+                time.sleep(min(2 ** attempt, 5))
+        
+        logger.error(f"[API错误] {kind} 实时行情快照最终失败: {last_error}")
+        return pd.DataFrame()
+
+
+def get_spot_snapshot_service() -> SpotSnapshotService:
+    """获取行情快照服务实例的快捷方式"""
+    return SpotSnapshotService.get_instance()
@@ -9,8 +9,8 @@ TushareFetcher - 备用数据源 1 (Priority 2)
 优点：数据质量高、接口稳定
 
 流控策略：
-1. 实现"每分钟调用计数器"
-2. 超过免费配额（80次/分）时，强制休眠到下一分钟
+1. 使用进程级共享令牌桶（按每分钟配额换算为每秒速率），多线程安全
+2. 请求均匀放行，不会在分钟初集中突发后长时间休眠
 3. 使用 tenacity 实现指数退避重试
 """
 
@@ -28,7 +28,11 @@ from tenacity import (
     before_sleep_log,
 )
 
-from .base import BaseFetcher, DataFetchError, RateLimitError, STANDARD_COLUMNS
+from .base import (
+    BaseFetcher, DataFetchError, RateLimitError, STANDARD_COLUMNS,
+    cancellable_sleep, stop_if_fetch_cancelled,
+)
+from .rate_limiter import HOST_TUSHARE
 from config import get_config
 
 logger = logging.getLogger(__name__)
@@ -42,8 +46,7 @@ class TushareFetcher(BaseFetcher):
     数据来源：Tushare Pro API
     
     关键策略：
-    - 每分钟调用计数器，防止超出配额
-    - 超过 80 次/分钟时强制等待
+    - 共享令牌桶限流，防止超出配额（TUSHARE_RATE_LIMIT_PER_MINUTE）
     - 失败后指数退避重试
     
     配额说明（Tushare 免费用户）：
@@ -53,17 +56,11 @@ class TushareFetcher(BaseFetcher):
     
     name = "TushareFetcher"
     priority = 2
+    rate_limit_host = HOST_TUSHARE
+    adjust = 'none'  # daily 接口返回不复权数据
     
-    def __init__(self, rate_limit_per_minute: int = 80):
-        """
-        初始化 TushareFetcher
-        
-        Args:
-            rate_limit_per_minute: 每分钟最大请求数（默认80，Tushare免费配额）
-        """
-        self.rate_limit_per_minute = rate_limit_per_minute
-        self._call_count = 0  # 当前分钟内的调用次数
-        self._minute_start: Optional[float] = None  # 当前计数周期开始时间
+    def __init__(self):
+        """初始化 TushareFetcher"""
         self._api: Optional[object] = None  # Tushare API 实例
         
         # 尝试初始化 API
@@ -96,48 +93,6 @@ class TushareFetcher(BaseFetcher):
             logger.error(f"Tushare API 初始化失败: {e}")
             self._api = None
     
-    def _check_rate_limit(self) -> None:
-        """
-        检查并执行速率限制
-        
-        流控策略：
-        1. 检查是否进入新的一分钟
-        2. 如果是，重置计数器
-        3. 如果当前分钟调用次数超过限制，强制休眠
-        """
-        current_time = time.time()
-        
-        # 检查是否需要重置计数器（新的一分钟）
-        if self._minute_start is None:
-            self._minute_start = current_time
-            self._call_count = 0
-        elif current_time - self._minute_start >= 60:
-            # 已经过了一分钟，重置计数器
-            self._minute_start = current_time
-            self._call_count = 0
-            logger.debug("速率限制计数器已重置")
-        
-        # 检查是否超过配额
-        if self._call_count >= self.rate_limit_per_minute:
-            # 计算需要等待的时间（到下一分钟）
-            elapsed = current_time - self._minute_start
-            sleep_time = max(0, 60 - elapsed) + 1  # +1 秒缓冲
-            
-            logger.warning(
-                f"Tushare 达到速率限制 ({self._call_count}/{self.rate_limit_per_minute} 次/分钟)，"
-                f"等待 {sleep_time:.1f} 秒..."
-            )
-            
-            time.sleep(sleep_time)
-            
-            # 重置计数器
-            self._minute_start = time.time()
-            self._call_count = 0
-        
-        # 增加调用计数
-        self._call_count += 1
-        logger.debug(f"Tushare 当前分钟调用次数: {self._call_count}/{self.rate_limit_per_minute}")
-    
     def _convert_stock_code(self, stock_code: str) -> str:
         """
         转换股票代码为 Tushare 格式
@@ -171,10 +126,11 @@ class TushareFetcher(BaseFetcher):
             return f"{code}.SZ"
     
     @retry(
-        stop=stop_after_attempt(3),
+        stop=(stop_after_attempt(3) | stop_if_fetch_cancelled),
         wait=wait_exponential(multiplier=1, min=2, max=30),
         retry=retry_if_exception_type((ConnectionError, TimeoutError)),
         before_sleep=before_sleep_log(logger, logging.WARNING),
+        sleep=cancellable_sleep,  # 对冲请求被取消时立即结束退避等待
     )
     def _fetch_raw_data(self, stock_code: str, start_date: str, end_date: str) -> pd.DataFrame:
         """
@@ -191,8 +147,8 @@ class TushareFetcher(BaseFetcher):
         if self._api is None:
             raise DataFetchError("Tushare API 未初始化，请检查 Token 配置")
         
-        # 速率限制检查
-        self._check_rate_limit()
+        # 速率限制（所有线程共享 Tushare 令牌桶）
+        self._acquire_rate_limit()
         
         # 转换代码格式
         ts_code = self._convert_stock_code(stock_code)
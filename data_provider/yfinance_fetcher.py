@@ -27,7 +27,11 @@ from tenacity import (
     before_sleep_log,
 )
 
-from .base import BaseFetcher, DataFetchError, STANDARD_COLUMNS
+from .base import (
+    BaseFetcher, DataFetchError, STANDARD_COLUMNS,
+    cancellable_sleep, stop_if_fetch_cancelled,
+)
+from .rate_limiter import HOST_YAHOO
 
 logger = logging.getLogger(__name__)
 
@@ -52,6 +56,8 @@ class YfinanceFetcher(BaseFetcher):
     
     name = "YfinanceFetcher"
     priority = 4
+    rate_limit_host = HOST_YAHOO
+    adjust = 'auto'  # auto_adjust=True
     
     def __init__(self):
         """初始化 YfinanceFetcher"""
@@ -90,10 +96,11 @@ class YfinanceFetcher(BaseFetcher):
             return f"{code}.SZ"
     
     @retry(
-        stop=stop_after_attempt(3),
+        stop=(stop_after_attempt(3) | stop_if_fetch_cancelled),
         wait=wait_exponential(multiplier=1, min=2, max=30),
         retry=retry_if_exception_type((ConnectionError, TimeoutError)),
         before_sleep=before_sleep_log(logger, logging.WARNING),
+        sleep=cancellable_sleep,  # 对冲请求被取消时立即结束退避等待
     )
     def _fetch_raw_data(self, stock_code: str, start_date: str, end_date: str) -> pd.DataFrame:
         """
@@ -111,6 +118,9 @@ class YfinanceFetcher(BaseFetcher):
         # 转换代码格式
         yf_code = self._convert_stock_code(stock_code)
         
+        # 按上游主机限流（所有线程共享）
+        self._acquire_rate_limit()
+        
         logger.debug(f"调用 yfinance.download({yf_code}, {start_date}, {end_date})")
         
         try:
@@ -0,0 +1,387 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+增量技术指标状态
+===================================
+
+职责：
+1. 每只股票维护一份指标状态：最近 60 根收盘价、最近 6 根成交量、各均线窗口的滚动和、EMA 值
+2. 新增一根 K 线或修订最后一根 K 线（盘中刷新）时 O(1) 更新，
+   输出 MA5/10/20/60、EMA12/26/50、量比，不再对整个窗口重新 rolling
+3. 状态持久化到数据库 indicator_state 表（与 stock_daily 同库），跨进程复用
+
+口径：
+- MA5/10/20 与 BaseFetcher._calculate_indicators 一致，min_periods=1（K 线不足窗口时取已有 K 线的均值）
+- MA60 与各 EMA 在累积的 K 线数达到窗口 / 周期之前输出 NaN（未就绪），
+  不用几十根 K 线的短窗口值冒充长周期指标
+- 量比 = 当日成交量 / 前 5 日平均成交量，第一根 K 线记为 1.0
+- EMA 以第一根收盘价为初始值（adjust=False），由于只从本地预热窗口开始累积，
+  与从上市首日计算的 EMA 存在差异，仅适合盘中比较
+
+同步规则：
+- 状态缓冲区（最近 60 根收盘价、最近 6 根成交量）与本地 stock_daily 最后若干根完全一致时才增量更新，
+  否则用本地历史重建（至少 STATE_WARMUP_BARS 根，保存失败、除权修订、人工改库等情况都能自愈）
+- 获取阶段计算出的新状态只暂存在内存中，K 线写库提交后由存储层调用 commit() 落库，
+  落库前同样核对整个窗口；被丢弃、未入库或被整窗修订覆盖的数据不会让状态与数据库不一致
+"""
+
+import json
+import logging
+import math
+import threading
+from collections import deque
+from datetime import date
+from typing import Deque, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+# 均线窗口、EMA 周期、量比的均量窗口
+MA_WINDOWS = (5, 10, 20, 60)
+EMA_SPANS = (12, 26, 50)
+VOLUME_RATIO_WINDOW = 5
+
+# 与 stock_daily 存储列口径一致（min_periods=1）的均线窗口，其余窗口填满前输出 NaN
+PARTIAL_MA_WINDOWS = (5, 10, 20)
+
+# 重建状态时读取的本地历史条数（覆盖 MA60，EMA50 累积两个周期）
+STATE_WARMUP_BARS = 120
+
+# 滚动和每累计更新多少次后用缓冲区重新求和，消除浮点误差累积
+_RESYNC_INTERVAL = 256
+
+
+class IndicatorState:
+    """
+    单只股票的增量指标状态
+    """
+    
+    def __init__(self, code: str):
+        self.code = code
+        self.last_date: Optional[date] = None
+        self.closes: Deque[float] = deque(maxlen=max(MA_WINDOWS))
+        self.volumes: Deque[float] = deque(maxlen=VOLUME_RATIO_WINDOW + 1)
+        self.sums: Dict[int, float] = {w: 0.0 for w in MA_WINDOWS}
+        # 当前 EMA 与上一根 K 线的 EMA（修订最后一根时从上一根重新推导）
+        self.ema: Dict[int, Optional[float]] = {s: None for s in EMA_SPANS}
+        self.ema_prev: Dict[int, Optional[float]] = {s: None for s in EMA_SPANS}
+        # 累积的 K 线根数（判断 MA60 / EMA 是否就绪）
+        self.bars = 0
+        self._updates = 0
+    
+    @classmethod
+    def from_history(cls, code: str, df: pd.DataFrame) -> 'IndicatorState':
+        """
+        由历史日线构建状态（按日期升序逐根累积）
+        
+        Args:
+            code: 股票代码
+            df: 包含 date/close/volume 列的 DataFrame
+        """
+        state = cls(code)
+        df = df.sort_values('date')
+        for bar_date, close, volume in zip(
+            pd.to_datetime(df['date']).dt.date, df['close'].astype(float), df['volume'].astype(float)
+        ):
+            state.update(bar_date, close, volume)
+        return state
+    
+    def update(self, bar_date: date, close: float, volume: float) -> Dict[str, float]:
+        """
+        吸收一根 K 线
+        
+        - bar_date 晚于最后一根：追加
+        - bar_date 等于最后一根：修订（盘中刷新）
+        
+        Returns:
+            更新后的指标值
+        
+        Raises:
+            ValueError: bar_date 早于最后一根（需要重建状态）
+        """
+        if self.last_date is not None and bar_date < self.last_date:
+            raise ValueError(f"{self.code} K 线日期 {bar_date} 早于状态最后日期 {self.last_date}")
+        
+        if self.last_date is not None and bar_date == self.last_date:
+            self._revise(close, volume)
+        else:
+            self._append(close, volume)
+            self.last_date = bar_date
+        
+        self._updates += 1
+        if self._updates % _RESYNC_INTERVAL == 0:
+            self._resync()
+        return self.values()
+    
+    def _append(self, close: float, volume: float) -> None:
+        """追加一根 K 线：每个窗口加入新值、移出离开窗口的旧值"""
+        for window in MA_WINDOWS:
+            if len(self.closes) >= window:
+                self.sums[window] -= self.closes[-window]
+            self.sums[window] += close
+        self.closes.append(close)
+        self.volumes.append(volume)
+        self.bars += 1
+        
+        for span in EMA_SPANS:
+            self.ema_prev[span] = self.ema[span]
+            self.ema[span] = self._next_ema(span, self.ema[span], close)
+    
+    def _revise(self, close: float, volume: float) -> None:
+        """修订最后一根 K 线：滚动和替换差值，EMA 从上一根重新推导"""
+        old_close = self.closes[-1]
+        for window in MA_WINDOWS:
+            self.sums[window] += close - old_close
+        self.closes[-1] = close
+        self.volumes[-1] = volume
+        
+        for span in EMA_SPANS:
+            self.ema[span] = self._next_ema(span, self.ema_prev[span], close)
+    
+    @staticmethod
+    def _next_ema(span: int, prev: Optional[float], close: float) -> float:
+        if prev is None:
+            return close
+        alpha = 2.0 / (span + 1.0)
+        return alpha * close + (1 - alpha) * prev
+    
+    def _resync(self) -> None:
+        """用缓冲区重新计算滚动和"""
+        closes = list(self.closes)
+        for window in MA_WINDOWS:
+            self.sums[window] = math.fsum(closes[-window:])
+    
+    @property
+    def last_close(self) -> Optional[float]:
+        return self.closes[-1] if self.closes else None
+    
+    def matches(self, df: pd.DataFrame) -> bool:
+        """
+        状态窗口是否与日线数据的最后若干根一致（最后日期、窗口内每根收盘价与成交量）
+        
+        Args:
+            df: 按日期升序的日线数据（包含 date/close/volume 列）
+        """
+        if self.last_date is None or df is None or len(df) < len(self.closes):
+            return False
+        if pd.Timestamp(df['date'].iloc[-1]).date() != self.last_date:
+            return False
+        closes = df['close'].to_numpy(dtype=float)[-len(self.closes):]
+        volumes = df['volume'].to_numpy(dtype=float)[-len(self.volumes):]
+        return (
+            np.allclose(closes, np.fromiter(self.closes, dtype=float), rtol=1e-9, atol=0.0)
+            and np.allclose(volumes, np.fromiter(self.volumes, dtype=float), rtol=1e-9, atol=0.0)
+        )
+    
+    def values(self) -> Dict[str, float]:
+        """当前指标值（ma{N}、ema{N}、volume_ratio；未就绪的长周期指标为 NaN）"""
+        result: Dict[str, float] = {}
+        n = len(self.closes)
+        for window in MA_WINDOWS:
+            ready = n >= window or (n > 0 and window in PARTIAL_MA_WINDOWS)
+            result[f'ma{window}'] = self.sums[window] / min(n, window) if ready else np.nan
+        for span in EMA_SPANS:
+            ready = self.bars >= span and self.ema[span] is not None
+            result[f'ema{span}'] = self.ema[span] if ready else np.nan
+        
+        # 与 volume / 前 5 日均量 的数组运算一致：无前值或 0/0 记为 1.0，x/0 为 inf
+        previous = list(self.volumes)[:-1][-VOLUME_RATIO_WINDOW:]
+        volume = self.volumes[-1] if self.volumes else np.nan
+        avg_volume = sum(previous) / len(previous) if previous else np.nan
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ratio = np.float64(volume) / np.float64(avg_volume)
+        result['volume_ratio'] = 1.0 if np.isnan(ratio) else float(ratio)
+        return result
+    
+    def to_json(self) -> str:
+        """序列化（用于持久化）"""
+        return json.dumps({
+            'closes': list(self.closes),
+            'volumes': list(self.volumes),
+            'sums': {str(k): v for k, v in self.sums.items()},
+            'ema': {str(k): v for k, v in self.ema.items()},
+            'ema_prev': {str(k): v for k, v in self.ema_prev.items()},
+            'bars': self.bars,
+        })
+    
+    @classmethod
+    def from_json(cls, code: str, last_date: date, payload: str) -> 'IndicatorState':
+        """反序列化"""
+        data = json.loads(payload)
+        state = cls(code)
+        state.last_date = last_date
+        state.closes.extend(data['closes'])
+        state.volumes.extend(data['volumes'])
+        state.sums = {int(k): v for k, v in data['sums'].items()}
+        state.ema = {int(k): v for k, v in data['ema'].items()}
+        state.ema_prev = {int(k): v for k, v in data['ema_prev'].items()}
+        # 旧版本状态没有记录根数，按缓冲区长度保守估计
+        state.bars = int(data.get('bars', len(state.closes)))
+        return state
+    
+    def copy(self) -> 'IndicatorState':
+        """深拷贝（获取阶段在副本上更新，不改动已提交的状态）"""
+        state = IndicatorState.from_json(self.code, self.last_date, self.to_json())
+        state._updates = self._updates
+        return state
+
+
+class IndicatorStateStore:
+    """
+    指标状态仓库 - 单例模式
+    
+    内存缓存 + 数据库持久化；同一只股票的更新串行执行
+    
+    apply() 计算出的新状态先放入待提交区，对应 K 线写库提交后由存储层调用 commit() 落库
+    """
+    
+    _instance: Optional['IndicatorStateStore'] = None
+    _instance_lock = threading.Lock()
+    
+    def __init__(self):
+        self._states: Dict[str, IndicatorState] = {}
+        self._pending: Dict[str, IndicatorState] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+    
+    @classmethod
+    def get_instance(cls) -> 'IndicatorStateStore':
+        """获取单例实例"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+    
+    @classmethod
+    def reset_instance(cls) -> None:
+        """重置单例（用于测试）"""
+        cls._instance = None
+    
+    def _get_lock(self, code: str) -> threading.Lock:
+        with self._locks_lock:
+            lock = self._locks.get(code)
+            if lock is None:
+                lock = threading.Lock()
+                self._locks[code] = lock
+            return lock
+    
+    def _load(self, code: str) -> Optional[IndicatorState]:
+        """读取状态（内存优先，其次数据库）"""
+        state = self._states.get(code)
+        if state is not None:
+            return state
+        
+        from storage import get_db
+        row = get_db().get_indicator_state(code)
+        if row is None:
+            return None
+        last_date, payload = row
+        try:
+            state = IndicatorState.from_json(code, last_date, payload)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"[指标状态] {code} 状态解析失败，将重建: {e}")
+            return None
+        self._states[code] = state
+        return state
+    
+    def _save(self, state: IndicatorState) -> None:
+        """保存状态（内存 + 数据库，写库失败只记录日志）"""
+        self._states[state.code] = state
+        try:
+            from storage import get_db
+            get_db().save_indicator_state(state.code, state.last_date, state.to_json())
+        except Exception as e:
+            logger.warning(f"[指标状态] {state.code} 保存失败: {e}")
+    
+    def get(self, code: str) -> Optional[IndicatorState]:
+        """获取股票的指标状态（不存在返回 None）"""
+        with self._get_lock(code):
+            return self._load(code)
+    
+    def commit(self, code: str) -> bool:
+        """
+        K 线写库提交后调用：待提交状态的整个窗口与已提交的本地数据一致时落库
+        
+        不一致（待提交状态基于其他数据计算，如除权后整窗修订）时丢弃待提交状态，
+        下次 apply() 用本地历史重建
+        
+        Args:
+            code: 股票代码
+        
+        Returns:
+            是否保存了状态
+        """
+        if code not in self._pending:
+            return False
+        with self._get_lock(code):
+            state = self._pending.pop(code, None)
+            if state is None:
+                return False
+            from storage import get_db
+            committed = get_db().get_daily_frame(code, days=max(len(state.closes), 1))
+            if not state.matches(committed):
+                logger.debug(f"[指标状态] {code} 待提交状态与入库数据不一致，已丢弃")
+                return False
+            self._save(state)
+            return True
+    
+    def discard(self, code: str) -> None:
+        """丢弃待提交状态（本次获取的数据改为整窗重新获取时调用）"""
+        with self._get_lock(code):
+            self._pending.pop(code, None)
+    
+    def apply(self, code: str, df: pd.DataFrame, history: pd.DataFrame) -> pd.DataFrame:
+        """
+        增量计算新获取数据的指标（写入 ma5/ma10/ma20/volume_ratio 列，保留 2 位小数）
+        
+        在已提交状态的副本上更新，结果放入待提交区，数据写库后由 commit() 保存
+        
+        Args:
+            code: 股票代码
+            df: 新获取的日线数据（已清洗，按日期升序，可能与本地历史有重叠）
+            history: 本地最近的日线数据（含已存储的指标列，建议至少 STATE_WARMUP_BARS 根）
+        
+        Returns:
+            写入指标列后的 df
+        """
+        history_dates = pd.to_datetime(history['date']).dt.date
+        
+        with self._get_lock(code):
+            state = self._load(code)
+            if state is not None and state.matches(history):
+                state = state.copy()
+            else:
+                logger.debug(f"[指标状态] {code} 状态与本地数据不同步，用本地历史重建")
+                state = IndicatorState.from_history(code, history)
+            
+            # 早于状态最后一根的重叠 K 线直接沿用本地已存储的指标
+            stored = history.assign(date=history_dates).set_index('date')
+            columns = ('ma5', 'ma10', 'ma20', 'volume_ratio')
+            output = {col: np.full(len(df), np.nan) for col in columns}
+            bar_dates = pd.to_datetime(df['date']).dt.date.tolist()
+            for i, (bar_date, close, volume) in enumerate(zip(
+                bar_dates, df['close'].to_numpy(dtype=float), df['volume'].to_numpy(dtype=float)
+            )):
+                if bar_date < state.last_date:
+                    if bar_date in stored.index:
+                        for col in columns:
+                            output[col][i] = stored.at[bar_date, col] if col in stored.columns else np.nan
+                    continue
+                values = state.update(bar_date, close, volume)
+                for col in columns:
+                    output[col][i] = values[col]
+            
+            self._pending[code] = state
+        
+        for col, array in output.items():
+            df[col] = np.round(array, 2)
+        return df
+
+
+def get_indicator_state_store() -> IndicatorStateStore:
+    """获取指标状态仓库实例的快捷方式"""
+    return IndicatorStateStore.get_instance()
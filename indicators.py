@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+技术指标库（NumPy 实现）
+===================================
+
+职责：
+1. 统一实现 SMA、EMA、ATR、RSI、MACD、滚动最高/最低、量比等指标，
+   数据源入库（BaseFetcher）、趋势分析（StockTrendAnalyzer）、VCP 扫描共用同一套口径
+2. 所有函数同时支持一维数组（单只股票）和二维数组（股票 × 交易日，沿最后一维计算）
+3. compute_indicators() 按名称一次性计算一组指标：
+   收盘价 / 成交量的前缀和只计算一次，所有均线窗口共用，不再逐个 rolling 重复遍历
+
+缺失值约定：
+- SMA / 滚动最高最低 / 量比：窗口内的 NaN 不计数，有效值少于 min_periods 时结果为 NaN（与 pandas rolling 一致）
+- EMA / RSI / ATR：遇到 NaN 沿用上一步的状态（等价于 pandas ewm(ignore_na=True)）
+
+指标名称（compute_indicators 使用）：
+- ma{N}：N 日简单均线，如 ma5、ma60
+- ema{N}：N 日指数均线，如 ema50
+- high{N} / low{N}：N 日最高价 / 最低价
+- atr{N}：N 日平均真实波幅（Wilder 平滑）
+- rsi{N}：N 日 RSI（Wilder 平滑）
+- macd：返回 macd_dif、macd_dea、macd_hist 三列（12/26/9，柱 = 2 × (DIF - DEA)）
+- volume_ratio：量比（当日成交量 / 前 5 日平均成交量）
+"""
+
+import re
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+
+_NAME_PATTERN = re.compile(r'^(ma|ema|high|low|atr|rsi)(\d+)$')
+
+
+def _prefix_sums(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """沿最后一维的前缀和与有效值计数（前端补 0，长度 T+1）"""
+    valid = ~np.isnan(values)
+    pad = [(0, 0)] * (values.ndim - 1) + [(1, 0)]
+    csum = np.pad(np.cumsum(np.where(valid, values, 0.0), axis=-1), pad)
+    ccount = np.pad(np.cumsum(valid, axis=-1), pad)
+    return csum, ccount
+
+
+def _window_sum_count(prefix: Tuple[np.ndarray, np.ndarray], window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """由前缀和差分得到滚动窗口内的求和与有效值计数"""
+    csum, ccount = prefix
+    end = np.arange(1, csum.shape[-1])
+    start = np.maximum(end - window, 0)
+    total = np.take(csum, end, axis=-1) - np.take(csum, start, axis=-1)
+    count = np.take(ccount, end, axis=-1) - np.take(ccount, start, axis=-1)
+    return total, count
+
+
+def sma(values: np.ndarray, window: int, min_periods: Optional[int] = None,
+        _prefix: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> np.ndarray:
+    """
+    简单移动平均
+    
+    Args:
+        values: 一维或二维数组
+        window: 窗口
+        min_periods: 最少有效值个数（默认等于 window）
+    """
+    values = np.asarray(values, dtype=float)
+    min_periods = window if min_periods is None else min_periods
+    total, count = _window_sum_count(_prefix if _prefix is not None else _prefix_sums(values), window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count >= max(min_periods, 1), total / count, np.nan)
+
+
+def ema(values: np.ndarray, span: Optional[int] = None, alpha: Optional[float] = None) -> np.ndarray:
+    """
+    指数移动平均（等价于 pandas ewm(adjust=False, ignore_na=True)）
+    
+    沿交易日方向循环、每步对所有股票做一次向量运算；
+    每只股票的第一根有效值作为初始值，缺失值沿用上一个 EMA
+    
+    Args:
+        values: 一维或二维数组
+        span: 周期（alpha = 2 / (span + 1)）
+        alpha: 平滑系数（与 span 二选一）
+    """
+    values = np.asarray(values, dtype=float)
+    if alpha is None:
+        alpha = 2.0 / (span + 1.0)
+    
+    result = np.empty_like(values)
+    prev = np.full(values.shape[:-1], np.nan)
+    for t in range(values.shape[-1]):
+        x = values[..., t]
+        prev = np.where(np.isnan(prev), x, np.where(np.isnan(x), prev, alpha * x + (1 - alpha) * prev))
+        result[..., t] = prev
+    return result
+
+
+def _rolling_reduce(values: np.ndarray, window: int, reducer, min_periods: int) -> np.ndarray:
+    """滑动窗口视图上的 NaN 安全归约（np.fmax / np.fmin）"""
+    values = np.asarray(values, dtype=float)
+    pad = [(0, 0)] * (values.ndim - 1) + [(window - 1, 0)]
+    padded = np.pad(values, pad, constant_values=np.nan)
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window, axis=-1)
+    result = reducer.reduce(windows, axis=-1)
+    count = np.count_nonzero(~np.isnan(windows), axis=-1)
+    return np.where(count >= max(min_periods, 1), result, np.nan)
+
+
+def rolling_max(values: np.ndarray, window: int, min_periods: Optional[int] = None) -> np.ndarray:
+    """滚动最大值（忽略 NaN）"""
+    return _rolling_reduce(values, window, np.fmax, window if min_periods is None else min_periods)
+
+
+def rolling_min(values: np.ndarray, window: int, min_periods: Optional[int] = None) -> np.ndarray:
+    """滚动最小值（忽略 NaN）"""
+    return _rolling_reduce(values, window, np.fmin, window if min_periods is None else min_periods)
+
+
+def _shift(values: np.ndarray, periods: int = 1) -> np.ndarray:
+    """沿最后一维后移，前端补 NaN"""
+    result = np.full_like(values, np.nan, dtype=float)
+    result[..., periods:] = values[..., :-periods]
+    return result
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, window: int = 14) -> np.ndarray:
+    """平均真实波幅（Wilder 平滑）"""
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    prev_close = _shift(np.asarray(close, dtype=float))
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    return ema(true_range, alpha=1.0 / window)
+
+
+def rsi(close: np.ndarray, window: int = 14) -> np.ndarray:
+    """相对强弱指数（Wilder 平滑，0-100）"""
+    close = np.asarray(close, dtype=float)
+    change = close - _shift(close)
+    gain = ema(np.where(change > 0, change, np.where(np.isnan(change), np.nan, 0.0)), alpha=1.0 / window)
+    loss = ema(np.where(change < 0, -change, np.where(np.isnan(change), np.nan, 0.0)), alpha=1.0 / window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(loss == 0, np.where(gain > 0, 100.0, 50.0), 100.0 - 100.0 / (1.0 + gain / loss))
+
+
+def macd(close: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    MACD（国内口径）
+    
+    Returns:
+        (DIF, DEA, MACD 柱)，MACD 柱 = 2 × (DIF - DEA)
+    """
+    dif = ema(close, fast) - ema(close, slow)
+    dea = ema(dif, signal)
+    return dif, dea, 2 * (dif - dea)
+
+
+def volume_ratio(volume: np.ndarray, window: int = 5, min_periods: int = 1) -> np.ndarray:
+    """
+    量比：当日成交量 / 前 window 日平均成交量
+    
+    第一根 K 线没有可比较的均量，结果为 NaN
+    """
+    volume = np.asarray(volume, dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return volume / _shift(sma(volume, window, min_periods))
+
+
+def compute_indicators(
+    close: np.ndarray,
+    names: Iterable[str],
+    volume: Optional[np.ndarray] = None,
+    high: Optional[np.ndarray] = None,
+    low: Optional[np.ndarray] = None,
+    min_periods: Optional[int] = None
+) -> Dict[str, np.ndarray]:
+    """
+    一次性计算一组指标
+    
+    均线类指标共用一次收盘价前缀和（每个窗口只需 O(T) 的差分），
+    其余指标按需计算，不产生 DataFrame 拷贝
+    
+    Args:
+        close: 收盘价（一维或二维）
+        names: 指标名称，如 ('ma5', 'ma10', 'ma20', 'volume_ratio')
+        volume / high / low: 计算量比、ATR、滚动最高最低时需要
+        min_periods: 均线 / 滚动最高最低的最少有效值个数（默认等于窗口）
+    
+    Returns:
+        {指标名称: 与 close 同形状的数组}（macd 展开为 macd_dif / macd_dea / macd_hist）
+    
+    Raises:
+        ValueError: 未知指标名称或缺少所需的输入
+    """
+    close = np.asarray(close, dtype=float)
+    results: Dict[str, np.ndarray] = {}
+    
+    # 收盘价前缀和：所有 ma{N} 共用
+    prefix = _prefix_sums(close)
+    
+    def require(array: Optional[np.ndarray], name: str) -> np.ndarray:
+        if array is None:
+            raise ValueError(f"指标 {name} 需要额外的输入数据")
+        return np.asarray(array, dtype=float)
+    
+    for name in names:
+        if name in results:
+            continue
+        if name == 'volume_ratio':
+            results[name] = volume_ratio(require(volume, name))
+            continue
+        if name == 'macd':
+            results['macd_dif'], results['macd_dea'], results['macd_hist'] = macd(close)
+            continue
+        
+        match = _NAME_PATTERN.match(name)
+        if match is None:
+            raise ValueError(f"未知的指标: {name}")
+        kind, window = match.group(1), int(match.group(2))
+        periods = window if min_periods is None else min_periods
+        
+        if kind == 'ma':
+            results[name] = sma(close, window, periods, _prefix=prefix)
+        elif kind == 'ema':
+            results[name] = ema(close, window)
+        elif kind == 'high':
+            results[name] = rolling_max(require(high, name), window, periods)
+        elif kind == 'low':
+            results[name] = rolling_min(require(low, name), window, periods)
+        elif kind == 'atr':
+            results[name] = atr(require(high, name), require(low, name), close, window)
+        elif kind == 'rsi':
+            results[name] = rsi(close, window)
+    
+    return results
@@ -21,6 +21,8 @@ A股自选股智能分析系统 - 主调度程序
 - 效率优先：关注筹码集中度好的股票
 - 买点偏好：缩量回踩 MA5/MA10 支撑
 """
+import hashlib
+import json
 import os
 
 # 代理配置 - 仅在本地环境使用，GitHub Actions 不需要
@@ -36,6 +38,7 @@ import logging
 import sys
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict
 from datetime import datetime, date, timezone, timedelta
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
@@ -43,14 +46,16 @@ from typing import List, Dict, Any, Optional, Tuple
 from feishu_doc import FeishuDocManager
 
 from config import get_config, Config
-from storage import get_db, DatabaseManager
+from storage import get_db, DatabaseManager, WriteBehindQueue
 from data_provider import DataFetcherManager
+from data_provider.base import INDICATOR_HISTORY_BARS
 from data_provider.akshare_fetcher import AkshareFetcher, RealtimeQuote, ChipDistribution
 from analyzer import GeminiAnalyzer, AnalysisResult, STOCK_NAME_MAP
 from notification import NotificationService, NotificationChannel, send_daily_report
 from search_service import SearchService, SearchResponse
 from stock_analyzer import StockTrendAnalyzer, TrendAnalysisResult
 from market_analyzer import MarketAnalyzer
+from relative_strength import get_rs_service
 
 # 配置日志格式
 LOG_FORMAT = '%(asctime)s | %(levelname)-8s | %(name)-20s | %(message)s'
@@ -155,6 +160,9 @@ class StockAnalysisPipeline:
         self.analyzer = GeminiAnalyzer()
         self.notifier = NotificationService()
         
+        # 异步写入队列（WRITE_BEHIND_ENABLED 时在 run() 期间创建）
+        self.write_queue: Optional[WriteBehindQueue] = None
+        
         # 初始化搜索服务
         self.search_service = SearchService(
             bocha_keys=self.config.bocha_api_keys,
@@ -172,7 +180,8 @@ class StockAnalysisPipeline:
     def fetch_and_save_stock_data(
         self, 
         code: str,
-        force_refresh: bool = False
+        force_refresh: bool = False,
+        known_fresh: Optional[bool] = None
     ) -> Tuple[bool, Optional[str]]:
         """
         获取并保存单只股票数据
@@ -185,6 +194,7 @@ class StockAnalysisPipeline:
         Args:
             code: 股票代码
             force_refresh: 是否强制刷新（忽略本地缓存）
+            known_fresh: 调用方已批量检查过的结果（None 表示需要单独查询）
             
         Returns:
             Tuple[是否成功, 错误信息]
@@ -192,21 +202,37 @@ class StockAnalysisPipeline:
         try:
             today = date.today()
             
+            if known_fresh is None:
+                known_fresh = self.db.has_today_data(code, today)
+            
             # 断点续传检查：如果今日数据已存在，跳过
-            if not force_refresh and self.db.has_today_data(code, today):
+            if not force_refresh and known_fresh:
                 logger.info(f"[{code}] 今日数据已存在，跳过获取（断点续传）")
                 return True, None
             
-            # 从数据源获取数据
+            # 从数据源获取数据（增量模式只请求本地最后一根 K 线之后的缺口）
             logger.info(f"[{code}] 开始从数据源获取数据...")
-            df, source_name = self.fetcher_manager.get_daily_data(code, days=30)
+            if self.config.incremental_fetch_enabled and not force_refresh:
+                history = self.db.get_daily_frame(code, days=INDICATOR_HISTORY_BARS)
+                df, source_name = self.fetcher_manager.get_daily_data_incremental(
+                    code,
+                    history=history,
+                    days=30,
+                    overlap_bars=self.config.incremental_overlap_bars
+                )
+            else:
+                df, source_name = self.fetcher_manager.get_daily_data(code, days=30)
             
             if df is None or df.empty:
                 return False, "获取数据为空"
             
-            # 保存到数据库
-            saved_count = self.db.save_daily_data(df, code, source_name)
-            logger.info(f"[{code}] 数据保存成功（来源: {source_name}，新增 {saved_count} 条）")
+            # 保存到数据库（异步写入模式下放入队列后立即返回）
+            if self.write_queue is not None:
+                self.write_queue.submit(df, code, source_name)
+                logger.info(f"[{code}] 数据已加入写入队列（来源: {source_name}，{len(df)} 条）")
+            else:
+                saved_count = self.db.save_daily_data(df, code, source_name)
+                logger.info(f"[{code}] 数据保存成功（来源: {source_name}，新增 {saved_count} 条）")
             
             return True, None
             
@@ -222,9 +248,9 @@ class StockAnalysisPipeline:
         流程：
         1. 获取实时行情（量比、换手率）
         2. 获取筹码分布
-        3. 进行趋势分析（基于交易理念）
+        3. 从数据库获取分析上下文（含历史 K 线），进行趋势分析（基于交易理念）
         4. 多维度情报搜索（最新消息+风险排查+业绩预期）
-        5. 从数据库获取分析上下文
+        5. 增强上下文（实时行情、筹码、趋势、RS 评级）
         6. 调用 AI 进行综合分析
         
         Args:
@@ -264,22 +290,38 @@ class StockAnalysisPipeline:
             except Exception as e:
                 logger.warning(f"[{code}] 获取筹码分布失败: {e}")
             
-            # Step 3: 趋势分析（基于交易理念）
+            # Step 3: 获取分析上下文（技术面数据 + 历史 K 线，一次查询，后续步骤复用）
+            # 异步写入模式：先等待本股票刚获取的数据落库（有超时，写线程异常时不会一直阻塞）
+            if self.write_queue is not None and not self.write_queue.wait_for(
+                code, timeout=self.config.write_behind_wait_timeout
+            ):
+                logger.warning(f"[{code}] 最新数据写入失败或等待超时，直接使用数据库已有数据分析")
+            context = self.db.get_analysis_context(code)
+            
+            if context is None:
+                logger.warning(f"[{code}] 无法获取分析上下文，跳过分析")
+                return None
+            
+            # Step 3.1: 趋势分析（基于交易理念）
             trend_result: Optional[TrendAnalysisResult] = None
             try:
-                # 获取历史数据进行趋势分析
-                context = self.db.get_analysis_context(code)
-                if context and 'raw_data' in context:
-                    import pandas as pd
-                    raw_data = context['raw_data']
-                    if isinstance(raw_data, list) and len(raw_data) > 0:
-                        df = pd.DataFrame(raw_data)
-                        trend_result = self.trend_analyzer.analyze(df, code)
-                        logger.info(f"[{code}] 趋势分析: {trend_result.trend_status.value}, "
-                                  f"买入信号={trend_result.buy_signal.value}, 评分={trend_result.signal_score}")
+                raw_data = context.get('raw_data')
+                if raw_data is not None and not raw_data.empty:
+                    trend_result = self.trend_analyzer.analyze(raw_data, code)
+                    logger.info(f"[{code}] 趋势分析: {trend_result.trend_status.value}, "
+                              f"买入信号={trend_result.buy_signal.value}, 评分={trend_result.signal_score}")
             except Exception as e:
                 logger.warning(f"[{code}] 趋势分析失败: {e}")
             
+            # Step 3.5: 全市场相对强度评级（按交易日缓存，全市场只计算一次）
+            rs_rating: Optional[Dict[str, Any]] = None
+            try:
+                rs_rating = get_rs_service().get_rating(code)
+                if rs_rating:
+                    logger.info(f"[{code}] RS 评级: {rs_rating['rs_rating']}")
+            except Exception as e:
+                logger.warning(f"[{code}] 获取 RS 评级失败: {e}")
+            
             # Step 4: 多维度情报搜索（最新消息+风险排查+业绩预期）
             news_context = None
             if self.search_service.is_available:
@@ -303,25 +345,31 @@ class StockAnalysisPipeline:
             else:
                 logger.info(f"[{code}] 搜索服务不可用，跳过情报搜索")
             
-            # Step 5: 获取分析上下文（技术面数据）
-            context = self.db.get_analysis_context(code)
-            
-            if context is None:
-                logger.warning(f"[{code}] 无法获取分析上下文，跳过分析")
-                return None
-            
-            # Step 6: 增强上下文数据（添加实时行情、筹码、趋势分析结果、股票名称）
+            # Step 5: 增强上下文数据（添加实时行情、筹码、趋势分析结果、股票名称）
             enhanced_context = self._enhance_context(
                 context, 
                 realtime_quote, 
                 chip_data, 
                 trend_result,
-                stock_name  # 传入股票名称
+                stock_name,  # 传入股票名称
+                rs_rating
             )
             
-            # Step 7: 调用 AI 分析（传入增强的上下文和新闻）
+            # Step 6: 调用 AI 分析（传入增强的上下文和新闻）
+            # 输入与之前某次分析完全相同时直接返回保存的结果（如推送失败后重跑）
+            input_hash = None
+            if self.config.analysis_cache_enabled:
+                input_hash = self._analysis_input_hash(enhanced_context, news_context)
+                cached_result = self._load_analysis_result(code, input_hash)
+                if cached_result is not None:
+                    logger.info(f"[{code}] 分析输入未变化，复用已保存的分析结果")
+                    return cached_result
+            
             result = self.analyzer.analyze(enhanced_context, news_context=news_context)
             
+            if input_hash is not None and result.success:
+                self._save_analysis_result(code, input_hash, result, enhanced_context.get('date'))
+            
             return result
             
         except Exception as e:
@@ -329,18 +377,53 @@ class StockAnalysisPipeline:
             logger.exception(f"[{code}] 详细错误信息:")
             return None
     
+    @staticmethod
+    def _analysis_input_hash(context: Dict[str, Any], news_context: Optional[str]) -> str:
+        """分析输入（增强上下文 + 新闻情报）的 SHA-256，键排序后序列化，与字典插入顺序无关"""
+        payload = json.dumps(
+            {'context': context, 'news': news_context},
+            ensure_ascii=False, sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def _load_analysis_result(self, code: str, input_hash: str) -> Optional[AnalysisResult]:
+        """读取已保存的分析结果（读取失败或字段不兼容时视为未命中）"""
+        try:
+            data = self.db.get_analysis_result(code, input_hash)
+            return AnalysisResult(**data) if data is not None else None
+        except Exception as e:
+            logger.warning(f"[{code}] 读取已保存的分析结果失败: {e}")
+            return None
+    
+    def _save_analysis_result(
+        self,
+        code: str,
+        input_hash: str,
+        result: AnalysisResult,
+        trade_date: Optional[str] = None
+    ) -> None:
+        """保存分析结果（失败只记录日志）"""
+        try:
+            self.db.save_analysis_result(
+                code, input_hash, asdict(result),
+                trade_date=date.fromisoformat(trade_date) if trade_date else None
+            )
+        except Exception as e:
+            logger.warning(f"[{code}] 保存分析结果失败: {e}")
+    
     def _enhance_context(
         self,
         context: Dict[str, Any],
         realtime_quote: Optional[RealtimeQuote],
         chip_data: Optional[ChipDistribution],
         trend_result: Optional[TrendAnalysisResult],
-        stock_name: str = ""
+        stock_name: str = "",
+        rs_rating: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """
         增强分析上下文
         
-        将实时行情、筹码分布、趋势分析结果、股票名称添加到上下文中
+        将实时行情、筹码分布、趋势分析结果、RS 评级、股票名称添加到上下文中
         
         Args:
             context: 原始上下文
@@ -348,11 +431,14 @@ class StockAnalysisPipeline:
             chip_data: 筹码分布数据
             trend_result: 趋势分析结果
             stock_name: 股票名称
+            rs_rating: 全市场 RS 评级
             
         Returns:
             增强后的上下文
         """
         enhanced = context.copy()
+        # 历史 K 线只用于本地趋势分析，不传给大模型
+        enhanced.pop('raw_data', None)
         
         # 添加股票名称
         if stock_name:
@@ -402,6 +488,10 @@ class StockAnalysisPipeline:
                 'risk_factors': trend_result.risk_factors,
             }
         
+        # 添加相对强度评级（涨幅单位为 %）
+        if rs_rating:
+            enhanced['relative_strength'] = rs_rating
+        
         return enhanced
     
     def _describe_volume_ratio(self, volume_ratio: float) -> str:
@@ -427,7 +517,8 @@ class StockAnalysisPipeline:
         self, 
         code: str,
         skip_analysis: bool = False,
-        single_stock_notify: bool = False
+        single_stock_notify: bool = False,
+        known_fresh: Optional[bool] = None
     ) -> Optional[AnalysisResult]:
         """
         处理单只股票的完整流程
@@ -444,6 +535,7 @@ class StockAnalysisPipeline:
             code: 股票代码
             skip_analysis: 是否跳过 AI 分析
             single_stock_notify: 是否启用单股推送模式（每分析完一只立即推送）
+            known_fresh: 今日数据是否已存在（由 run() 批量预检查得到）
             
         Returns:
             AnalysisResult 或 None
@@ -452,7 +544,7 @@ class StockAnalysisPipeline:
         
         try:
             # Step 1: 获取并保存数据
-            success, error = self.fetch_and_save_stock_data(code)
+            success, error = self.fetch_and_save_stock_data(code, known_fresh=known_fresh)
             
             if not success:
                 logger.warning(f"[{code}] 数据获取失败: {error}")
@@ -545,29 +637,51 @@ class StockAnalysisPipeline:
         
         results: List[AnalysisResult] = []
         
-        # 使用线程池并发处理
-        # 注意：max_workers 设置较低（默认3）以避免触发反爬
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # 提交任务
-            future_to_code = {
-                executor.submit(
-                    self.process_single_stock, 
-                    code, 
-                    skip_analysis=dry_run,
-                    single_stock_notify=single_stock_notify and send_notification
-                ): code
-                for code in stock_codes
-            }
-            
-            # 收集结果
-            for future in as_completed(future_to_code):
-                code = future_to_code[future]
-                try:
-                    result = future.result()
-                    if result:
-                        results.append(result)
-                except Exception as e:
-                    logger.error(f"[{code}] 任务执行失败: {e}")
+        # 断点续传预检查：一次 IN 查询把股票划分为"今日数据已存在"和"需要获取"
+        fresh_codes = self.db.codes_with_data(stock_codes, date.today())
+        logger.info(f"断点续传: {len(fresh_codes)} 只今日数据已存在，"
+                    f"{len(set(stock_codes) - fresh_codes)} 只需要获取")
+        
+        # 异步写入：获取到的数据由后台线程合并批量写入，结束前写完队列
+        if self.config.write_behind_enabled:
+            self.write_queue = WriteBehindQueue(
+                self.db,
+                maxsize=self.config.write_behind_queue_size,
+                batch_rows=self.config.write_behind_batch_rows,
+            )
+        
+        writes_drained = True
+        try:
+            # 使用线程池并发处理
+            # 注意：max_workers 设置较低（默认3）以避免触发反爬
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                # 提交任务
+                future_to_code = {
+                    executor.submit(
+                        self.process_single_stock, 
+                        code, 
+                        skip_analysis=dry_run,
+                        single_stock_notify=single_stock_notify and send_notification,
+                        known_fresh=code in fresh_codes
+                    ): code
+                    for code in stock_codes
+                }
+                
+                # 收集结果
+                for future in as_completed(future_to_code):
+                    code = future_to_code[future]
+                    try:
+                        result = future.result()
+                        if result:
+                            results.append(result)
+                    except Exception as e:
+                        logger.error(f"[{code}] 任务执行失败: {e}")
+        finally:
+            if self.write_queue is not None:
+                writes_drained = self.write_queue.close()
+                self.write_queue = None
+            # 关闭对冲请求线程池，落败的请求不再在后台继续执行
+            self.fetcher_manager.close()
         
         # 统计
         elapsed_time = time.time() - start_time
@@ -575,7 +689,7 @@ class StockAnalysisPipeline:
         # dry-run 模式下，数据获取成功即视为成功
         if dry_run:
             # 检查哪些股票的数据今天已存在
-            success_count = sum(1 for code in stock_codes if self.db.has_today_data(code))
+            success_count = len(self.db.codes_with_data(stock_codes))
             fail_count = len(stock_codes) - success_count
         else:
             success_count = len(results)
@@ -583,6 +697,16 @@ class StockAnalysisPipeline:
         
         logger.info(f"===== 分析完成 =====")
         logger.info(f"成功: {success_count}, 失败: {fail_count}, 耗时: {elapsed_time:.2f} 秒")
+        self.fetcher_manager.log_source_stats()
+        cache_stats = self.db.bar_cache_stats()
+        logger.info(f"K 线缓存: 命中 {cache_stats['hits']} 次，未命中 {cache_stats['misses']} 次")
+        
+        # 立方体同步放在异步写入全部落库之后，避免仍在队列中的 K 线落在同步水位之前被跳过
+        if self.config.ohlcv_cube_enabled:
+            if writes_drained:
+                self._sync_ohlcv_cube()
+            else:
+                logger.warning("[数据立方体] 写入队列未全部落库，跳过本次增量同步")
         
         # 发送通知（单股推送模式下跳过汇总推送，避免重复）
         if results and send_notification and not dry_run:
@@ -595,6 +719,14 @@ class StockAnalysisPipeline:
         
         return results
     
+    def _sync_ohlcv_cube(self) -> None:
+        """把本次写入的日线增量同步到内存映射立方体（失败不影响分析结果）"""
+        try:
+            from ohlcv_cube import OhlcvCube
+            OhlcvCube.sync()
+        except Exception as e:
+            logger.warning(f"[数据立方体] 增量同步失败，可执行 python ohlcv_cube.py build 重建: {e}")
+    
     def _send_notifications(self, results: List[AnalysisResult], skip_push: bool = False) -> None:
         """
         发送分析结果通知
@@ -20,6 +20,8 @@ import akshare as ak
 import pandas as pd
 
 from config import get_config
+from data_provider.replay import get_replay_harness
+from data_provider.spot_snapshot import SNAPSHOT_A_SHARE, get_spot_snapshot_service
 from search_service import SearchService
 
 logger = logging.getLogger(__name__)
@@ -137,7 +139,8 @@ class MarketAnalyzer:
         last_error: Optional[Exception] = None
         for attempt in range(1, attempts + 1):
             try:
-                return fn()
+                # 录制 / 回放模式下按接口名称保存或读取 fixture
+                return get_replay_harness().call('market', fn.__name__, (), fn)
             except Exception as e:
                 last_error = e
                 logger.warning(f"[大盘] {name} 获取失败 (attempt {attempt}/{attempts}): {e}")
@@ -196,27 +199,27 @@ class MarketAnalyzer:
         try:
             logger.info("[大盘] 获取市场涨跌统计...")
             
-            # 获取全部A股实时行情
-            df = self._call_akshare_with_retry(ak.stock_zh_a_spot_em, "A股实时行情", attempts=2)
+            # 获取全部A股实时行情（与个股实时行情共享同一份快照，快照只读）
+            df = get_spot_snapshot_service().get_snapshot(SNAPSHOT_A_SHARE)
             
             if df is not None and not df.empty:
                 # 涨跌统计
                 change_col = '涨跌幅'
                 if change_col in df.columns:
-                    df[change_col] = pd.to_numeric(df[change_col], errors='coerce')
-                    overview.up_count = len(df[df[change_col] > 0])
-                    overview.down_count = len(df[df[change_col] < 0])
-                    overview.flat_count = len(df[df[change_col] == 0])
+                    change = pd.to_numeric(df[change_col], errors='coerce')
+                    overview.up_count = int((change > 0).sum())
+                    overview.down_count = int((change < 0).sum())
+                    overview.flat_count = int((change == 0).sum())
                     
                     # 涨停跌停统计（涨跌幅 >= 9.9% 或 <= -9.9%）
-                    overview.limit_up_count = len(df[df[change_col] >= 9.9])
-                    overview.limit_down_count = len(df[df[change_col] <= -9.9])
+                    overview.limit_up_count = int((change >= 9.9).sum())
+                    overview.limit_down_count = int((change <= -9.9).sum())
                 
                 # 两市成交额
                 amount_col = '成交额'
                 if amount_col in df.columns:
-                    df[amount_col] = pd.to_numeric(df[amount_col], errors='coerce')
-                    overview.total_amount = df[amount_col].sum() / 1e8  # 转为亿元
+                    amount = pd.to_numeric(df[amount_col], errors='coerce')
+                    overview.total_amount = amount.sum() / 1e8  # 转为亿元
                 
                 logger.info(f"[大盘] 涨:{overview.up_count} 跌:{overview.down_count} 平:{overview.flat_count} "
                           f"涨停:{overview.limit_up_count} 跌停:{overview.limit_down_count} "
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+全市场 OHLCV 面板（股票 × 交易日 二维数组）
+===================================
+
+职责：
+1. 从本地 stock_daily 表一次性加载全市场最近 N 个交易日的日线数据
+2. 转换为 (股票数, 交易日数) 的二维 float64 数组，缺失的 K 线为 NaN
+3. 用全市场实时行情快照补上当日 K 线（唯一需要访问网络的部分）
+4. 面板数组可直接传给 indicators 模块的指标函数，一次性处理所有股票
+
+说明：
+- 数组按交易日升序排列，最后一列为最新交易日
+- 停牌、未上市等缺失数据保持 NaN，由上层按有效 K 线数量过滤
+"""
+
+import logging
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+# 面板中的价格/成交列
+PANEL_FIELDS = ('open', 'high', 'low', 'close', 'volume', 'amount')
+
+# 实时行情快照列名（akshare 列名）-> 面板列
+SPOT_FIELD_MAPPING = {
+    '今开': 'open',
+    '最高': 'high',
+    '最低': 'low',
+    '最新价': 'close',
+    '成交量': 'volume',
+    '成交额': 'amount',
+}
+
+# 快照与面板最后一列 OHLC 完全相同的股票占比达到该比例时，视为上一交易日的行情
+# （节假日、开盘前的快照），不再追加重复 K 线；正常交易日只有停牌股票会完全相同
+SPOT_STALE_RATIO = 0.8
+
+
+@dataclass
+class OhlcvPanel:
+    """
+    全市场 OHLCV 面板
+    
+    每个价格/成交字段是一个形状为 (len(codes), len(dates)) 的二维数组
+    """
+    codes: np.ndarray            # 股票代码（object 数组）
+    dates: pd.DatetimeIndex      # 交易日（升序）
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+    amount: np.ndarray
+    
+    def __post_init__(self):
+        self._code_index: Dict[str, int] = {code: i for i, code in enumerate(self.codes)}
+    
+    @property
+    def shape(self):
+        """(股票数, 交易日数)"""
+        return self.close.shape
+    
+    def __len__(self) -> int:
+        return len(self.codes)
+    
+    def find(self, code: str) -> Optional[int]:
+        """返回股票所在的行号，不存在返回 None"""
+        return self._code_index.get(code)
+    
+    def bar_counts(self) -> np.ndarray:
+        """每只股票的有效 K 线数量"""
+        return np.count_nonzero(~np.isnan(self.close), axis=1)
+    
+    def subset(self, rows) -> 'OhlcvPanel':
+        """
+        取部分股票组成新面板
+        
+        Args:
+            rows: 行切片（数组为视图，不拷贝）或行号 / 布尔数组
+        """
+        return OhlcvPanel(
+            codes=self.codes[rows],
+            dates=self.dates,
+            **{field: getattr(self, field)[rows] for field in PANEL_FIELDS}
+        )
+    
+    def slice_days(self, start: Optional[int] = None, stop: Optional[int] = None) -> 'OhlcvPanel':
+        """取部分交易日组成新面板（列切片，数组为视图）"""
+        return OhlcvPanel(
+            codes=self.codes,
+            dates=self.dates[start:stop],
+            **{field: getattr(self, field)[:, start:stop] for field in PANEL_FIELDS}
+        )
+    
+    def align_right(self, fields: Iterable[str] = PANEL_FIELDS) -> Dict[str, np.ndarray]:
+        """
+        把每只股票的有效 K 线（收盘价非 NaN）右对齐，缺失的 K 线挪到左侧
+        
+        对齐后每一行等价于单只股票"只包含有效行"的 DataFrame，
+        最后一列为各自最新的 K 线，此时列不再对应同一交易日
+        
+        Returns:
+            {字段名: 对齐后的二维数组}
+        """
+        order = np.argsort(~np.isnan(self.close), axis=1, kind='stable')
+        return {field: np.take_along_axis(getattr(self, field), order, axis=1) for field in fields}
+    
+    @classmethod
+    def synthetic(cls, n_codes: int, n_days: int, seed: int = 0) -> 'OhlcvPanel':
+        """生成随机游走合成面板（用于基准测试）"""
+        rng = np.random.default_rng(seed)
+        close = 10 * np.cumprod(1 + rng.normal(0.0008, 0.02, (n_codes, n_days)), axis=1)
+        spread = np.abs(rng.normal(0, 0.01, (n_codes, n_days)))
+        return cls(
+            codes=np.array([f"{i:06d}" for i in range(n_codes)], dtype=object),
+            dates=pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=n_days),
+            open=close * (1 + rng.normal(0, 0.005, (n_codes, n_days))),
+            high=close * (1 + spread),
+            low=close * (1 - spread),
+            close=close,
+            volume=rng.lognormal(13, 0.5, (n_codes, n_days)),
+            amount=rng.lognormal(18, 0.5, (n_codes, n_days)),
+        )
+    
+    @classmethod
+    def empty(cls) -> 'OhlcvPanel':
+        """空面板"""
+        arrays = {field: np.empty((0, 0)) for field in PANEL_FIELDS}
+        return cls(codes=np.array([], dtype=object), dates=pd.DatetimeIndex([]), **arrays)
+    
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'OhlcvPanel':
+        """
+        由长表构造面板
+        
+        Args:
+            df: 包含 code/date 及 PANEL_FIELDS 列的 DataFrame（每行一根 K 线，缺少的字段填 NaN）
+        """
+        if df is None or df.empty:
+            return cls.empty()
+        
+        # factorize 得到行号/列号，再用高级索引一次性填充，避免 pivot 的额外拷贝
+        row_idx, codes = pd.factorize(df['code'], sort=True)
+        col_idx, dates = pd.factorize(pd.to_datetime(df['date']), sort=True)
+        shape = (len(codes), len(dates))
+        
+        arrays = {}
+        for field in PANEL_FIELDS:
+            values = np.full(shape, np.nan)
+            if field in df.columns:
+                values[row_idx, col_idx] = pd.to_numeric(df[field], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+            arrays[field] = values
+        
+        return cls(codes=np.asarray(codes, dtype=object), dates=pd.DatetimeIndex(dates), **arrays)
+    
+    @classmethod
+    def load(cls, days: int = 120, end_date: Optional[date] = None) -> 'OhlcvPanel':
+        """
+        从本地数据库加载全市场面板
+        
+        启用内存映射立方体且立方体不落后于数据库时，直接从立方体取视图
+        
+        Args:
+            days: 交易日数量
+            end_date: 截止日期（含，可选）
+        """
+        from config import get_config
+        from storage import get_db
+        
+        if get_config().ohlcv_cube_enabled:
+            try:
+                from ohlcv_cube import load_panel
+                panel = load_panel(days=days, end_date=end_date)
+                if panel is not None:
+                    logger.info(f"[面板] 从数据立方体加载 {panel.shape[0]} 只股票 × {panel.shape[1]} 个交易日")
+                    return panel
+            except Exception as e:
+                logger.warning(f"[面板] 数据立方体读取失败，回退到数据库: {e}")
+        
+        df = get_db().get_daily_panel_frame(days=days, end_date=end_date)
+        panel = cls.from_frame(df)
+        logger.info(f"[面板] 从本地数据库加载 {panel.shape[0]} 只股票 × {panel.shape[1]} 个交易日")
+        return panel
+    
+    def with_spot_bar(self, spot_df: pd.DataFrame, trade_date: Optional[date] = None) -> 'OhlcvPanel':
+        """
+        用全市场实时行情快照补上当日 K 线，返回新面板
+        
+        - 面板最后一个交易日就是 trade_date：用快照覆盖该列（盘中数据更新）
+        - 快照与面板最后一个交易日的行情相同（节假日、开盘前）：返回原面板，不追加重复 K 线
+        - 否则在末尾追加一列
+        - 快照中有、面板中没有的股票（无本地历史）直接忽略
+        - 快照中缺失（NaN）的字段不覆盖面板原值
+        
+        注意：快照的成交量单位为"手"，与各数据源写入 stock_daily 的单位可能不同，
+        当日成交量仅适合与同一来源的数据比较
+        
+        Args:
+            spot_df: 实时行情快照（akshare 列名）
+            trade_date: 当日日期（默认今天）
+        """
+        if spot_df is None or spot_df.empty or len(self) == 0:
+            return self
+        
+        trade_ts = pd.Timestamp(trade_date or date.today())
+        append = len(self.dates) == 0 or self.dates[-1] < trade_ts
+        
+        rows = np.fromiter(
+            (self._code_index.get(code, -1) for code in spot_df['代码'].astype(str)),
+            dtype=np.int64,
+            count=len(spot_df)
+        )
+        matched = rows >= 0
+        spot = {
+            field: pd.to_numeric(spot_df[column], errors='coerce').to_numpy(dtype=float, na_value=np.nan)[matched]
+            for column, field in SPOT_FIELD_MAPPING.items()
+            if column in spot_df.columns
+        }
+        
+        if append and len(self.dates) > 0 and self._is_previous_session(spot, rows[matched]):
+            logger.info(f"[面板] 行情快照与最后一个交易日 {self.dates[-1].date()} 相同（非交易时段），"
+                        f"不追加 {trade_ts.date()} 的 K 线")
+            return self
+        
+        arrays = {}
+        for field in SPOT_FIELD_MAPPING.values():
+            current = getattr(self, field)
+            if append:
+                values = np.concatenate([current, np.full((len(self), 1), np.nan)], axis=1)
+            else:
+                values = current.copy()
+            if field in spot:
+                # 停牌 / 尚未成交的股票快照字段为 "-"（NaN）：保留面板原值，不覆盖已有的 K 线
+                target = rows[matched]
+                values[target, -1] = np.where(np.isnan(spot[field]), values[target, -1], spot[field])
+            arrays[field] = values
+        
+        dates = self.dates.append(pd.DatetimeIndex([trade_ts])) if append else self.dates
+        return OhlcvPanel(codes=self.codes, dates=dates, **arrays)
+    
+    def _is_previous_session(self, spot: Dict[str, np.ndarray], rows: np.ndarray) -> bool:
+        """
+        快照是否仍是面板最后一个交易日的行情
+        
+        按股票比较快照与最后一列的开高低收，完全相同的股票占有效股票的比例达到 SPOT_STALE_RATIO 即视为是
+        
+        Args:
+            spot: 已对齐到面板股票的快照列（面板列名 -> 数组）
+            rows: 快照股票在面板中的行号
+        """
+        if 'close' not in spot or len(rows) == 0:
+            return False
+        last_close = self.close[rows, -1]
+        valid = ~np.isnan(spot['close']) & ~np.isnan(last_close)
+        if not valid.any():
+            return False
+        
+        same = valid
+        for field in ('open', 'high', 'low', 'close'):
+            if field in spot:
+                same = same & np.isclose(spot[field], getattr(self, field)[rows, -1], rtol=0.0, atol=1e-4)
+        return same.sum() >= SPOT_STALE_RATIO * valid.sum()
+
@@ -0,0 +1,435 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+全市场 OHLCV 内存映射数据立方体
+===================================
+
+职责：
+1. 把 stock_daily 全量导出为一个固定布局的 NumPy .npy 文件（字段 × 股票 × 交易日，float64）
+2. 旁边的 index.json 记录 股票代码 -> 行号、交易日 -> 列号 的映射
+3. 读取方以 mmap 方式打开，按需取最近 N 个交易日，直接得到 OhlcvPanel（各字段是零拷贝视图）
+4. 每日增量同步：只取 stock_daily 中上次同步后写入 / 更新的行，写入立方体的对应位置；
+   同步水位（synced_at）记录实际读到的最大 updated_at，而不是本机当前时间，
+   数据库中存在晚于水位的写入 / 修订时读取方回退到数据库
+
+目录结构：
+    {root}/index.json                 # 代码 / 交易日索引及当前数据文件名
+    {root}/cube-{版本号}.npy           # 形状 (字段数, 股票容量, 交易日容量)
+
+布局说明：
+- 以字段为最外层维度，每个字段是一块连续的 (股票, 交易日) 二维数组，
+  截取交易日区间时各字段都是普通切片视图，与 OhlcvPanel 的数组布局一致
+- 股票和交易日两个维度都预留空余容量，新交易日 / 新股票在容量内原地写入；
+  超出容量或需要插入到中间时，生成新版本文件后切换索引，旧文件随后删除
+- 先写数据再原子替换索引，读取方只看索引中已登记的行列，不会读到半截数据
+
+用法：
+    python ohlcv_cube.py build    # 从 SQLite 全量构建
+    python ohlcv_cube.py sync     # 增量同步（不存在时自动构建）
+    python ohlcv_cube.py info     # 查看立方体信息
+"""
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from market_panel import PANEL_FIELDS, OhlcvPanel
+
+logger = logging.getLogger(__name__)
+
+
+try:
+    import fcntl
+except ImportError:  # Windows：不做跨进程写锁
+    fcntl = None
+
+
+# 交易日维度的空余容量（约一年）
+DAY_SLACK = 260
+
+# 股票维度的空余容量
+CODE_SLACK = 256
+
+# 增量同步向前多取的时间（覆盖上次同步时尚未提交的写入，重复写入同一值无副作用）
+SYNC_OVERLAP = timedelta(minutes=10)
+
+
+def _watermark(df: pd.DataFrame, previous: Optional[str] = None) -> Optional[str]:
+    """同步水位：本次读到的最大 updated_at（没有读到新行时沿用上次的水位）"""
+    latest = pd.to_datetime(df['updated_at']).max() if 'updated_at' in df.columns and not df.empty else pd.NaT
+    if pd.isna(latest):
+        return previous
+    if previous is not None and latest.to_pydatetime() <= datetime.fromisoformat(previous):
+        return previous
+    return latest.to_pydatetime().isoformat()
+
+_INDEX = 'index.json'
+_LOCK = '.lock'
+
+# 读取方缓存：(索引路径, 修改时间) -> 已打开的立方体
+_reader_cache: Dict[str, object] = {}
+_reader_lock = threading.Lock()
+
+
+def _default_root() -> Path:
+    from config import get_config
+    return Path(get_config().ohlcv_cube_dir)
+
+
+@contextmanager
+def _writer_lock(root: Path):
+    """跨进程写锁，同一时间只有一个进程修改立方体"""
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / _LOCK, 'a') as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+class OhlcvCube:
+    """
+    全市场 OHLCV 内存映射立方体
+    
+    data 的形状为 (len(PANEL_FIELDS), 股票容量, 交易日容量)，
+    只有前 n_codes 行、前 n_days 列是有效区域，其余为 NaN
+    """
+    
+    def __init__(self, root: Path, index: Dict[str, object], data: np.ndarray):
+        self.root = root
+        self.index = index
+        self.data = data
+        self.codes = np.asarray(index['codes'], dtype=object)
+        self.dates = pd.DatetimeIndex(pd.to_datetime(index['dates']))
+    
+    @property
+    def n_codes(self) -> int:
+        return len(self.codes)
+    
+    @property
+    def n_days(self) -> int:
+        return len(self.dates)
+    
+    @property
+    def capacity(self):
+        """(股票容量, 交易日容量)"""
+        return self.data.shape[1:]
+    
+    @property
+    def last_date(self) -> Optional[date]:
+        return self.dates[-1].date() if self.n_days else None
+    
+    # === 打开 ===
+    
+    @staticmethod
+    def _read_index(root: Path) -> Optional[Dict[str, object]]:
+        try:
+            return json.loads((root / _INDEX).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+    
+    @classmethod
+    def open(cls, root: Optional[str] = None, writable: bool = False) -> Optional['OhlcvCube']:
+        """
+        打开立方体
+        
+        Args:
+            root: 目录（可选，默认从配置读取）
+            writable: 是否以读写方式映射（仅同步进程使用）
+        
+        Returns:
+            立方体，尚未构建时返回 None
+        """
+        root = Path(root) if root is not None else _default_root()
+        index = cls._read_index(root)
+        if index is None:
+            return None
+        data = np.load(root / index['file'], mmap_mode='r+' if writable else 'r')
+        if list(index['fields']) != list(PANEL_FIELDS):
+            raise ValueError(f"立方体字段 {index['fields']} 与面板字段不一致，请重新构建")
+        return cls(root, index, data)
+    
+    # === 读取 ===
+    
+    def to_panel(self, days: Optional[int] = None, end_date: Optional[date] = None,
+                 drop_empty: bool = True) -> OhlcvPanel:
+        """
+        取最近 N 个交易日组成面板
+        
+        Args:
+            days: 交易日数量（可选，默认全部）
+            end_date: 截止日期（含，可选）
+            drop_empty: 去掉区间内没有任何 K 线的股票（与从数据库加载的面板一致）；
+                        全部股票都有数据时各字段为零拷贝视图，否则按行取出（拷贝）
+        """
+        end = self.n_days if end_date is None else int(self.dates.searchsorted(pd.Timestamp(end_date), side='right'))
+        start = 0 if days is None else max(0, end - days)
+        if end <= start or self.n_codes == 0:
+            return OhlcvPanel.empty()
+        
+        arrays = {field: self.data[k, :self.n_codes, start:end] for k, field in enumerate(PANEL_FIELDS)}
+        codes = self.codes
+        if drop_empty:
+            has_bars = ~np.isnan(arrays['close']).all(axis=1)
+            if not has_bars.all():
+                arrays = {field: values[has_bars] for field, values in arrays.items()}
+                codes = codes[has_bars]
+        return OhlcvPanel(codes=codes, dates=self.dates[start:end], **arrays)
+    
+    # === 写入 ===
+    
+    def _write_index(self, **extra) -> None:
+        self.index.update(
+            codes=list(self.codes),
+            dates=[d.strftime('%Y-%m-%d') for d in self.dates],
+            **extra
+        )
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        os.close(fd)
+        try:
+            Path(tmp_path).write_text(json.dumps(self.index, ensure_ascii=False), encoding='utf-8')
+            os.replace(tmp_path, self.root / _INDEX)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
+    @staticmethod
+    def _allocate(root: Path, version: int, n_codes: int, n_days: int) -> np.ndarray:
+        """创建新版本数据文件（带空余容量，初始为 NaN）"""
+        shape = (len(PANEL_FIELDS), n_codes + CODE_SLACK, n_days + DAY_SLACK)
+        data = np.lib.format.open_memmap(root / f'cube-{version:06d}.npy', mode='w+', dtype=np.float64, shape=shape)
+        data[:] = np.nan
+        return data
+    
+    def _reshape(self, codes: np.ndarray, dates: pd.DatetimeIndex) -> None:
+        """
+        按新的（有序、包含原有全部元素的）代码 / 交易日列表生成新版本文件
+        
+        原有数据按新位置拷贝过去，切换到新文件（索引在写入数据后再更新）
+        """
+        version = int(self.index.get('version', 0)) + 1
+        data = self._allocate(self.root, version, len(codes), len(dates))
+        rows = pd.Index(codes).get_indexer(self.codes)
+        cols = pd.Index(dates).get_indexer(self.dates)
+        if self.n_codes and self.n_days:
+            for k in range(len(PANEL_FIELDS)):
+                data[k][np.ix_(rows, cols)] = self.data[k, :self.n_codes, :self.n_days]
+        
+        self.index.update(file=f'cube-{version:06d}.npy', version=version)
+        self.data, self.codes, self.dates = data, codes, dates
+        logger.info(f"[数据立方体] 扩容为 {data.shape[1]} 只 × {data.shape[2]} 日（版本 {version}）")
+    
+    def write(self, df: pd.DataFrame) -> int:
+        """
+        写入日线长表（同一 (code, date) 覆盖原值）
+        
+        新代码 / 新交易日都排在末尾且容量足够时原地写入，否则先生成新版本文件
+        写入后刷新数据文件，再由调用方更新索引
+        
+        Returns:
+            写入的行数
+        """
+        if df is None or df.empty:
+            return 0
+        
+        df_codes = df['code'].astype(str).to_numpy(dtype=object)
+        df_dates = pd.DatetimeIndex(pd.to_datetime(df['date']))
+        new_codes = np.setdiff1d(df_codes, self.codes)
+        new_dates = df_dates.unique().difference(self.dates)
+        
+        appends_only = (
+            (len(new_codes) == 0 or self.n_codes == 0 or new_codes.min() > self.codes[-1])
+            and (len(new_dates) == 0 or self.n_days == 0 or new_dates.min() > self.dates[-1])
+        )
+        fits = self.n_codes + len(new_codes) <= self.capacity[0] and self.n_days + len(new_dates) <= self.capacity[1]
+        codes = np.concatenate([self.codes, new_codes]).astype(object) if len(new_codes) else self.codes
+        dates = self.dates.append(new_dates) if len(new_dates) else self.dates
+        if appends_only and fits:
+            self.codes, self.dates = codes, dates
+        else:
+            self._reshape(np.sort(codes), dates.sort_values())
+        
+        rows = pd.Index(self.codes).get_indexer(df_codes)
+        cols = self.dates.get_indexer(df_dates)
+        for k, field in enumerate(PANEL_FIELDS):
+            if field in df.columns:
+                self.data[k, rows, cols] = pd.to_numeric(df[field], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        self.data.flush()
+        return len(df)
+    
+    def _remove_stale_files(self) -> None:
+        """删除不再被索引引用的旧版本文件（其他进程仍映射着时 Windows 下会失败，留待下次）"""
+        for path in self.root.glob('cube-*.npy'):
+            if path.name != self.index['file']:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+    
+    # === 构建 / 同步 ===
+    
+    @classmethod
+    def build(cls, root: Optional[str] = None) -> 'OhlcvCube':
+        """
+        从 SQLite 全量构建（逐年读取，生成新版本文件后切换索引）
+        """
+        from storage import get_db
+        
+        root = Path(root) if root is not None else _default_root()
+        db = get_db()
+        with _writer_lock(root):
+            old_index = cls._read_index(root) or {}
+            columns = ['code', 'date'] + list(PANEL_FIELDS)
+            frames: List[pd.DataFrame] = []
+            bounds = db.get_daily_date_bounds()
+            if bounds is not None:
+                for year in range(bounds[0].year, bounds[1].year + 1):
+                    df = db.get_daily_frame_between(date(year, 1, 1), date(year, 12, 31), with_updated_at=True)
+                    if not df.empty:
+                        frames.append(df[columns + ['updated_at']])
+            df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns + ['updated_at'])
+            synced_at = _watermark(df)
+            
+            index = {
+                'fields': list(PANEL_FIELDS),
+                'codes': [],
+                'dates': [],
+                'version': int(old_index.get('version', 0)),
+            }
+            version = index['version'] + 1
+            codes = np.sort(df['code'].astype(str).unique()).astype(object)
+            dates = pd.DatetimeIndex(pd.to_datetime(df['date']).unique()).sort_values()
+            data = cls._allocate(root, version, len(codes), len(dates))
+            index.update(file=f'cube-{version:06d}.npy', version=version)
+            
+            cube = cls(root, index, data)
+            cube.codes, cube.dates = codes, dates
+            cube.write(df[columns])
+            cube._write_index(synced_at=synced_at, built_at=datetime.now().isoformat())
+            cube._remove_stale_files()
+        
+        logger.info(f"[数据立方体] 构建完成: {cube.n_codes} 只 × {cube.n_days} 个交易日，{len(df)} 根 K 线")
+        return cube
+    
+    @classmethod
+    def sync(cls, root: Optional[str] = None) -> 'OhlcvCube':
+        """
+        增量同步：写入上次同步之后 stock_daily 中新增 / 更新的行（尚未构建时全量构建）
+        """
+        from storage import get_db
+        
+        root = Path(root) if root is not None else _default_root()
+        if cls._read_index(root) is None:
+            return cls.build(root)
+        
+        db = get_db()
+        with _writer_lock(root):
+            cube = cls.open(root, writable=True)
+            previous = cube.index.get('synced_at')
+            since = datetime.fromisoformat(previous) - SYNC_OVERLAP if previous else None
+            df = db.get_daily_frame_between(date.min, date.max, updated_since=since, with_updated_at=True)
+            rows = cube.write(df)
+            cube._write_index(synced_at=_watermark(df, previous))
+            cube._remove_stale_files()
+        
+        logger.info(f"[数据立方体] 增量同步 {rows} 根 K 线，当前 {cube.n_codes} 只 × {cube.n_days} 个交易日")
+        return cube
+    
+    def info(self) -> Dict[str, object]:
+        """立方体概况"""
+        return {
+            'file': self.index['file'],
+            'codes': self.n_codes,
+            'days': self.n_days,
+            'capacity': tuple(self.capacity),
+            'first_date': self.dates[0].date() if self.n_days else None,
+            'last_date': self.last_date,
+            'synced_at': self.index.get('synced_at'),
+            'size_mb': round(self.data.nbytes / 1024 / 1024, 1),
+        }
+
+
+def open_cube_cached(root: Optional[str] = None) -> Optional[OhlcvCube]:
+    """
+    以只读方式打开立方体（进程内缓存，索引文件变化后重新打开）
+    """
+    root = Path(root) if root is not None else _default_root()
+    try:
+        mtime = (root / _INDEX).stat().st_mtime_ns
+    except OSError:
+        return None
+    
+    key = str(root)
+    with _reader_lock:
+        cached = _reader_cache.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        cube = OhlcvCube.open(root)
+        _reader_cache[key] = (mtime, cube)
+        return cube
+
+
+def load_panel(days: int = 120, end_date: Optional[date] = None,
+               root: Optional[str] = None) -> Optional[OhlcvPanel]:
+    """
+    从立方体加载全市场面板
+    
+    立方体未构建、落后于 stock_daily 的最新交易日、或数据库有同步水位之后写入 / 修订的行时返回 None，
+    由调用方回退到数据库
+    """
+    from storage import get_db
+    
+    cube = open_cube_cached(root)
+    if cube is None or cube.n_days == 0:
+        return None
+    db = get_db()
+    latest = db.get_latest_daily_date(end_date)
+    end = cube.n_days if end_date is None else int(cube.dates.searchsorted(pd.Timestamp(end_date), side='right'))
+    if latest is not None and (end == 0 or cube.dates[end - 1].date() < latest):
+        logger.info(f"[数据立方体] 立方体落后于数据库（最新交易日 {latest}），从数据库加载")
+        return None
+    synced_at = cube.index.get('synced_at')
+    updated_at = db.get_latest_update_time()
+    if updated_at is not None and (synced_at is None or updated_at > datetime.fromisoformat(synced_at)):
+        logger.info(f"[数据立方体] 数据库有 {synced_at} 之后写入的 K 线，从数据库加载"
+                    f"（执行 python ohlcv_cube.py sync 同步）")
+        return None
+    return cube.to_panel(days, end_date)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='全市场 OHLCV 内存映射立方体维护')
+    parser.add_argument('command', choices=['build', 'sync', 'info'], help='build: 从 SQLite 全量构建；sync: 增量同步；info: 查看信息')
+    parser.add_argument('--root', default=None, help='立方体目录（默认从配置读取）')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)-8s | %(message)s')
+    
+    if args.command == 'build':
+        cube = OhlcvCube.build(args.root)
+    elif args.command == 'sync':
+        cube = OhlcvCube.sync(args.root)
+    else:
+        cube = OhlcvCube.open(args.root)
+        if cube is None:
+            print("立方体尚未构建，请先执行 python ohlcv_cube.py build")
+            return
+    for key, value in cube.info().items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+趋势评分阈值的并行参数扫描
+===================================
+
+职责：
+1. 对 SignalParams（MA 支撑容忍度、放量/缩量阈值、乖离率分档等）的参数网格逐组回测
+2. 与参数无关的特征（均线排列、乖离率、量比、远期收益）只计算一次，
+   放入共享内存（multiprocessing.shared_memory），各工作进程直接映射，不复制面板
+3. 每组参数只做阈值比较 + bincount 汇总，输出"买入 / 强烈买入"信号的样本数、平均收益、胜率
+4. 按任意两个参数输出收益 / 胜率曲面（其余参数取平均）
+
+用法：
+    python param_sweep.py                                   # 默认网格，本地最近 500 个交易日
+    python param_sweep.py --workers 8 --days 750
+    python param_sweep.py --grid volume_heavy_ratio=1.3,1.5,2 --grid bias_threshold=3,5,8
+    python param_sweep.py --synthetic 3000                  # 合成面板测试耗时
+"""
+
+import argparse
+import itertools
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, fields, replace
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from backtest import (
+    CHUNK_SIZE, DEFAULT_HORIZONS, SIGNAL_ORDER, SignalFeatures, SignalParams,
+    compute_features, forward_returns, score_features,
+)
+from market_panel import OhlcvPanel
+from stock_analyzer import BuySignal
+
+logger = logging.getLogger(__name__)
+
+
+# 默认参数网格（3^4 = 81 组）
+DEFAULT_GRID: Dict[str, Tuple[float, ...]] = {
+    'ma_support_tolerance': (0.01, 0.02, 0.03),
+    'volume_heavy_ratio': (1.3, 1.5, 2.0),
+    'volume_shrink_ratio': (0.6, 0.7, 0.8),
+    'bias_threshold': (3.0, 5.0, 8.0),
+}
+
+# 统计的信号分组：(列名前缀, 包含的信号)
+SIGNAL_GROUPS = (
+    ('buy', (BuySignal.STRONG_BUY, BuySignal.BUY)),
+    ('strong', (BuySignal.STRONG_BUY,)),
+)
+
+# 工作进程中映射好的样本数组（由 _init_worker 填充）
+_worker_arrays: Dict[str, np.ndarray] = {}
+_worker_blocks: List[shared_memory.SharedMemory] = []
+
+
+@dataclass
+class SweepResult:
+    """参数扫描结果"""
+    table: pd.DataFrame           # 每组参数一行：参数列 + 各信号分组的样本数 / 平均收益 / 胜率
+    grid: Dict[str, Tuple[float, ...]]
+    horizons: Tuple[int, ...]
+    n_samples: int = 0
+    elapsed: float = 0.0          # 耗时（秒）
+    
+    def surface(self, x: str, y: str, metric: str = 'buy_win_5d') -> pd.DataFrame:
+        """
+        两个参数的指标曲面（行为 y，列为 x，其余参数取平均）
+        
+        Args:
+            x / y: 参数名
+            metric: 指标列名，如 buy_ret_10d、strong_win_5d
+        """
+        return self.table.pivot_table(index=y, columns=x, values=metric, aggfunc='mean')
+    
+    def best(self, metric: str = 'buy_ret_5d', top: int = 10, min_samples: int = 100) -> pd.DataFrame:
+        """按指标排序的最优参数组合（样本数太少的组合不参与排序）"""
+        prefix = metric.split('_', 1)[0]
+        table = self.table[self.table[f'{prefix}_samples'] >= min_samples]
+        return table.sort_values(metric, ascending=False).head(top)
+    
+    def format_report(self, metric: str = 'buy_ret_5d', top: int = 10) -> str:
+        """格式化为文本报告：最优组合 + 前两个参数的曲面"""
+        prefix = metric.split('_', 1)[0]
+        columns = list(self.grid) + [col for col in self.table.columns if col.startswith(f'{prefix}_')]
+        lines = [
+            "=== 趋势评分参数扫描 ===",
+            f"参数组合: {len(self.table)}，评分样本: {self.n_samples}，耗时: {self.elapsed:.2f}s",
+            "",
+            f"【最优组合（按 {metric}）】",
+            self.best(metric, top)[columns].to_string(index=False, float_format=lambda v: f"{v:.3f}"),
+        ]
+        names = list(self.grid)
+        if len(names) >= 2:
+            lines += [
+                "",
+                f"【{metric} 曲面：{names[1]} × {names[0]}】",
+                self.surface(names[0], names[1], metric).to_string(float_format=lambda v: f"{v:.3f}"),
+            ]
+        return "\n".join(lines)
+
+
+def build_samples(panel: OhlcvPanel, horizons: Sequence[int] = DEFAULT_HORIZONS,
+                  chunk_size: int = CHUNK_SIZE) -> Dict[str, np.ndarray]:
+    """
+    计算所有参与统计的 K 线的特征和远期收益（展开为一维数组）
+    
+    Returns:
+        {特征名 / ret_{N}d: 一维数组}
+    """
+    parts: Dict[str, List[np.ndarray]] = {}
+    for lo in range(0, len(panel), chunk_size):
+        features, close, valid = compute_features(panel.subset(slice(lo, lo + chunk_size)))
+        chunk = features.compress(valid).arrays()
+        chunk['base_trend'] = chunk['base_trend'].astype(np.int8)
+        for h in horizons:
+            chunk[f'ret_{h}d'] = forward_returns(close, h)[valid]
+        for name, values in chunk.items():
+            parts.setdefault(name, []).append(values)
+    return {name: np.concatenate(values) for name, values in parts.items()}
+
+
+def evaluate(samples: Dict[str, np.ndarray], params: SignalParams,
+             horizons: Sequence[int]) -> Dict[str, Any]:
+    """
+    用一组参数评分并汇总各信号分组的远期收益
+    
+    Returns:
+        {列名: 值}：{分组}_samples、{分组}_ret_{N}d（平均收益 %）、{分组}_win_{N}d（胜率 %）
+    """
+    features = SignalFeatures(**{f.name: samples[f.name] for f in fields(SignalFeatures)})
+    _, signal, _ = score_features(features, params)
+    
+    row: Dict[str, Any] = {}
+    for prefix, group in SIGNAL_GROUPS:
+        selected = np.isin(signal, [SIGNAL_ORDER.index(s) for s in group])
+        row[f'{prefix}_samples'] = int(selected.sum())
+        for h in horizons:
+            ret = samples[f'ret_{h}d'][selected]
+            ret = ret[~np.isnan(ret)]
+            row[f'{prefix}_ret_{h}d'] = float(ret.mean()) if len(ret) else np.nan
+            row[f'{prefix}_win_{h}d'] = float((ret > 0).mean() * 100) if len(ret) else np.nan
+    return row
+
+
+def _expand_grid(grid: Dict[str, Sequence[float]]) -> List[Dict[str, float]]:
+    """参数网格展开为组合列表（校验参数名）"""
+    known = {f.name for f in fields(SignalParams)}
+    unknown = set(grid) - known
+    if unknown:
+        raise ValueError(f"未知的参数: {', '.join(sorted(unknown))}（可选: {', '.join(sorted(known))}）")
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def _share_arrays(arrays: Dict[str, np.ndarray]) -> Tuple[List[shared_memory.SharedMemory], Dict[str, tuple]]:
+    """把数组复制到共享内存，返回 (共享内存块, {名称: (块名, 形状, dtype)})"""
+    blocks, specs = [], {}
+    for name, values in arrays.items():
+        block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[...] = values
+        blocks.append(block)
+        specs[name] = (block.name, values.shape, values.dtype.str)
+    return blocks, specs
+
+
+def _init_worker(specs: Dict[str, tuple]) -> None:
+    """工作进程初始化：映射共享内存中的样本数组（只读，不复制）"""
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        array.flags.writeable = False
+        _worker_arrays[name] = array
+        _worker_blocks.append(block)
+
+
+def _evaluate_batch(combos: List[Dict[str, float]], base: SignalParams,
+                    horizons: Tuple[int, ...]) -> List[Dict[str, Any]]:
+    """工作进程任务：评估一批参数组合"""
+    return [{**combo, **evaluate(_worker_arrays, replace(base, **combo), horizons)} for combo in combos]
+
+
+def run_sweep(
+    panel: OhlcvPanel,
+    grid: Optional[Dict[str, Sequence[float]]] = None,
+    horizons: Sequence[int] = DEFAULT_HORIZONS,
+    workers: Optional[int] = None,
+    base: Optional[SignalParams] = None
+) -> SweepResult:
+    """
+    并行参数扫描
+    
+    Args:
+        panel: 全市场面板
+        grid: {SignalParams 字段名: 取值列表}（默认 DEFAULT_GRID）
+        horizons: 统计的持有周期（交易日）
+        workers: 进程数（默认 CPU 核数；1 表示在当前进程串行执行）
+        base: 网格之外的参数取值（默认 SignalParams()）
+    
+    Returns:
+        SweepResult
+    
+    Raises:
+        ValueError: 网格中有未知的参数名
+    """
+    grid = {name: tuple(values) for name, values in (grid or DEFAULT_GRID).items()}
+    horizons = tuple(horizons)
+    base = base or SignalParams()
+    combos = _expand_grid(grid)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(combos)))
+    start = time.perf_counter()
+    
+    samples = build_samples(panel, horizons)
+    n_samples = len(samples['bias'])
+    logger.info(f"[参数扫描] 样本 {n_samples}，参数组合 {len(combos)}，进程数 {workers}，"
+                f"特征计算耗时 {time.perf_counter() - start:.2f}s")
+    
+    if workers == 1:
+        rows = [{**combo, **evaluate(samples, replace(base, **combo), horizons)} for combo in combos]
+    else:
+        blocks, specs = _share_arrays(samples)
+        del samples
+        try:
+            # 每个进程分到若干批，兼顾负载均衡和进程间通信次数
+            batch_size = max(1, len(combos) // (workers * 4))
+            batches = [combos[i:i + batch_size] for i in range(0, len(combos), batch_size)]
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(specs,)) as pool:
+                futures = [pool.submit(_evaluate_batch, batch, base, horizons) for batch in batches]
+                rows = [row for future in futures for row in future.result()]
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+    
+    result = SweepResult(
+        table=pd.DataFrame(rows),
+        grid=grid,
+        horizons=horizons,
+        n_samples=n_samples,
+        elapsed=time.perf_counter() - start,
+    )
+    logger.info(f"[参数扫描] 完成 {len(combos)} 组参数，耗时 {result.elapsed:.2f}s")
+    return result
+
+
+def _parse_grid(items: Sequence[str]) -> Dict[str, Tuple[float, ...]]:
+    """解析命令行网格参数：name=v1,v2,..."""
+    grid = {}
+    for item in items:
+        name, _, values = item.partition('=')
+        if not values:
+            raise ValueError(f"网格参数格式应为 name=v1,v2,...: {item}")
+        grid[name.strip()] = tuple(float(v) for v in values.split(',') if v.strip())
+    return grid
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='趋势评分阈值的并行参数扫描')
+    parser.add_argument('--days', type=int, default=500, help='回测的交易日数量（默认 500）')
+    parser.add_argument('--workers', type=int, default=None, help='进程数（默认 CPU 核数）')
+    parser.add_argument('--grid', action='append', default=[], metavar='NAME=V1,V2',
+                        help='参数网格，可重复指定（默认使用内置网格）')
+    parser.add_argument('--metric', type=str, default='buy_ret_5d', help='排序与曲面使用的指标（默认 buy_ret_5d）')
+    parser.add_argument('--output', type=str, default=None, help='完整结果保存为 CSV')
+    parser.add_argument('--synthetic', type=int, default=0, metavar='N',
+                        help='使用 N 只股票的合成面板代替本地数据（测试耗时）')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)-8s | %(message)s')
+    
+    if args.synthetic:
+        panel = OhlcvPanel.synthetic(args.synthetic, args.days)
+    else:
+        panel = OhlcvPanel.load(days=args.days)
+    if len(panel) == 0:
+        logger.error("本地数据库没有日线数据，请先运行数据拉取")
+        return
+    
+    result = run_sweep(panel, grid=_parse_grid(args.grid) or None, workers=args.workers)
+    print(result.format_report(metric=args.metric))
+    if args.output:
+        result.table.to_csv(args.output, index=False)
+        logger.info(f"[参数扫描] 结果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
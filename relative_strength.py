@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+全市场相对强度（RS）评级
+===================================
+
+职责：
+1. 基于本地 stock_daily 全市场面板，一次性计算所有股票的加权涨幅：
+   RS 分数 = 0.4 × 3个月涨幅 + 0.2 × 6个月涨幅 + 0.2 × 9个月涨幅 + 0.2 × 12个月涨幅
+2. 对 RS 分数做一次横截面排序，得到 1-99 的百分位评级（RS Rating）
+3. 每个交易日的结果写入 stock_rs_rating 表，同一交易日内重复调用直接读取缓存
+   （最新交易日只有少数股票有 K 线时——如只更新了自选股——改用最近一个数据完整的交易日，
+   不把前一日收盘价填充成当日的结果）
+4. 供 vcp_scanner（VCP 相对强度过滤）和 StockAnalysisPipeline（分析上下文）共用
+5. 可参与评级的股票少于 RS_MIN_UNIVERSE（如本地只有自选股）时评级没有全市场意义，
+   不计算、不保存，get_rating 返回 None
+
+说明：
+- 月份按交易日折算：3/6/9/12 个月 = 63/126/189/252 根 K 线
+- 上市不足 12 个月的股票，缺失的长周期涨幅用已有的最长周期涨幅代替；
+  不足 3 个月的股票不参与评级
+"""
+
+import logging
+import threading
+from datetime import date
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import get_config
+from market_panel import OhlcvPanel
+
+logger = logging.getLogger(__name__)
+
+
+# (列名, K 线数, 权重)
+RS_HORIZONS: Tuple[Tuple[str, int, float], ...] = (
+    ('return_3m', 63, 0.4),
+    ('return_6m', 126, 0.2),
+    ('return_9m', 189, 0.2),
+    ('return_12m', 252, 0.2),
+)
+
+# 计算 RS 需要加载的交易日数
+RS_LOOKBACK_DAYS = RS_HORIZONS[-1][1] + 1
+
+# 基准日有 K 线的股票数 / 前一交易日有 K 线的股票数 低于该比例时，视为当日数据不完整
+RS_MIN_COVERAGE = 0.8
+
+# 数据不完整时最多往前回退的交易日数
+RS_MAX_FALLBACK_DAYS = 5
+
+
+def compute_rs_table(panel: OhlcvPanel) -> pd.DataFrame:
+    """
+    在面板上一次性计算全市场 RS 评级
+    
+    Args:
+        panel: 全市场面板（最后一列为计算基准日）
+    
+    Returns:
+        以 code 为索引的 DataFrame，列：return_3m/6m/9m/12m, rs_score, rs_rating
+    """
+    columns = [name for name, _, _ in RS_HORIZONS] + ['rs_score', 'rs_rating']
+    n_codes, n_days = panel.shape
+    if n_codes == 0 or n_days == 0:
+        return pd.DataFrame(columns=columns).rename_axis('code')
+    
+    # 停牌导致的缺失用上一根收盘价填充
+    close = pd.DataFrame(panel.close).ffill(axis=1).to_numpy()
+    last = close[:, -1]
+    
+    returns = {}
+    previous = None
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for name, bars, _ in RS_HORIZONS:
+            if n_days > bars:
+                ret = last / close[:, -bars - 1] - 1
+            else:
+                ret = np.full(n_codes, np.nan)
+            # 上市时间不足该周期：沿用更短周期的涨幅
+            if previous is not None:
+                ret = np.where(np.isnan(ret), previous, ret)
+            returns[name] = ret
+            previous = ret
+    
+    score = sum(weight * returns[name] for name, _, weight in RS_HORIZONS)
+    
+    # 横截面排序：一次 argsort 得到全市场百分位
+    rating = np.full(n_codes, np.nan)
+    valid = np.isfinite(score)
+    count = int(valid.sum())
+    if count:
+        ranks = np.empty(count)
+        ranks[np.argsort(score[valid], kind='stable')] = np.arange(count)
+        rating[valid] = np.floor(ranks / count * 99) + 1
+    
+    table = pd.DataFrame(returns, index=pd.Index(panel.codes, name='code'))
+    table['rs_score'] = score
+    table['rs_rating'] = rating
+    return table[valid].astype({'rs_rating': int})
+
+
+def complete_trade_day(panel: OhlcvPanel) -> Optional[int]:
+    """
+    从最后一列往前找数据完整的交易日（有 K 线的股票数不低于前一交易日的 RS_MIN_COVERAGE）
+    
+    Returns:
+        该交易日的列号，面板为空时返回 None
+    """
+    n_days = panel.shape[1]
+    if len(panel) == 0 or n_days == 0:
+        return None
+    valid = np.count_nonzero(~np.isnan(panel.close), axis=0)
+    col = n_days - 1
+    while col > 0 and n_days - 1 - col < RS_MAX_FALLBACK_DAYS and valid[col] < RS_MIN_COVERAGE * valid[col - 1]:
+        col -= 1
+    return col
+
+
+class RelativeStrengthService:
+    """
+    RS 评级服务 - 单例模式
+    
+    按本地日线数据的最新交易日缓存（内存 + 数据库），每个交易日只计算一次；
+    只有数据完整的交易日才写入数据库
+    """
+    
+    _instance: Optional['RelativeStrengthService'] = None
+    _instance_lock = threading.Lock()
+    
+    def __init__(self):
+        self._table: Optional[pd.DataFrame] = None
+        self._trade_date: Optional[date] = None     # 评级基准日
+        self._latest_date: Optional[date] = None    # 计算时本地数据的最新交易日（缓存键）
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def get_instance(cls) -> 'RelativeStrengthService':
+        """获取单例实例"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+    
+    @classmethod
+    def reset_instance(cls) -> None:
+        """重置单例（用于测试）"""
+        cls._instance = None
+    
+    def get_table(self, end_date: Optional[date] = None) -> pd.DataFrame:
+        """
+        获取全市场 RS 评级表
+        
+        多个线程同时请求时只有一个线程计算，其余线程等待并复用结果
+        
+        Args:
+            end_date: 截止日期（可选，默认使用本地最新交易日）
+        
+        Returns:
+            以 code 为索引的 DataFrame，本地无数据或股票数不足 RS_MIN_UNIVERSE 时返回空 DataFrame
+        """
+        return self._get_table(end_date)[0]
+    
+    def _get_table(self, end_date: Optional[date] = None) -> Tuple[pd.DataFrame, Optional[date]]:
+        """返回 (RS 评级表, 评级基准日)，两者在同一次加锁中取得"""
+        from storage import get_db
+        
+        db = get_db()
+        min_universe = get_config().rs_min_universe
+        latest = db.get_latest_daily_date(end_date)
+        if latest is None:
+            return compute_rs_table(OhlcvPanel.empty()), None
+        
+        with self._lock:
+            if self._table is not None and self._latest_date == latest:
+                return self._table, self._trade_date
+            
+            trade_date = latest
+            table = db.get_rs_ratings(latest)
+            if table.empty:
+                # 多加载几天，最新交易日数据不完整时可以回退
+                panel = OhlcvPanel.load(days=RS_LOOKBACK_DAYS + RS_MAX_FALLBACK_DAYS, end_date=latest)
+                col = complete_trade_day(panel)
+                if col is None:
+                    table = compute_rs_table(panel)
+                else:
+                    trade_date = panel.dates[col].date()
+                    if trade_date != latest:
+                        logger.info(f"[RS] {latest} 有 K 线的股票不足，使用 {trade_date} 的全市场数据计算 RS 评级")
+                        table = db.get_rs_ratings(trade_date)
+                    if table.empty:
+                        table = compute_rs_table(panel.slice_days(max(0, col + 1 - RS_LOOKBACK_DAYS), col + 1))
+                        if len(table) >= min_universe:
+                            db.save_rs_ratings(table, trade_date)
+                            logger.info(f"[RS] 计算 {trade_date} 全市场 RS 评级: {len(table)} 只股票")
+            else:
+                logger.debug(f"[RS] 使用缓存的 {trade_date} RS 评级: {len(table)} 只股票")
+            
+            if len(table) < min_universe:
+                logger.info(f"[RS] 本地仅有 {len(table)} 只股票可参与评级（阈值 {min_universe}），"
+                            f"不提供全市场 RS 评级")
+                table = compute_rs_table(OhlcvPanel.empty())
+            
+            self._table = table
+            self._trade_date = trade_date
+            self._latest_date = latest
+            return table, trade_date
+    
+    def get_rating(self, code: str) -> Optional[Dict[str, Any]]:
+        """
+        获取单只股票的 RS 评级
+        
+        Returns:
+            包含 rs_rating、rs_score、各周期涨幅和基准日的字典，无评级时返回 None
+        """
+        table, trade_date = self._get_table()
+        if code not in table.index:
+            return None
+        
+        row = table.loc[code]
+        result = {name: round(float(row[name]) * 100, 2) for name, _, _ in RS_HORIZONS}
+        result['rs_score'] = round(float(row['rs_score']) * 100, 2)
+        result['rs_rating'] = int(row['rs_rating'])
+        result['date'] = trade_date.isoformat() if trade_date else None
+        return result
+    
+    def percentiles_for(self, codes: np.ndarray) -> Optional[np.ndarray]:
+        """
+        按给定代码顺序返回 RS 评级（缺失为 NaN），用于与面板行对齐
+        
+        Returns:
+            评级数组；全市场评级不可用（无数据或股票数不足）时返回 None
+        """
+        table = self.get_table()
+        if table.empty:
+            return None
+        return table['rs_rating'].reindex(codes).to_numpy(dtype=float)
+
+
+def get_rs_service() -> RelativeStrengthService:
+    """获取 RS 评级服务实例的快捷方式"""
+    return RelativeStrengthService.get_instance()
@@ -18,12 +18,15 @@
 
 import logging
 from dataclasses import dataclass, field
-from typing import Optional, Dict, Any, List, Tuple
+from typing import Optional, Dict, Any, List, Tuple, Union
 from enum import Enum
 
 import pandas as pd
 import numpy as np
 
+from indicators import compute_indicators
+from market_panel import OhlcvPanel
+
 logger = logging.getLogger(__name__)
 
 
@@ -161,11 +164,14 @@ class StockTrendAnalyzer:
             result.risk_factors.append("数据不足，无法完成分析")
             return result
         
-        # 确保数据按日期排序
-        df = df.sort_values('date').reset_index(drop=True)
+        # 确保数据按日期排序（已有序时只复制一次，不再重复排序）
+        if df['date'].is_monotonic_increasing:
+            df = df.reset_index(drop=True)
+        else:
+            df = df.sort_values('date').reset_index(drop=True)
         
-        # 计算均线
-        df = self._calculate_mas(df)
+        # 计算均线（上一步已得到独立副本，直接写入）
+        df = self._calculate_mas(df, copy=False)
         
         # 获取最新数据
         latest = df.iloc[-1]
@@ -192,14 +198,93 @@ class StockTrendAnalyzer:
         
         return result
     
-    def _calculate_mas(self, df: pd.DataFrame) -> pd.DataFrame:
+    def analyze_many(
+        self,
+        data: Union[OhlcvPanel, pd.DataFrame],
+        codes: Optional[List[str]] = None
+    ) -> Dict[str, TrendAnalysisResult]:
+        """
+        批量分析多只股票趋势
+        
+        均线、乖离率、量比等数值对所有股票一次性向量化计算，
+        趋势/量能/信号的判定逻辑与 analyze() 共用，结果与逐只调用 analyze() 一致
+        
+        Args:
+            data: OhlcvPanel，或包含 code/date/close/high/volume 列的长表 DataFrame
+            codes: 只返回这些股票的结果（可选，默认全部）
+        
+        Returns:
+            {股票代码: TrendAnalysisResult}
+        """
+        panel = data if isinstance(data, OhlcvPanel) else OhlcvPanel.from_frame(data)
+        if len(panel) == 0:
+            return {}
+        
+        # 每只股票的有效 K 线右对齐（与单只股票 DataFrame 只包含有效行的口径一致）
+        aligned = panel.align_right(('close', 'high', 'volume'))
+        close, high, volume = aligned['close'], aligned['high'], aligned['volume']
+        bars = panel.bar_counts()
+        
+        n_days = close.shape[1]
+        mas = compute_indicators(close, ('ma5', 'ma10', 'ma20', 'ma60'))
+        ma5, ma10, ma20 = mas['ma5'][:, -1], mas['ma10'][:, -1], mas['ma20'][:, -1]
+        ma60 = np.where(bars >= 60, mas['ma60'][:, -1], ma20)
+        # 4 个交易日前的 MA5/MA20（与 analyze() 中 df.iloc[-5] 对应）
+        if n_days >= 5:
+            prev_ma5, prev_ma20 = mas['ma5'][:, -5], mas['ma20'][:, -5]
+        else:
+            prev_ma5 = prev_ma20 = np.full(len(panel), np.nan)
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # 与 pandas 的 mean()/max() 一致：跳过 NaN
+            recent_volume = volume[:, -6:-1]
+            vol_5d_avg = np.nansum(recent_volume, axis=1) / np.count_nonzero(~np.isnan(recent_volume), axis=1)
+            prev_close = close[:, -2] if n_days >= 2 else np.full(len(panel), np.nan)
+            price_change = (close[:, -1] - prev_close) / prev_close * 100
+            recent_high = np.fmax.reduce(high[:, -20:], axis=1) if n_days >= 20 else np.full(len(panel), np.nan)
+        
+        wanted = set(codes) if codes is not None else None
+        results: Dict[str, TrendAnalysisResult] = {}
+        insufficient = 0
+        for i, code in enumerate(panel.codes):
+            if wanted is not None and code not in wanted:
+                continue
+            
+            result = TrendAnalysisResult(code=code)
+            results[code] = result
+            if bars[i] < 20:
+                insufficient += 1
+                result.risk_factors.append("数据不足，无法完成分析")
+                continue
+            
+            result.current_price = float(close[i, -1])
+            result.ma5 = float(ma5[i])
+            result.ma10 = float(ma10[i])
+            result.ma20 = float(ma20[i])
+            result.ma60 = float(ma60[i])
+            
+            self._classify_trend(result, float(prev_ma5[i]), float(prev_ma20[i]))
+            self._calculate_bias(result)
+            if vol_5d_avg[i] > 0:
+                result.volume_ratio_5d = float(volume[i, -1]) / float(vol_5d_avg[i])
+            self._classify_volume(result, float(price_change[i]))
+            self._classify_support_resistance(result, float(recent_high[i]))
+            self._generate_signal(result)
+        
+        if insufficient:
+            logger.warning(f"批量趋势分析: {insufficient} 只股票数据不足（少于 20 根 K 线）")
+        return results
+    
+    def _calculate_mas(self, df: pd.DataFrame, copy: bool = True) -> pd.DataFrame:
         """计算均线"""
-        df = df.copy()
-        df['MA5'] = df['close'].rolling(window=5).mean()
-        df['MA10'] = df['close'].rolling(window=10).mean()
-        df['MA20'] = df['close'].rolling(window=20).mean()
+        if copy:
+            df = df.copy()
+        mas = compute_indicators(df['close'].to_numpy(dtype=float), ('ma5', 'ma10', 'ma20', 'ma60'))
+        df['MA5'] = mas['ma5']
+        df['MA10'] = mas['ma10']
+        df['MA20'] = mas['ma20']
         if len(df) >= 60:
-            df['MA60'] = df['close'].rolling(window=60).mean()
+            df['MA60'] = mas['ma60']
         else:
             df['MA60'] = df['MA20']  # 数据不足时使用 MA20 替代
         return df
@@ -210,13 +295,19 @@ class StockTrendAnalyzer:
         
         核心逻辑：判断均线排列和趋势强度
         """
+        prev = df.iloc[-5] if len(df) >= 5 else df.iloc[-1]
+        self._classify_trend(result, float(prev['MA5']), float(prev['MA20']))
+    
+    def _classify_trend(self, result: TrendAnalysisResult, prev_ma5: float, prev_ma20: float) -> None:
+        """
+        根据当前均线和 4 个交易日前的 MA5/MA20 判定趋势状态（单只与批量分析共用）
+        """
         ma5, ma10, ma20 = result.ma5, result.ma10, result.ma20
         
         # 判断均线排列
         if ma5 > ma10 > ma20:
             # 检查间距是否在扩大（强势）
-            prev = df.iloc[-5] if len(df) >= 5 else df.iloc[-1]
-            prev_spread = (prev['MA5'] - prev['MA20']) / prev['MA20'] * 100 if prev['MA20'] > 0 else 0
+            prev_spread = (prev_ma5 - prev_ma20) / prev_ma20 * 100 if prev_ma20 > 0 else 0
             curr_spread = (ma5 - ma20) / ma20 * 100 if ma20 > 0 else 0
             
             if curr_spread > prev_spread and curr_spread > 5:
@@ -234,8 +325,7 @@ class StockTrendAnalyzer:
             result.trend_strength = 55
             
         elif ma5 < ma10 < ma20:
-            prev = df.iloc[-5] if len(df) >= 5 else df.iloc[-1]
-            prev_spread = (prev['MA20'] - prev['MA5']) / prev['MA5'] * 100 if prev['MA5'] > 0 else 0
+            prev_spread = (prev_ma20 - prev_ma5) / prev_ma5 * 100 if prev_ma5 > 0 else 0
             curr_spread = (ma20 - ma5) / ma5 * 100 if ma5 > 0 else 0
             
             if curr_spread > prev_spread and curr_spread > 5:
@@ -293,6 +383,10 @@ class StockTrendAnalyzer:
         prev_close = df.iloc[-2]['close']
         price_change = (latest['close'] - prev_close) / prev_close * 100
         
+        self._classify_volume(result, price_change)
+    
+    def _classify_volume(self, result: TrendAnalysisResult, price_change: float) -> None:
+        """根据量比和当日涨跌幅判定量能状态（单只与批量分析共用）"""
         # 量能状态判断
         if result.volume_ratio_5d >= self.VOLUME_HEAVY_RATIO:
             if price_change > 0:
@@ -318,6 +412,11 @@ class StockTrendAnalyzer:
         
         买点偏好：回踩 MA5/MA10 获得支撑
         """
+        recent_high = df['high'].iloc[-20:].max() if len(df) >= 20 else np.nan
+        self._classify_support_resistance(result, recent_high)
+    
+    def _classify_support_resistance(self, result: TrendAnalysisResult, recent_high: float) -> None:
+        """根据均线和近 20 日高点判定支撑压力位（单只与批量分析共用）"""
         price = result.current_price
         
         # 检查是否在 MA5 附近获得支撑
@@ -339,11 +438,9 @@ class StockTrendAnalyzer:
         if result.ma20 > 0 and price >= result.ma20:
             result.support_levels.append(result.ma20)
         
-        # 近期高点作为压力
-        if len(df) >= 20:
-            recent_high = df['high'].iloc[-20:].max()
-            if recent_high > price:
-                result.resistance_levels.append(recent_high)
+        # 近期高点作为压力（NaN 表示 K 线不足 20 根）
+        if recent_high > price:
+            result.resistance_levels.append(recent_high)
     
     def _generate_signal(self, result: TrendAnalysisResult) -> None:
         """
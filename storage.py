@@ -5,34 +5,50 @@ A股自选股智能分析系统 - 存储层
 ===================================
 
 职责：
-1. 管理 SQLite 数据库连接（单例模式）
+1. 管理 SQLite 数据库连接（单例模式，WAL 模式 + 每线程一个 Session + 单写线程）
 2. 定义 ORM 数据模型
 3. 提供数据存取接口
 4. 实现智能更新逻辑（断点续传）
 """
 
+import functools
+import json
 import logging
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Set, Tuple
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 from sqlalchemy import (
     create_engine,
+    event,
     Column,
     String,
     Float,
     Date,
     DateTime,
     Integer,
+    Text,
     Index,
     UniqueConstraint,
     select,
+    insert,
+    delete,
+    func,
     and_,
     desc,
+    tuple_,
 )
 from sqlalchemy.orm import (
     declarative_base,
+    scoped_session,
     sessionmaker,
     Session,
 )
@@ -46,6 +62,18 @@ logger = logging.getLogger(__name__)
 Base = declarative_base()
 
 
+def _serialized_write(method):
+    """
+    写操作装饰器：交给 DatabaseManager 的单写线程执行并等待结果
+    
+    同一时间只有一个写事务，工作线程之间不争抢 SQLite 的文件锁
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        return self._run_write(method, self, *args, **kwargs)
+    return wrapper
+
+
 # === 数据模型定义 ===
 
 class StockDaily(Base):
@@ -94,6 +122,8 @@ class StockDaily(Base):
     __table_args__ = (
         UniqueConstraint('code', 'date', name='uix_code_date'),
         Index('ix_code_date', 'code', 'date'),
+        # 增量同步（数据立方体）按写入时间查询
+        Index('ix_stock_daily_updated_at', 'updated_at'),
     )
     
     def __repr__(self):
@@ -119,6 +149,195 @@ class StockDaily(Base):
         }
 
 
+class StockRsRating(Base):
+    """
+    相对强度（RS）评级模型
+    
+    每个交易日对全市场计算一次，缓存横截面排名结果
+    """
+    __tablename__ = 'stock_rs_rating'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    
+    # 股票代码
+    code = Column(String(10), nullable=False, index=True)
+    
+    # 计算所基于的交易日（本地日线数据的最新日期）
+    date = Column(Date, nullable=False, index=True)
+    
+    # 3/6/9/12 个月涨幅
+    return_3m = Column(Float)
+    return_6m = Column(Float)
+    return_9m = Column(Float)
+    return_12m = Column(Float)
+    
+    # 加权涨幅（0.4 * 3个月 + 0.2 * 6/9/12个月）
+    rs_score = Column(Float)
+    
+    # 全市场百分位评级（1-99）
+    rs_rating = Column(Integer)
+    
+    created_at = Column(DateTime, default=datetime.now)
+    
+    __table_args__ = (
+        UniqueConstraint('code', 'date', name='uix_rs_code_date'),
+    )
+    
+    def __repr__(self):
+        return f"<StockRsRating(code={self.code}, date={self.date}, rs_rating={self.rs_rating})>"
+
+
+class IndicatorStateRecord(Base):
+    """
+    增量指标状态模型
+    
+    每只股票一行，保存 indicator_state.IndicatorState 的序列化结果
+    """
+    __tablename__ = 'indicator_state'
+    
+    # 股票代码
+    code = Column(String(10), primary_key=True)
+    
+    # 状态对应的最后一根 K 线日期
+    last_date = Column(Date, nullable=False)
+    
+    # 状态内容（JSON）
+    state = Column(Text, nullable=False)
+    
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    def __repr__(self):
+        return f"<IndicatorStateRecord(code={self.code}, last_date={self.last_date})>"
+
+
+class AnalysisResultRecord(Base):
+    """
+    AI 分析结果模型
+    
+    按 (code, input_hash) 保存，输入（增强上下文 + 新闻情报）完全相同时直接复用，不再调用大模型
+    """
+    __tablename__ = 'analysis_result'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    
+    # 股票代码
+    code = Column(String(10), nullable=False)
+    
+    # 分析对应的交易日
+    date = Column(Date)
+    
+    # 分析输入的 SHA-256
+    input_hash = Column(String(64), nullable=False)
+    
+    # AnalysisResult 内容（JSON）
+    result = Column(Text, nullable=False)
+    
+    created_at = Column(DateTime, default=datetime.now)
+    
+    __table_args__ = (
+        UniqueConstraint('code', 'input_hash', name='uix_analysis_code_hash'),
+    )
+    
+    def __repr__(self):
+        return f"<AnalysisResultRecord(code={self.code}, date={self.date}, input_hash={self.input_hash[:8]})>"
+
+
+class _BarCache:
+    """
+    按股票缓存最近的日线（进程内 LRU）
+    
+    每个条目保存一只股票最近若干根 K 线（get_daily_frame 的格式）及是否已包含该股票全部历史；
+    写入 stock_daily 提交后合并最新数据，分析阶段读取刚写入的数据不再查询数据库
+    
+    注意：只感知本进程的写入，其他进程写入同一数据库时缓存不会更新
+    """
+    
+    def __init__(self, max_codes: int, bars: int):
+        self.max_codes = max_codes
+        self.bars = bars
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[str, Tuple[pd.DataFrame, bool]]' = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_codes > 0
+    
+    def _get(self, code: str) -> Optional[Tuple[pd.DataFrame, bool]]:
+        with self._lock:
+            entry = self._entries.get(code)
+            if entry is not None:
+                self._entries.move_to_end(code)
+            return entry
+    
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+    
+    def lookup(self, code: str, days: int, end_date: Optional[date] = None) -> Optional[pd.DataFrame]:
+        """取截止 end_date 的最近 days 根 K 线，缓存不足以回答时返回 None"""
+        entry = self._get(code)
+        result = None
+        if entry is not None:
+            frame, complete = entry
+            if end_date is not None:
+                frame = frame[frame['date'] <= pd.Timestamp(end_date)]
+            # 截止日期早于该股票全部数据时交给数据库返回空结果
+            if len(frame) and (len(frame) >= days or complete):
+                result = frame.iloc[-days:].reset_index(drop=True)
+        self._count(result is not None)
+        return result
+    
+    def lookup_range(self, code: str, start_date: date, end_date: date) -> Optional[pd.DataFrame]:
+        """取日期区间内的 K 线，区间起点早于缓存窗口时返回 None"""
+        entry = self._get(code)
+        result = None
+        if entry is not None:
+            frame, complete = entry
+            if complete or frame['date'].iloc[0] <= pd.Timestamp(start_date):
+                mask = (frame['date'] >= pd.Timestamp(start_date)) & (frame['date'] <= pd.Timestamp(end_date))
+                result = frame[mask].reset_index(drop=True)
+        self._count(result is not None)
+        return result
+    
+    def put(self, code: str, frame: pd.DataFrame, complete: bool) -> None:
+        with self._lock:
+            self._entries[code] = (frame, complete)
+            self._entries.move_to_end(code)
+            while len(self._entries) > self.max_codes:
+                self._entries.popitem(last=False)
+    
+    def merge(self, frame: pd.DataFrame) -> None:
+        """
+        合并刚提交的日线（只更新已缓存的股票）
+        
+        早于缓存窗口的行直接丢弃（窗口只保存最近的 K 线），合并后超出窗口长度时截掉最早的部分
+        """
+        with self._lock:
+            for code, rows in frame.groupby('code', sort=False):
+                entry = self._entries.get(code)
+                if entry is None:
+                    continue
+                cached, complete = entry
+                if not complete:
+                    rows = rows[rows['date'] >= cached['date'].iloc[0]]
+                combined = pd.concat([cached, rows], ignore_index=True)
+                combined = combined.drop_duplicates('date', keep='last').sort_values('date', ignore_index=True)
+                limit = max(self.bars, len(cached))
+                if len(combined) > limit:
+                    combined = combined.iloc[-limit:].reset_index(drop=True)
+                    complete = False
+                self._entries[code] = (combined, complete)
+    
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'codes': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
 class DatabaseManager:
     """
     数据库管理器 - 单例模式
@@ -131,6 +350,31 @@ class DatabaseManager:
     
     _instance: Optional['DatabaseManager'] = None
     
+    # 批量语句每条包含的最多行数（多行 INSERT、IN 查询）；
+    # 实际行数还受单条语句绑定参数上限约束，见 _chunk_rows
+    BULK_CHUNK_SIZE = 500
+    
+    # 单条语句绑定参数上限：SQLite 3.32 之前默认 999（SQLITE_MAX_VARIABLE_NUMBER），
+    # 3.32 起默认 32766；无法读取运行时限制时按版本取值，其他数据库取 32767
+    SQLITE_LEGACY_MAX_VARIABLES = 999
+    SQLITE_MAX_VARIABLES = 32766
+    DEFAULT_MAX_VARIABLES = 32767
+    
+    # 日线数值列（批量写入时统一做数值化和 NaN 处理）
+    _DAILY_VALUE_COLUMNS = (
+        'open', 'high', 'low', 'close', 'volume', 'amount', 'pct_chg',
+        'ma5', 'ma10', 'ma20', 'volume_ratio',
+    )
+    
+    # 分析上下文附带的历史 K 线数量（趋势分析至少 20 根，MA60 需要 60 根）
+    ANALYSIS_HISTORY_DAYS = 120
+    
+    # 冲突时需要覆盖的列（created_at 保留首次写入时间）
+    _UPSERT_UPDATE_COLUMNS = _DAILY_VALUE_COLUMNS + ('data_source', 'updated_at')
+    
+    # RS 评级表的数值列
+    _RS_COLUMNS = ('return_3m', 'return_6m', 'return_9m', 'return_12m', 'rs_score', 'rs_rating')
+    
     def __new__(cls, *args, **kwargs):
         """单例模式实现"""
         if cls._instance is None:
@@ -148,30 +392,71 @@ class DatabaseManager:
         if self._initialized:
             return
         
+        config = get_config()
         if db_url is None:
-            config = get_config()
             db_url = config.get_db_url()
         
         # 创建数据库引擎
+        is_sqlite = db_url.startswith('sqlite')
         self._engine = create_engine(
             db_url,
             echo=False,  # 设为 True 可查看 SQL 语句
             pool_pre_ping=True,  # 连接健康检查
+            # 驱动层等待锁的时间（秒），超时才抛出 database is locked
+            connect_args={'timeout': config.sqlite_busy_timeout} if is_sqlite else {},
         )
+        if is_sqlite:
+            self._configure_sqlite(config)
         
-        # 创建 Session 工厂
-        self._SessionLocal = sessionmaker(
+        # 创建 Session 工厂（scoped_session：每个线程使用自己的 Session）
+        self._SessionLocal = scoped_session(sessionmaker(
             bind=self._engine,
             autocommit=False,
             autoflush=False,
+        ))
+        
+        # 按股票缓存最近的 K 线（读取时填充，写入后合并）
+        self._bar_cache = _BarCache(config.bar_cache_size, self.ANALYSIS_HISTORY_DAYS)
+        
+        # 单写线程：所有写事务排队执行
+        self._writer_ident: Optional[int] = None
+        self._writer = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix='db-writer',
+            initializer=self._register_writer_thread,
         )
         
-        # 创建所有表
+        # 创建所有表（已存在的表补建新增的索引）
         Base.metadata.create_all(self._engine)
+        for index in StockDaily.__table__.indexes:
+            index.create(self._engine, checkfirst=True)
+        
+        self._max_variables = self._detect_max_variables() if is_sqlite else self.DEFAULT_MAX_VARIABLES
         
         self._initialized = True
         logger.info(f"数据库初始化完成: {db_url}")
     
+    def _detect_max_variables(self) -> int:
+        """读取 SQLite 运行时的绑定参数上限（SQLITE_LIMIT_VARIABLE_NUMBER），失败时按库版本估计"""
+        try:
+            with self._engine.connect() as conn:
+                return int(conn.connection.dbapi_connection.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER))
+        except Exception:
+            if sqlite3.sqlite_version_info >= (3, 32, 0):
+                return self.SQLITE_MAX_VARIABLES
+            return self.SQLITE_LEGACY_MAX_VARIABLES
+    
+    def _chunk_rows(self, params_per_row: int, reserved: int = 0) -> int:
+        """
+        单条语句最多包含的行数
+        
+        Args:
+            params_per_row: 每行占用的绑定参数个数（多行 INSERT 为列数，IN 查询为 1）
+            reserved: 语句中其他条件占用的绑定参数个数
+        """
+        limit = (self._max_variables - reserved) // max(1, params_per_row)
+        return max(1, min(self.BULK_CHUNK_SIZE, limit))
+    
     @classmethod
     def get_instance(cls) -> 'DatabaseManager':
         """获取单例实例"""
@@ -183,12 +468,53 @@ class DatabaseManager:
     def reset_instance(cls) -> None:
         """重置单例（用于测试）"""
         if cls._instance is not None:
+            cls._instance._writer.shutdown(wait=True)
+            cls._instance._SessionLocal.remove()
             cls._instance._engine.dispose()
             cls._instance = None
     
+    def _configure_sqlite(self, config) -> None:
+        """
+        每个新连接设置 SQLite PRAGMA
+        
+        - journal_mode=WAL：读不阻塞写、写不阻塞读
+        - synchronous=NORMAL：WAL 模式下仍保证一致性，只在检查点时 fsync
+        - cache_size / mmap_size：加大页缓存，全市场范围查询直接走内存映射
+        - busy_timeout：锁被占用时等待而不是立即报错
+        """
+        pragmas = []
+        if config.sqlite_wal_enabled:
+            pragmas += ['journal_mode=WAL', 'synchronous=NORMAL']
+        pragmas += [
+            f'cache_size=-{config.sqlite_cache_size_mb * 1024}',
+            f'mmap_size={config.sqlite_mmap_size_mb * 1024 * 1024}',
+            f'busy_timeout={int(config.sqlite_busy_timeout * 1000)}',
+        ]
+        
+        @event.listens_for(self._engine, 'connect')
+        def _set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for pragma in pragmas:
+                    cursor.execute(f'PRAGMA {pragma}')
+            finally:
+                cursor.close()
+    
+    def _register_writer_thread(self) -> None:
+        self._writer_ident = threading.get_ident()
+    
+    def _run_write(self, func, *args, **kwargs):
+        """在单写线程中执行写操作并返回结果（已在写线程内时直接执行）"""
+        if threading.get_ident() == self._writer_ident:
+            return func(*args, **kwargs)
+        return self._writer.submit(func, *args, **kwargs).result()
+    
     def get_session(self) -> Session:
         """
-        获取数据库 Session
+        获取当前线程的数据库 Session
+        
+        同一线程内复用同一个 Session，退出 with 块时关闭（归还连接），
+        因此同一线程内不要嵌套使用
         
         使用示例:
             with db.get_session() as session:
@@ -230,6 +556,49 @@ class DatabaseManager:
             
             return result is not None
     
+    def codes_with_data(
+        self,
+        codes: List[str],
+        target_date: Optional[date] = None
+    ) -> Set[str]:
+        """
+        批量检查哪些股票已有指定日期的数据
+        
+        断点续传的批量版本：整个股票列表只开一个 Session，
+        通过 (code, date) 索引上的 IN 查询一次性返回结果
+        
+        Args:
+            codes: 股票代码列表
+            target_date: 目标日期（默认今天）
+            
+        Returns:
+            已有数据的股票代码集合
+        """
+        if target_date is None:
+            target_date = date.today()
+        
+        unique_codes = list(dict.fromkeys(codes))
+        if not unique_codes:
+            return set()
+        
+        found: Set[str] = set()
+        with self.get_session() as session:
+            # 分块避免超出单条语句的绑定参数上限（每个代码 1 个，日期条件 1 个）
+            chunk_rows = self._chunk_rows(1, reserved=1)
+            for offset in range(0, len(unique_codes), chunk_rows):
+                chunk = unique_codes[offset:offset + chunk_rows]
+                rows = session.execute(
+                    select(StockDaily.code).where(
+                        and_(
+                            StockDaily.date == target_date,
+                            StockDaily.code.in_(chunk)
+                        )
+                    )
+                ).scalars().all()
+                found.update(rows)
+        
+        return found
+    
     def get_latest_data(
         self, 
         code: str, 
@@ -245,8 +614,11 @@ class DatabaseManager:
             days: 获取天数
             
         Returns:
-            StockDaily 对象列表（按日期降序）
+            StockDaily 对象列表（按日期降序；命中缓存时为未绑定 Session 的对象）
         """
+        if self._bar_cache.enabled:
+            return self._frame_to_records(self.get_daily_frame(code, days=days))[::-1]
+        
         with self.get_session() as session:
             results = session.execute(
                 select(StockDaily)
@@ -257,6 +629,188 @@ class DatabaseManager:
             
             return list(results)
     
+    def get_daily_frame(
+        self,
+        code: str,
+        days: int = 60,
+        end_date: Optional[date] = None
+    ) -> pd.DataFrame:
+        """
+        获取最近 N 条日线数据（单次查询直接构造 DataFrame）
+        
+        只查询需要的列，不实例化 ORM 对象；启用 K 线缓存时优先从缓存读取，
+        未命中时一次取出最近的缓存窗口放入缓存
+        
+        Args:
+            code: 股票代码
+            days: 获取条数
+            end_date: 截止日期（含，可选）
+            
+        Returns:
+            按日期升序排列的 DataFrame，无数据时返回空 DataFrame
+        """
+        if self._bar_cache.enabled:
+            df = self._bar_cache.lookup(code, days, end_date)
+            if df is not None:
+                return df
+            limit = max(days, self._bar_cache.bars)
+            df = self._query_daily_frame(code, limit)
+            if not df.empty:
+                self._bar_cache.put(code, df, complete=len(df) < limit)
+                df = self._bar_cache.lookup(code, days, end_date)
+                if df is not None:
+                    return df
+        
+        return self._query_daily_frame(code, days, end_date)
+    
+    def _query_daily_frame(self, code: str, days: int, end_date: Optional[date] = None) -> pd.DataFrame:
+        """从数据库读取最近 N 条日线数据（get_daily_frame 的查询部分）"""
+        columns = ['date'] + list(self._DAILY_VALUE_COLUMNS) + ['data_source']
+        
+        query = select(*[getattr(StockDaily, col) for col in columns]).where(StockDaily.code == code)
+        if end_date is not None:
+            query = query.where(StockDaily.date <= end_date)
+        query = query.order_by(desc(StockDaily.date)).limit(days)
+        
+        with self.get_session() as session:
+            rows = session.execute(query).all()
+        
+        df = pd.DataFrame.from_records(rows, columns=columns)
+        if df.empty:
+            return df
+        
+        df = df.iloc[::-1].reset_index(drop=True)
+        df['date'] = pd.to_datetime(df['date'])
+        value_columns = list(self._DAILY_VALUE_COLUMNS)
+        df[value_columns] = df[value_columns].astype(float)
+        df.insert(0, 'code', code)
+        return df
+    
+    def get_daily_panel_frame(
+        self,
+        days: int = 120,
+        end_date: Optional[date] = None,
+        codes: Optional[List[str]] = None
+    ) -> pd.DataFrame:
+        """
+        获取全市场（或指定股票）最近 N 个交易日的日线数据（长表）
+        
+        供全市场扫描使用：先按去重后的交易日确定起始日期，
+        再用一次范围查询取出所有股票的 OHLCV，不实例化 ORM 对象
+        
+        Args:
+            days: 交易日数量
+            end_date: 截止日期（含，可选）
+            codes: 股票代码列表（可选，默认全部）
+        
+        Returns:
+            包含 code/date/open/high/low/close/volume/amount 列的 DataFrame，
+            按 (code, date) 升序排列，无数据时返回空 DataFrame
+        """
+        columns = ['code', 'date', 'open', 'high', 'low', 'close', 'volume', 'amount']
+        
+        store = self._get_columnar_store()
+        if store is not None and store.is_ready:
+            try:
+                df = store.read_recent(days, end_date=end_date, codes=codes, columns=columns)
+                if not df.empty:
+                    return df
+                logger.warning("[列式存储] 读取结果为空，回退到 SQLite")
+            except Exception as e:
+                logger.warning(f"[列式存储] 读取失败，回退到 SQLite: {e}")
+        
+        date_query = select(StockDaily.date).distinct()
+        if end_date is not None:
+            date_query = date_query.where(StockDaily.date <= end_date)
+        date_query = date_query.order_by(desc(StockDaily.date)).limit(days)
+        
+        with self.get_session() as session:
+            recent_dates = session.execute(date_query).scalars().all()
+            if not recent_dates:
+                return pd.DataFrame(columns=columns)
+            
+            conditions = [StockDaily.date >= min(recent_dates)]
+            if end_date is not None:
+                conditions.append(StockDaily.date <= end_date)
+            
+            query = select(*[getattr(StockDaily, col) for col in columns])
+            if codes is None:
+                rows = session.execute(query.where(and_(*conditions))).all()
+            else:
+                # 分块避免超出单条语句的绑定参数上限（每个代码 1 个，日期条件最多 2 个）
+                rows = []
+                unique_codes = list(dict.fromkeys(codes))
+                chunk_rows = self._chunk_rows(1, reserved=len(conditions))
+                for offset in range(0, len(unique_codes), chunk_rows):
+                    chunk = unique_codes[offset:offset + chunk_rows]
+                    rows.extend(session.execute(
+                        query.where(and_(StockDaily.code.in_(chunk), *conditions))
+                    ).all())
+        
+        df = pd.DataFrame.from_records(rows, columns=columns)
+        if df.empty:
+            return df
+        
+        df['date'] = pd.to_datetime(df['date'])
+        value_columns = columns[2:]
+        df[value_columns] = df[value_columns].astype(float)
+        return df.sort_values(['code', 'date'], kind='stable').reset_index(drop=True)
+    
+    def get_daily_date_bounds(self) -> Optional[Tuple[date, date]]:
+        """
+        stock_daily 中最早和最晚的交易日
+        
+        Returns:
+            (最早日期, 最晚日期)，无数据时返回 None
+        """
+        with self.get_session() as session:
+            first, last = session.execute(
+                select(func.min(StockDaily.date), func.max(StockDaily.date))
+            ).one()
+        return (first, last) if first is not None else None
+    
+    def get_daily_frame_between(
+        self,
+        start_date: date,
+        end_date: date,
+        updated_since: Optional[datetime] = None,
+        with_updated_at: bool = False
+    ) -> pd.DataFrame:
+        """
+        获取日期区间内全市场的日线数据（长表，包含所有数值列和数据来源）
+        
+        用于全量导出（如列式存储重建）和增量同步，不实例化 ORM 对象
+        
+        Args:
+            start_date: 开始日期（含）
+            end_date: 结束日期（含）
+            updated_since: 只返回该时间之后写入 / 更新的行（可选，用于增量同步）
+            with_updated_at: 是否附带 updated_at 列（增量同步据此记录同步水位）
+        
+        Returns:
+            按 (code, date) 升序排列的 DataFrame，无数据时返回空 DataFrame
+        """
+        columns = ['code', 'date'] + list(self._DAILY_VALUE_COLUMNS) + ['data_source']
+        if with_updated_at:
+            columns.append('updated_at')
+        conditions = [StockDaily.date >= start_date, StockDaily.date <= end_date]
+        if updated_since is not None:
+            conditions.append(StockDaily.updated_at >= updated_since)
+        query = select(*[getattr(StockDaily, col) for col in columns]).where(
+            and_(*conditions)
+        ).order_by(StockDaily.code, StockDaily.date)
+        
+        with self.get_session() as session:
+            rows = session.execute(query).all()
+        
+        df = pd.DataFrame.from_records(rows, columns=columns)
+        if df.empty:
+            return df
+        df['date'] = pd.to_datetime(df['date'])
+        value_columns = list(self._DAILY_VALUE_COLUMNS)
+        df[value_columns] = df[value_columns].astype(float)
+        return df
+    
     def get_data_range(
         self, 
         code: str, 
@@ -272,8 +826,13 @@ class DatabaseManager:
             end_date: 结束日期
             
         Returns:
-            StockDaily 对象列表
+            StockDaily 对象列表（命中缓存时为未绑定 Session 的对象）
         """
+        if self._bar_cache.enabled:
+            df = self._bar_cache.lookup_range(code, start_date, end_date)
+            if df is not None:
+                return self._frame_to_records(df)
+        
         with self.get_session() as session:
             results = session.execute(
                 select(StockDaily)
@@ -289,31 +848,267 @@ class DatabaseManager:
             
             return list(results)
     
+    @staticmethod
+    def _frame_to_records(df: pd.DataFrame) -> List[StockDaily]:
+        """get_daily_frame 格式的 DataFrame 转为 StockDaily 对象列表（NaN -> None）"""
+        records = []
+        for row in df.to_dict('records'):
+            values = {key: None if isinstance(value, float) and np.isnan(value) else value for key, value in row.items()}
+            values['date'] = values['date'].date()
+            records.append(StockDaily(**values))
+        return records
+    
+    def bar_cache_stats(self) -> Dict[str, int]:
+        """K 线缓存统计：缓存的股票数、命中 / 未命中次数"""
+        return self._bar_cache.stats()
+    
+    def _update_bar_cache(self, rows: List[Dict[str, Any]]) -> None:
+        """已提交的日线数据合并到 K 线缓存"""
+        if not self._bar_cache.enabled or not rows:
+            return
+        columns = ['code', 'date'] + list(self._DAILY_VALUE_COLUMNS) + ['data_source']
+        df = pd.DataFrame.from_records(rows, columns=columns)
+        df['date'] = pd.to_datetime(df['date'])
+        value_columns = list(self._DAILY_VALUE_COLUMNS)
+        df[value_columns] = df[value_columns].astype(float)
+        self._bar_cache.merge(df)
+    
+    def _commit_indicator_state(self, rows: List[Dict[str, Any]]) -> None:
+        """日线数据提交后保存对应的待提交指标状态（失败只记录日志，下次增量获取时自动重建）"""
+        if not rows:
+            return
+        try:
+            from indicator_state import get_indicator_state_store
+            store = get_indicator_state_store()
+            for code in dict.fromkeys(row['code'] for row in rows):
+                store.commit(code)
+        except Exception as e:
+            logger.warning(f"[指标状态] 提交失败: {e}")
+    
     def save_daily_data(
         self, 
         df: pd.DataFrame, 
         code: str,
-        data_source: str = "Unknown"
+        data_source: str = "Unknown",
+        bulk: bool = True
     ) -> int:
         """
         保存日线数据到数据库
         
         策略：
         - 使用 UPSERT 逻辑（存在则更新，不存在则插入）
-        - 跳过已存在的数据，避免重复
+        - 默认走批量路径：按块执行多行 INSERT ... ON CONFLICT(code, date) DO UPDATE
+        - 数据库方言不支持 ON CONFLICT 时回退到逐行写入
         
         Args:
             df: 包含日线数据的 DataFrame
             code: 股票代码
             data_source: 数据来源名称
+            bulk: 是否使用批量 UPSERT（默认 True）
             
         Returns:
-            新增/更新的记录数
+            新增的记录数
         """
         if df is None or df.empty:
             logger.warning(f"保存数据为空，跳过 {code}")
             return 0
         
+        if bulk and self._get_upsert_insert() is not None:
+            inserted, updated = self.bulk_upsert_daily_data(df, data_source, code=code)
+            logger.info(f"保存 {code} 数据成功，新增 {inserted} 条，更新 {updated} 条")
+            return inserted
+        
+        return self._save_daily_data_rowwise(df, code, data_source)
+    
+    @_serialized_write
+    def bulk_upsert_daily_data(
+        self,
+        df: pd.DataFrame,
+        data_source: str = "Unknown",
+        code: Optional[str] = None,
+        chunk_size: Optional[int] = None
+    ) -> Tuple[int, int]:
+        """
+        批量 UPSERT 日线数据（基于 uix_code_date 唯一约束）
+        
+        流程：
+        1. 一次性将 DataFrame 转换为列数组（NaN -> None）
+        2. 按 (code, date) 去重，保留最后一条
+        3. 每个分块先用一次 IN 查询统计已存在的键，再执行一条多行 UPSERT
+        
+        适用于全市场回补：多只股票可以放在同一个 DataFrame 中（需包含 code 列）
+        
+        Args:
+            df: 日线数据 DataFrame
+            data_source: 数据来源名称
+            code: 股票代码（指定时覆盖 df 中的 code 列）
+            chunk_size: 每条 INSERT 包含的行数（默认按列数和绑定参数上限计算，指定时同样受该上限约束）
+            
+        Returns:
+            Tuple[新增条数, 更新条数]
+            
+        Raises:
+            ValueError: 未指定 code 且 df 中没有 code 列
+            RuntimeError: 当前数据库方言不支持 ON CONFLICT
+        """
+        if df is None or df.empty:
+            return 0, 0
+        
+        insert = self._get_upsert_insert()
+        if insert is None:
+            raise RuntimeError(f"数据库方言 {self._engine.dialect.name} 不支持批量 UPSERT")
+        
+        rows = self._frame_to_rows(df, code, data_source)
+        if not rows:
+            return 0, 0
+        
+        # 每行的绑定参数个数 = 列数；同一分块的 (code, date) IN 查询每行 2 个，不会更多
+        max_rows = self._chunk_rows(len(rows[0]))
+        chunk_size = min(chunk_size, max_rows) if chunk_size else max_rows
+        inserted = 0
+        updated = 0
+        
+        with self.get_session() as session:
+            try:
+                for offset in range(0, len(rows), chunk_size):
+                    chunk = rows[offset:offset + chunk_size]
+                    keys = [(r['code'], r['date']) for r in chunk]
+                    
+                    existing = session.execute(
+                        select(StockDaily.code, StockDaily.date).where(
+                            tuple_(StockDaily.code, StockDaily.date).in_(keys)
+                        )
+                    ).all()
+                    
+                    stmt = insert(StockDaily).values(chunk)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=['code', 'date'],
+                        set_={
+                            col: getattr(stmt.excluded, col)
+                            for col in self._UPSERT_UPDATE_COLUMNS
+                        },
+                    )
+                    session.execute(stmt)
+                    
+                    updated += len(existing)
+                    inserted += len(chunk) - len(existing)
+                
+                session.commit()
+                
+            except Exception as e:
+                session.rollback()
+                logger.error(f"批量保存日线数据失败: {e}")
+                raise
+        
+        self._update_bar_cache(rows)
+        self._commit_indicator_state(rows)
+        self._write_through(rows)
+        return inserted, updated
+    
+    def _get_columnar_store(self):
+        """列式存储实例（未启用时返回 None）"""
+        from columnar_store import get_columnar_store
+        store = get_columnar_store()
+        return store if store.enabled else None
+    
+    def _write_through(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        已提交的日线数据同步写入列式存储（不影响 SQLite 写入结果）
+        
+        写入失败或列式存储未启用时标记为未同步，读取方回退到 SQLite，直到重新 rebuild
+        """
+        if not rows:
+            return
+        from columnar_store import get_columnar_store
+        store = get_columnar_store()
+        if not store.enabled:
+            store.mark_unsynced("列式存储未启用期间 SQLite 有写入")
+            return
+        try:
+            store.write(pd.DataFrame(rows))
+        except Exception as e:
+            store.mark_unsynced(f"同步写入失败: {e}")
+    
+    def _get_upsert_insert(self):
+        """
+        获取支持 ON CONFLICT 的 insert 构造函数
+        
+        Returns:
+            方言对应的 insert 函数，不支持时返回 None
+        """
+        dialect = self._engine.dialect.name
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+            return insert
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+            return insert
+        return None
+    
+    @staticmethod
+    def _frame_to_rows(
+        df: pd.DataFrame,
+        code: Optional[str],
+        data_source: str
+    ) -> List[Dict[str, Any]]:
+        """
+        将日线 DataFrame 转换为批量写入的行字典列表
+        
+        每一列只做一次向量化转换（日期解析、数值化、NaN -> None），
+        避免 iterrows() 逐行构造 Series 的开销
+        """
+        n = len(df)
+        
+        if code is not None:
+            codes = [code] * n
+        elif 'code' in df.columns:
+            codes = df['code'].astype(str).tolist()
+        else:
+            raise ValueError("批量保存需要指定 code 或在 DataFrame 中包含 code 列")
+        
+        dates = pd.to_datetime(df['date']).dt.date.tolist()
+        
+        columns: Dict[str, List[Any]] = {}
+        for col in DatabaseManager._DAILY_VALUE_COLUMNS:
+            if col not in df.columns:
+                columns[col] = [None] * n
+                continue
+            values = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float)
+            objects = values.astype(object)
+            objects[np.isnan(values)] = None
+            columns[col] = objects.tolist()
+        
+        now = datetime.now()
+        
+        # 按 (code, date) 去重，后出现的覆盖先出现的
+        deduped: Dict[Tuple[str, date], Dict[str, Any]] = {}
+        for i in range(n):
+            row = {
+                'code': codes[i],
+                'date': dates[i],
+                'data_source': data_source,
+                'created_at': now,
+                'updated_at': now,
+            }
+            for col, values in columns.items():
+                row[col] = values[i]
+            deduped[(codes[i], dates[i])] = row
+        
+        return list(deduped.values())
+    
+    @_serialized_write
+    def _save_daily_data_rowwise(
+        self,
+        df: pd.DataFrame,
+        code: str,
+        data_source: str
+    ) -> int:
+        """
+        逐行保存日线数据（不支持 ON CONFLICT 的数据库方言使用）
+        
+        Returns:
+            新增的记录数
+        """
         saved_count = 0
         
         with self.get_session() as session:
@@ -382,56 +1177,232 @@ class DatabaseManager:
                 logger.error(f"保存 {code} 数据失败: {e}")
                 raise
         
+        rows = self._frame_to_rows(df, code, data_source)
+        self._update_bar_cache(rows)
+        self._commit_indicator_state(rows)
+        self._write_through(rows)
         return saved_count
     
+    def get_latest_daily_date(self, end_date: Optional[date] = None) -> Optional[date]:
+        """
+        获取本地日线数据的最新交易日
+        
+        Args:
+            end_date: 截止日期（含，可选）
+        
+        Returns:
+            最新交易日，无数据时返回 None
+        """
+        query = select(func.max(StockDaily.date))
+        if end_date is not None:
+            query = query.where(StockDaily.date <= end_date)
+        
+        with self.get_session() as session:
+            return session.execute(query).scalar_one_or_none()
+    
+    def get_latest_update_time(self) -> Optional[datetime]:
+        """
+        获取日线数据最近一次写入 / 更新的时间（数据立方体据此判断是否落后于数据库）
+        
+        Returns:
+            最大的 updated_at，无数据时返回 None
+        """
+        with self.get_session() as session:
+            return session.execute(select(func.max(StockDaily.updated_at))).scalar_one_or_none()
+    
+    def get_rs_ratings(self, trade_date: date) -> pd.DataFrame:
+        """
+        获取指定交易日缓存的 RS 评级表
+        
+        Args:
+            trade_date: 交易日
+        
+        Returns:
+            以 code 为索引的 DataFrame，无缓存时返回空 DataFrame
+        """
+        columns = list(self._RS_COLUMNS)
+        with self.get_session() as session:
+            rows = session.execute(
+                select(*[getattr(StockRsRating, col) for col in ['code'] + columns])
+                .where(StockRsRating.date == trade_date)
+            ).all()
+        
+        return pd.DataFrame.from_records(rows, columns=['code'] + columns).set_index('code')
+    
+    @_serialized_write
+    def save_rs_ratings(self, df: pd.DataFrame, trade_date: date) -> int:
+        """
+        保存某个交易日的 RS 评级表（先删除该日旧数据再批量插入）
+        
+        Args:
+            df: 以 code 为索引、包含 _RS_COLUMNS 列的 DataFrame
+            trade_date: 交易日
+        
+        Returns:
+            写入的记录数
+        """
+        if df is None or df.empty:
+            return 0
+        
+        columns = list(self._RS_COLUMNS)
+        values = df[columns].astype(object).where(df[columns].notna(), None)
+        rows = [
+            {'code': str(code), 'date': trade_date, **dict(zip(columns, record))}
+            for code, record in zip(df.index, values.itertuples(index=False, name=None))
+        ]
+        
+        with self.get_session() as session:
+            try:
+                session.execute(delete(StockRsRating).where(StockRsRating.date == trade_date))
+                for offset in range(0, len(rows), self.BULK_CHUNK_SIZE):
+                    session.execute(insert(StockRsRating), rows[offset:offset + self.BULK_CHUNK_SIZE])
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                logger.error(f"保存 RS 评级失败: {e}")
+                raise
+        
+        logger.info(f"保存 {trade_date} RS 评级 {len(rows)} 条")
+        return len(rows)
+    
+    def get_indicator_state(self, code: str) -> Optional[Tuple[date, str]]:
+        """
+        获取股票的增量指标状态
+        
+        Returns:
+            (最后一根 K 线日期, 状态 JSON)，不存在返回 None
+        """
+        with self.get_session() as session:
+            row = session.execute(
+                select(IndicatorStateRecord.last_date, IndicatorStateRecord.state)
+                .where(IndicatorStateRecord.code == code)
+            ).first()
+        return (row[0], row[1]) if row else None
+    
+    @_serialized_write
+    def save_indicator_state(self, code: str, last_date: date, state: str) -> None:
+        """
+        保存股票的增量指标状态（存在则覆盖）
+        """
+        with self.get_session() as session:
+            try:
+                record = session.get(IndicatorStateRecord, code)
+                if record is None:
+                    session.add(IndicatorStateRecord(code=code, last_date=last_date, state=state))
+                else:
+                    record.last_date = last_date
+                    record.state = state
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                logger.error(f"保存 {code} 指标状态失败: {e}")
+                raise
+    
+    def get_analysis_result(self, code: str, input_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        获取输入哈希相同的已保存分析结果
+        
+        Returns:
+            AnalysisResult 字段字典，不存在返回 None
+        """
+        with self.get_session() as session:
+            result = session.execute(
+                select(AnalysisResultRecord.result).where(
+                    and_(AnalysisResultRecord.code == code, AnalysisResultRecord.input_hash == input_hash)
+                )
+            ).scalar_one_or_none()
+        return json.loads(result) if result is not None else None
+    
+    @_serialized_write
+    def save_analysis_result(
+        self,
+        code: str,
+        input_hash: str,
+        result: Dict[str, Any],
+        trade_date: Optional[date] = None
+    ) -> None:
+        """
+        保存分析结果（相同输入哈希已存在时覆盖）
+        
+        Args:
+            code: 股票代码
+            input_hash: 分析输入的 SHA-256
+            result: AnalysisResult 字段字典
+            trade_date: 分析对应的交易日（可选）
+        """
+        content = json.dumps(result, ensure_ascii=False, default=str)
+        with self.get_session() as session:
+            try:
+                record = session.execute(
+                    select(AnalysisResultRecord).where(
+                        and_(AnalysisResultRecord.code == code, AnalysisResultRecord.input_hash == input_hash)
+                    )
+                ).scalar_one_or_none()
+                if record is None:
+                    session.add(AnalysisResultRecord(code=code, date=trade_date, input_hash=input_hash, result=content))
+                else:
+                    record.date = trade_date
+                    record.result = content
+                    record.created_at = datetime.now()
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                logger.error(f"保存 {code} 分析结果失败: {e}")
+                raise
+    
     def get_analysis_context(
         self, 
         code: str,
-        target_date: Optional[date] = None
+        target_date: Optional[date] = None,
+        history_days: Optional[int] = None
     ) -> Optional[Dict[str, Any]]:
         """
         获取分析所需的上下文数据
         
-        返回今日数据 + 昨日数据的对比信息
+        一次查询取出最近 history_days 根 K 线：
+        最后两根作为今日 / 昨日数据做对比，完整窗口放在 raw_data 中供趋势分析使用
         
         Args:
             code: 股票代码
             target_date: 目标日期（默认今天）
+            history_days: 历史 K 线数量（默认 ANALYSIS_HISTORY_DAYS）
             
         Returns:
-            包含今日数据、昨日对比等信息的字典
+            包含今日数据、昨日对比等信息的字典，raw_data 为按日期升序的日线 DataFrame
+            （today / yesterday 中的日期为 ISO 字符串，可直接 JSON 序列化）
         """
         if target_date is None:
             target_date = date.today()
         
-        # 获取最近2天数据
-        recent_data = self.get_latest_data(code, days=2)
+        df = self.get_daily_frame(code, days=history_days or self.ANALYSIS_HISTORY_DAYS, end_date=target_date)
         
-        if not recent_data:
+        if df.empty:
             logger.warning(f"未找到 {code} 的数据")
             return None
         
-        today_data = recent_data[0]
-        yesterday_data = recent_data[1] if len(recent_data) > 1 else None
+        bars = [self._bar_to_dict(row) for row in df.iloc[-2:].to_dict('records')]
+        today_data = bars[-1]
+        yesterday_data = bars[0] if len(bars) > 1 else None
         
         context = {
             'code': code,
-            'date': today_data.date.isoformat(),
-            'today': today_data.to_dict(),
+            'date': today_data['date'],
+            'today': today_data,
+            'raw_data': df,
         }
         
         if yesterday_data:
-            context['yesterday'] = yesterday_data.to_dict()
+            context['yesterday'] = yesterday_data
             
             # 计算相比昨日的变化
-            if yesterday_data.volume and yesterday_data.volume > 0:
+            if yesterday_data['volume'] and today_data['volume'] is not None:
                 context['volume_change_ratio'] = round(
-                    today_data.volume / yesterday_data.volume, 2
+                    today_data['volume'] / yesterday_data['volume'], 2
                 )
             
-            if yesterday_data.close and yesterday_data.close > 0:
+            if yesterday_data['close'] and today_data['close'] is not None:
                 context['price_change_ratio'] = round(
-                    (today_data.close - yesterday_data.close) / yesterday_data.close * 100, 2
+                    (today_data['close'] - yesterday_data['close']) / yesterday_data['close'] * 100, 2
                 )
             
             # 均线形态判断
@@ -439,7 +1410,21 @@ class DatabaseManager:
         
         return context
     
-    def _analyze_ma_status(self, data: StockDaily) -> str:
+    @staticmethod
+    def _bar_to_dict(row: Dict[str, Any]) -> Dict[str, Any]:
+        """日线 DataFrame 的一行转为上下文字典（字段与 StockDaily.to_dict 相同，NaN -> None）"""
+        bar = {
+            col: (None if pd.isna(row.get(col)) else float(row.get(col)))
+            for col in DatabaseManager._DAILY_VALUE_COLUMNS
+        }
+        return {
+            'code': row['code'],
+            'date': pd.Timestamp(row['date']).date().isoformat(),
+            **bar,
+            'data_source': row.get('data_source'),
+        }
+    
+    def _analyze_ma_status(self, data: Dict[str, Any]) -> str:
         """
         分析均线形态
         
@@ -448,10 +1433,10 @@ class DatabaseManager:
         - 空头排列：close < ma5 < ma10 < ma20
         - 震荡整理：其他情况
         """
-        close = data.close or 0
-        ma5 = data.ma5 or 0
-        ma10 = data.ma10 or 0
-        ma20 = data.ma20 or 0
+        close = data.get('close') or 0
+        ma5 = data.get('ma5') or 0
+        ma10 = data.get('ma10') or 0
+        ma20 = data.get('ma20') or 0
         
         if close > ma5 > ma10 > ma20 > 0:
             return "多头排列 📈"
@@ -465,6 +1450,190 @@ class DatabaseManager:
             return "震荡整理 ↔️"
 
 
+class WriteBehindQueue:
+    """
+    日线数据异步写入队列（write-behind）
+    
+    工作线程把获取到的日线 DataFrame 放入有界队列后立即返回，
+    由一个后台写线程把多只股票的数据合并成大批量 UPSERT 写入，
+    网络获取与数据库写入因此可以重叠进行
+    
+    - 背压：队列满时 submit 阻塞，直到写线程腾出空间
+    - 读己之写：分析某只股票前调用 wait_for(code)，等待该股票已提交的数据落库
+    - 关闭：close() 写完队列中剩余的数据后才退出写线程
+    """
+    
+    # 凑批等待时间（秒）：取到第一份数据后，最多再等这么久合并后续数据
+    MAX_BATCH_DELAY = 0.5
+    
+    _STOP = object()
+    
+    def __init__(self, db: Optional[DatabaseManager] = None, maxsize: int = 64, batch_rows: int = 20000):
+        """
+        Args:
+            db: 数据库管理器（可选，默认单例）
+            maxsize: 队列中最多缓存的 DataFrame 数量（超过时 submit 阻塞）
+            batch_rows: 单次批量写入的目标行数
+        """
+        self.db = db or get_db()
+        self.batch_rows = batch_rows
+        self.stats = {'batches': 0, 'frames': 0, 'rows': 0}
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._pending: Dict[str, int] = {}
+        self._failed: Set[str] = set()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._submitting = 0
+        self._abandoned = 0
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+    
+    def submit(self, df: pd.DataFrame, code: str, data_source: str) -> None:
+        """
+        提交一只股票的日线数据（队列满时阻塞）
+        
+        关闭检查与登记在同一次加锁中完成；close() 等所有进行中的提交入队后才放入停止标记，
+        因此不会有数据排在停止标记之后无人处理
+        """
+        frame = df.assign(code=code)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("写入队列已关闭")
+            self._pending[code] = self._pending.get(code, 0) + 1
+            self._failed.discard(code)
+            self._submitting += 1
+        try:
+            # 队列满时在锁外阻塞，写线程更新计数需要该锁
+            self._queue.put((code, data_source, frame))
+        except BaseException:
+            with self._cond:
+                self._release(code, failed=True)
+            raise
+        finally:
+            with self._cond:
+                self._submitting -= 1
+                self._cond.notify_all()
+    
+    def wait_for(self, code: str, timeout: Optional[float] = None) -> bool:
+        """
+        等待该股票已提交的数据全部写入
+        
+        Returns:
+            是否写入成功（没有待写入数据时返回 True，超时或写入失败返回 False）
+        """
+        with self._cond:
+            done = self._cond.wait_for(lambda: self._pending.get(code, 0) == 0, timeout)
+            return done and code not in self._failed
+    
+    def close(self) -> bool:
+        """
+        写完队列中剩余的数据后停止写线程
+        
+        Returns:
+            队列中的数据是否已全部处理（写线程异常退出时为 False）
+        """
+        with self._cond:
+            if self._closed:
+                stop = False
+            else:
+                self._closed = stop = True
+                self._cond.wait_for(lambda: self._submitting == 0)
+        if stop:
+            self._queue.put(self._STOP)
+            self._thread.join()
+            logger.info(f"[写入队列] 已关闭: {self.stats['batches']} 批 / {self.stats['frames']} 只 / {self.stats['rows']} 条")
+        with self._cond:
+            return not self._pending and not self._abandoned
+    
+    def _run(self) -> None:
+        try:
+            self._consume()
+        finally:
+            # 写线程退出（正常关闭或异常）后仍未写入的数据全部记为失败，等待方不会一直阻塞
+            with self._cond:
+                self._closed = True
+                if self._pending:
+                    logger.error(f"[写入队列] 写线程异常退出，{len(self._pending)} 只股票的数据未写入")
+                    self._abandoned += len(self._pending)
+                    self._failed.update(self._pending)
+                    self._pending.clear()
+                self._cond.notify_all()
+            # 清空队列，阻塞在 put 上的提交方得以返回
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+    
+    def _consume(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is self._STOP:
+                break
+            
+            # 凑批：在等待时间内继续取，直到达到目标行数
+            batch = [item]
+            rows = len(item[2])
+            deadline = time.monotonic() + self.MAX_BATCH_DELAY
+            while rows < self.batch_rows:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                rows += len(item[2])
+            
+            self._write_batch(batch)
+    
+    def _write_batch(self, batch: List[Tuple[str, str, pd.DataFrame]]) -> None:
+        """按数据来源分组，每组一次批量 UPSERT；失败时逐只重试，定位出错的股票"""
+        failed: Set[str] = set()
+        by_source: Dict[str, List[Tuple[str, str, pd.DataFrame]]] = {}
+        for item in batch:
+            by_source.setdefault(item[1], []).append(item)
+        
+        try:
+            for data_source, items in by_source.items():
+                frame = pd.concat([f for _, _, f in items], ignore_index=True)
+                try:
+                    inserted, updated = self.db.bulk_upsert_daily_data(frame, data_source)
+                    logger.info(f"[写入队列] 批量写入 {len(items)} 只 {len(frame)} 条（新增 {inserted}，更新 {updated}）")
+                except Exception as e:
+                    logger.warning(f"[写入队列] 批量写入失败，逐只重试: {e}")
+                    for code, _, f in items:
+                        try:
+                            self.db.save_daily_data(f, code, data_source)
+                        except Exception as e:
+                            logger.error(f"[写入队列] [{code}] 写入失败: {e}")
+                            failed.add(code)
+        except Exception as e:
+            logger.error(f"[写入队列] 写入异常: {e}")
+            failed.update(code for code, _, _ in batch)
+        finally:
+            self.stats['batches'] += 1
+            self.stats['frames'] += len(batch)
+            self.stats['rows'] += sum(len(f) for _, _, f in batch)
+            with self._cond:
+                for code, _, _ in batch:
+                    self._release(code, failed=code in failed)
+                self._cond.notify_all()
+    
+    def _release(self, code: str, failed: bool = False) -> None:
+        """一份数据处理完毕：减少待写入计数（调用方需持有 self._cond）"""
+        count = self._pending.get(code, 0) - 1
+        if count > 0:
+            self._pending[code] = count
+        else:
+            self._pending.pop(code, None)
+        if failed:
+            self._failed.add(code)
+
+
 # 便捷函数
 def get_db() -> DatabaseManager:
     """获取数据库管理器实例的快捷方式"""
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+测试公共夹具
+===================================
+
+每个测试使用独立的临时目录存放数据库、列式存储等文件，
+并在前后重置各个单例，测试之间互不影响
+"""
+
+import pytest
+
+from columnar_store import ColumnarStore
+from config import Config
+from indicator_state import IndicatorStateStore
+from storage import DatabaseManager
+
+
+def _reset_singletons() -> None:
+    DatabaseManager.reset_instance()
+    IndicatorStateStore.reset_instance()
+    ColumnarStore.reset_instance()
+    Config.reset_instance()
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(tmp_path, monkeypatch):
+    """数据文件全部放到临时目录，并重置单例"""
+    monkeypatch.setenv('DATABASE_PATH', str(tmp_path / 'stock_analysis.db'))
+    monkeypatch.setenv('COLUMNAR_STORE_DIR', str(tmp_path / 'columnar'))
+    monkeypatch.setenv('OHLCV_CUBE_DIR', str(tmp_path / 'cube'))
+    monkeypatch.setenv('RAW_CACHE_DIR', str(tmp_path / 'raw_cache'))
+    _reset_singletons()
+    yield tmp_path
+    _reset_singletons()
+
+
+@pytest.fixture
+def db(isolated_env):
+    """临时数据库"""
+    from storage import get_db
+    return get_db()
+
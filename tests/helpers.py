@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""测试数据构造"""
+
+import numpy as np
+import pandas as pd
+
+
+def make_bars(n: int, start: str = '2024-01-02', seed: int = 0, gaps: int = 0) -> pd.DataFrame:
+    """
+    生成随机游走日线（date/open/high/low/close/volume/amount/pct_chg）
+    
+    Args:
+        n: K 线根数
+        start: 起始交易日
+        seed: 随机种子
+        gaps: 随机去掉的交易日数（模拟停牌）
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start=start, periods=n + gaps)
+    if gaps:
+        keep = np.sort(rng.choice(len(dates), size=n, replace=False))
+        dates = dates[keep]
+    close = np.round(10 * np.cumprod(1 + rng.normal(0.001, 0.02, n)), 2)
+    spread = np.abs(rng.normal(0, 0.01, n))
+    df = pd.DataFrame({
+        'date': dates,
+        'open': np.round(close * (1 + rng.normal(0, 0.005, n)), 2),
+        'high': np.round(close * (1 + spread), 2),
+        'low': np.round(close * (1 - spread), 2),
+        'close': close,
+        'volume': np.round(rng.lognormal(13, 0.5, n)),
+        'amount': np.round(rng.lognormal(18, 0.5, n)),
+    })
+    df['pct_chg'] = np.round(df['close'].pct_change().fillna(0) * 100, 2)
+    return df
+
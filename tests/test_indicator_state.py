@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""增量指标状态与整窗重新计算的一致性"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicator_state import IndicatorState, get_indicator_state_store
+from tests.helpers import make_bars
+
+
+def _full_recompute(df: pd.DataFrame) -> pd.DataFrame:
+    """用 pandas 对整个窗口重新计算（IndicatorState 的口径）"""
+    close = df['close'].astype(float)
+    volume = df['volume'].astype(float)
+    out = pd.DataFrame(index=df.index)
+    for window in (5, 10, 20):
+        out[f'ma{window}'] = close.rolling(window, min_periods=1).mean()
+    out['ma60'] = close.rolling(60).mean()
+    for span in (12, 26, 50):
+        ema = close.ewm(span=span, adjust=False).mean()
+        out[f'ema{span}'] = ema.where(np.arange(len(df)) + 1 >= span)
+    avg_volume = volume.shift(1).rolling(5, min_periods=1).mean()
+    out['volume_ratio'] = (volume / avg_volume).fillna(1.0)
+    return out
+
+
+def _assert_values(values, expected_row):
+    for key, expected in expected_row.items():
+        if np.isnan(expected):
+            assert np.isnan(values[key]), key
+        else:
+            assert values[key] == pytest.approx(expected, rel=1e-9), key
+
+
+def test_incremental_updates_match_full_recompute():
+    df = make_bars(300, seed=3)
+    expected = _full_recompute(df)
+    
+    state = IndicatorState.from_history('600000', df.iloc[:1])
+    _assert_values(state.values(), expected.iloc[0])
+    for i in range(1, len(df)):
+        bar = df.iloc[i]
+        values = state.update(bar['date'].date(), bar['close'], bar['volume'])
+        _assert_values(values, expected.iloc[i])
+
+
+def test_revising_last_bar_matches_recompute():
+    df = make_bars(80, seed=4)
+    state = IndicatorState.from_history('600000', df)
+    
+    revised = df.copy()
+    revised.loc[revised.index[-1], ['close', 'volume']] = [revised['close'].iloc[-1] * 1.05, 1.0e6]
+    for close in (revised['close'].iloc[-1] * 0.9, revised['close'].iloc[-1]):
+        values = state.update(revised['date'].iloc[-1].date(), close, 1.0e6)
+    
+    _assert_values(values, _full_recompute(revised).iloc[-1])
+    assert state.matches(revised)
+    assert not state.matches(df)
+
+
+def test_serialized_state_continues_identically():
+    df = make_bars(150, seed=5)
+    state = IndicatorState.from_history('600000', df.iloc[:100])
+    restored = IndicatorState.from_json('600000', state.last_date, state.to_json())
+    
+    for _, bar in df.iloc[100:].iterrows():
+        a = state.update(bar['date'].date(), bar['close'], bar['volume'])
+        b = restored.update(bar['date'].date(), bar['close'], bar['volume'])
+        assert a == pytest.approx(b, nan_ok=True)
+
+
+def test_older_bar_is_rejected():
+    df = make_bars(10)
+    state = IndicatorState.from_history('600000', df)
+    with pytest.raises(ValueError):
+        state.update(df['date'].iloc[0].date(), 1.0, 1.0)
+
+
+def test_store_apply_commit_then_incremental(db):
+    store = get_indicator_state_store()
+    df = make_bars(200, seed=6)
+    expected = _full_recompute(df)
+    
+    history = df.iloc[:150].copy()
+    db.bulk_upsert_daily_data(history, 'Test', code='600000')
+    
+    # 首次：无状态，用本地历史重建后增量计算新 K 线；写库后提交
+    new = df.iloc[150:170].reset_index(drop=True)
+    out = store.apply('600000', new, db.get_daily_frame('600000', days=120))
+    assert out['ma20'].tolist() == pytest.approx(np.round(expected['ma20'].iloc[150:170], 2).tolist())
+    assert store.get('600000') is None
+    db.bulk_upsert_daily_data(out, 'Test', code='600000')
+    assert store.get('600000').last_date == df['date'].iloc[169].date()
+    
+    # 第二次：已提交状态与本地数据一致，直接增量更新（含一根重叠 K 线）
+    new = df.iloc[169:200].reset_index(drop=True)
+    out = store.apply('600000', new, db.get_daily_frame('600000', days=120))
+    assert out['ma5'].tolist() == pytest.approx(np.round(expected['ma5'].iloc[169:200], 2).tolist())
+    assert out['volume_ratio'].tolist() == pytest.approx(np.round(expected['volume_ratio'].iloc[169:200], 2).tolist())
+    db.bulk_upsert_daily_data(out, 'Test', code='600000')
+    
+    # EMA 从重建时读取的 120 根本地历史开始累积
+    warm = _full_recompute(df.iloc[30:].reset_index(drop=True))
+    _assert_values(store.get('600000').values(), warm.iloc[-1])
+
+
+def test_store_rejects_pending_state_after_revision(db):
+    store = get_indicator_state_store()
+    df = make_bars(160, seed=7)
+    db.bulk_upsert_daily_data(df.iloc[:140], 'Test', code='600000')
+    
+    new = df.iloc[140:].reset_index(drop=True)
+    store.apply('600000', new, db.get_daily_frame('600000', days=120))
+    
+    # 实际入库的是整窗修订（如除权）后的数据：待提交状态与之不一致，不能保存
+    adjusted = df.assign(close=df['close'] * 0.5)
+    db.bulk_upsert_daily_data(adjusted, 'Test', code='600000')
+    assert store.get('600000') is None
+    
+    # 下次 apply 用本地历史重建，结果与整窗重新计算一致
+    bar = make_bars(161, seed=7).iloc[-1:].assign(close=10.0)
+    bar['date'] = df['date'].iloc[-1] + pd.offsets.BDay(1)
+    out = store.apply('600000', bar.reset_index(drop=True), db.get_daily_frame('600000', days=120))
+    combined = pd.concat([adjusted, bar], ignore_index=True)
+    assert out['ma10'].iloc[-1] == pytest.approx(round(_full_recompute(combined)['ma10'].iloc[-1], 2))
+
+
+def test_store_discard_drops_pending_state(db):
+    store = get_indicator_state_store()
+    df = make_bars(130, seed=8)
+    db.bulk_upsert_daily_data(df.iloc[:125], 'Test', code='600000')
+    store.apply('600000', df.iloc[125:].reset_index(drop=True), db.get_daily_frame('600000', days=120))
+    
+    store.discard('600000')
+    db.bulk_upsert_daily_data(df, 'Test', code='600000')
+    assert store.get('600000') is None
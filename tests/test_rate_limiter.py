@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""令牌桶限流：预约、超时与取消时归还令牌"""
+
+import threading
+import time
+
+import pytest
+
+from data_provider.rate_limiter import TokenBucket
+
+
+def test_burst_then_try_acquire():
+    bucket = TokenBucket('test', rate=1.0, burst=3)
+    assert all(bucket.try_acquire() for _ in range(3))
+    assert not bucket.try_acquire()
+
+
+def test_timeout_does_not_reserve_tokens():
+    bucket = TokenBucket('test', rate=0.5, burst=1)
+    assert bucket.acquire()
+    
+    assert not bucket.acquire(timeout=0.1)
+    # 超时直接返回，不留下欠额
+    assert bucket.available() == pytest.approx(0.0, abs=0.1)
+
+
+def test_cancelled_wait_refunds_reserved_tokens():
+    bucket = TokenBucket('test', rate=0.5, burst=1)
+    assert bucket.acquire()
+    
+    cancel = threading.Event()
+    timer = threading.Timer(0.1, cancel.set)
+    timer.start()
+    start = time.monotonic()
+    try:
+        assert not bucket.acquire(cancel=cancel)
+    finally:
+        timer.cancel()
+    
+    # 取消后立即返回（不等满 2 秒），预约的令牌归还，后续请求不用替它排队
+    assert time.monotonic() - start < 1.0
+    assert bucket.available() == pytest.approx(0.0, abs=0.2)
+    assert bucket.available() > -0.5
+
+
+def test_refund_never_exceeds_burst():
+    bucket = TokenBucket('test', rate=100.0, burst=1)
+    assert bucket.acquire()
+    
+    cancel = threading.Event()
+    cancel.set()
+    # 已设置的取消事件：等待立即结束，归还后令牌数不超过桶容量
+    bucket.acquire(cancel=cancel)
+    time.sleep(0.05)
+    assert bucket.available() <= 1.0
+
+
+def test_queued_acquirers_are_spaced_by_rate():
+    bucket = TokenBucket('test', rate=20.0, burst=1)
+    start = time.monotonic()
+    for _ in range(4):
+        assert bucket.acquire()
+    # 第一个令牌来自桶容量，其余 3 个各等 1/20 秒
+    assert time.monotonic() - start == pytest.approx(0.15, abs=0.1)
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""数据源熔断器：熔断、半开探测与故障切换"""
+
+import time
+
+import pytest
+
+from data_provider.base import BaseFetcher, DataFetcherManager
+from data_provider.source_health import STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN, SourceHealth
+from tests.helpers import make_bars
+
+COOLDOWN = 0.2
+
+
+def _open_breaker(health: SourceHealth) -> None:
+    for _ in range(health.failure_threshold):
+        health.record_failure(0.1, health.allow_request())
+    assert health.state == STATE_OPEN
+
+
+def _wait_half_open(health: SourceHealth) -> None:
+    time.sleep(COOLDOWN + 0.05)
+    assert health.state == STATE_HALF_OPEN
+
+
+@pytest.fixture
+def health():
+    return SourceHealth('test', failure_threshold=2, cooldown=COOLDOWN)
+
+
+def test_consecutive_failures_open_breaker(health):
+    assert health.allow_request() is not None
+    _open_breaker(health)
+    assert health.allow_request() is None
+
+
+def test_success_resets_failure_streak(health):
+    health.record_failure(0.1, health.allow_request())
+    health.record_success(0.1, health.allow_request())
+    health.record_failure(0.1, health.allow_request())
+    assert health.state == STATE_CLOSED
+
+
+def test_half_open_admits_single_probe(health):
+    _open_breaker(health)
+    _wait_half_open(health)
+    
+    probe = health.allow_request()
+    assert probe is not None and probe.probe
+    assert health.allow_request() is None
+
+
+def test_probe_success_closes_breaker(health):
+    _open_breaker(health)
+    _wait_half_open(health)
+    
+    health.record_success(0.1, health.allow_request())
+    assert health.state == STATE_CLOSED
+    assert health.allow_request() is not None
+
+
+def test_probe_failure_reopens_breaker(health):
+    _open_breaker(health)
+    _wait_half_open(health)
+    
+    health.record_failure(0.1, health.allow_request())
+    assert health.state == STATE_OPEN
+    assert health.allow_request() is None
+
+
+def test_late_result_from_earlier_request_does_not_touch_probe(health):
+    # 熔断前已发出的请求
+    straggler = health.allow_request()
+    _open_breaker(health)
+    _wait_half_open(health)
+    probe = health.allow_request()
+    
+    # 迟到的失败不会重新熔断，也不会释放探测名额
+    health.record_failure(5.0, straggler)
+    assert health.state == STATE_HALF_OPEN
+    assert health.allow_request() is None
+    
+    # 迟到的成功同样不能代替探测结果
+    health.record_success(5.0, straggler)
+    assert health.state == STATE_HALF_OPEN
+    
+    health.record_success(0.1, probe)
+    assert health.state == STATE_CLOSED
+
+
+def test_release_probe_only_for_probe_ticket(health):
+    straggler = health.allow_request()
+    _open_breaker(health)
+    _wait_half_open(health)
+    probe = health.allow_request()
+    
+    health.release_probe(straggler)
+    assert health.allow_request() is None
+    
+    health.release_probe(probe)
+    assert health.allow_request() is not None
+
+
+class _FakeFetcher(BaseFetcher):
+    """按预设结果返回的数据源"""
+    
+    def __init__(self, name: str, priority: int, fail: bool):
+        self.name = name
+        self.priority = priority
+        self.fail = fail
+        self.calls = 0
+    
+    def _fetch_raw_data(self, stock_code, start_date, end_date):
+        raise NotImplementedError
+    
+    def _normalize_data(self, df, stock_code):
+        raise NotImplementedError
+    
+    def get_daily_data(self, stock_code, start_date=None, end_date=None, days=30, history=None):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError(f"{self.name} down")
+        return make_bars(days)
+
+
+@pytest.fixture
+def breaker_env(monkeypatch):
+    monkeypatch.setenv('CIRCUIT_BREAKER_FAILURES', '2')
+    monkeypatch.setenv('CIRCUIT_BREAKER_COOLDOWN', str(COOLDOWN))
+    monkeypatch.setenv('HEDGED_REQUESTS_ENABLED', 'false')
+    from config import Config
+    Config.reset_instance()
+
+
+def test_manager_skips_open_sources_and_probes_after_cooldown(breaker_env):
+    from data_provider.base import DataFetchError
+    
+    primary = _FakeFetcher('Primary', 0, fail=True)
+    backup = _FakeFetcher('Backup', 1, fail=True)
+    manager = DataFetcherManager([primary, backup])
+    
+    for _ in range(2):
+        with pytest.raises(DataFetchError):
+            manager.get_daily_data('600000', days=10)
+    assert (primary.calls, backup.calls) == (2, 2)
+    
+    # 熔断期间直接跳过，不再请求
+    with pytest.raises(DataFetchError, match="熔断中"):
+        manager.get_daily_data('600000', days=10)
+    assert (primary.calls, backup.calls) == (2, 2)
+    
+    # 冷却结束后按优先级放行探测：主数据源恢复，备用数据源仍在半开等待探测
+    time.sleep(COOLDOWN + 0.05)
+    primary.fail = False
+    df, source = manager.get_daily_data('600000', days=10)
+    assert source == 'Primary' and len(df) == 10
+    assert manager._health['Primary'].state == STATE_CLOSED
+    assert manager._health['Backup'].state == STATE_HALF_OPEN
+
+
+def test_manager_fails_over_to_next_source(breaker_env):
+    primary = _FakeFetcher('Primary', 0, fail=True)
+    backup = _FakeFetcher('Backup', 1, fail=False)
+    manager = DataFetcherManager([primary, backup])
+    
+    df, source = manager.get_daily_data('600000', days=10)
+    assert source == 'Backup' and len(df) == 10
+    assert manager._health['Primary'].snapshot()['total_failures'] == 1
+
+
+def test_manager_raises_when_all_sources_fail(breaker_env):
+    from data_provider.base import DataFetchError
+    
+    manager = DataFetcherManager([_FakeFetcher('A', 0, fail=True), _FakeFetcher('B', 1, fail=True)])
+    with pytest.raises(DataFetchError):
+        manager.get_daily_data('600000', days=10)
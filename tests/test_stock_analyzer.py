@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""批量趋势分析（analyze_many）与逐只分析（analyze）的一致性"""
+
+import math
+
+import pandas as pd
+import pytest
+
+from market_panel import OhlcvPanel
+from stock_analyzer import StockTrendAnalyzer
+from tests.helpers import make_bars
+
+
+def _ragged_frame() -> pd.DataFrame:
+    """长短不一、起始日不同、带停牌缺口的多只股票长表"""
+    specs = [
+        # (代码, K 线根数, 起始日, 停牌天数)
+        ('000001', 130, '2024-01-02', 0),
+        ('000002', 90, '2024-02-15', 7),
+        ('000003', 60, '2024-03-01', 3),
+        ('000004', 59, '2024-03-04', 5),
+        ('000005', 25, '2024-05-06', 2),
+        ('000006', 21, '2024-05-20', 0),
+        ('000007', 12, '2024-06-03', 1),
+    ]
+    frames = []
+    for seed, (code, n, start, gaps) in enumerate(specs):
+        frames.append(make_bars(n, start=start, seed=seed, gaps=gaps).assign(code=code))
+    return pd.concat(frames, ignore_index=True)
+
+
+def _assert_same(batch, single):
+    expected = single.to_dict()
+    actual = batch.to_dict()
+    assert actual.keys() == expected.keys()
+    for key, value in expected.items():
+        if isinstance(value, float):
+            if math.isnan(value):
+                assert math.isnan(actual[key]), key
+            else:
+                assert actual[key] == pytest.approx(value, rel=1e-9, abs=1e-9), key
+        else:
+            assert actual[key] == value, key
+
+
+@pytest.mark.parametrize('as_panel', [False, True])
+def test_analyze_many_matches_analyze_on_ragged_panel(as_panel):
+    df = _ragged_frame()
+    analyzer = StockTrendAnalyzer()
+    data = OhlcvPanel.from_frame(df) if as_panel else df
+    
+    results = analyzer.analyze_many(data)
+    
+    assert set(results) == set(df['code'])
+    for code, group in df.groupby('code'):
+        single = analyzer.analyze(group.drop(columns='code').reset_index(drop=True), code)
+        _assert_same(results[code], single)
+
+
+def test_analyze_many_unsorted_input_and_code_filter():
+    df = _ragged_frame()
+    shuffled = df.sample(frac=1.0, random_state=7).reset_index(drop=True)
+    analyzer = StockTrendAnalyzer()
+    
+    results = analyzer.analyze_many(shuffled, codes=['000002', '000007'])
+    
+    assert set(results) == {'000002', '000007'}
+    for code in results:
+        group = shuffled[shuffled['code'] == code].drop(columns='code')
+        _assert_same(results[code], analyzer.analyze(group, code))
+
+
+def test_analyze_many_insufficient_data():
+    df = make_bars(19).assign(code='600000')
+    result = StockTrendAnalyzer().analyze_many(df)['600000']
+    
+    assert result.risk_factors == ["数据不足，无法完成分析"]
+    assert result.current_price == 0.0
+
+
+def test_analyze_many_empty_input():
+    assert StockTrendAnalyzer().analyze_many(pd.DataFrame()) == {}
+    assert StockTrendAnalyzer().analyze_many(OhlcvPanel.empty()) == {}
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""日线批量 UPSERT 计数与 K 线缓存失效"""
+
+import pandas as pd
+import pytest
+
+from storage import StockDaily
+from tests.helpers import make_bars
+
+
+def _count_rows(db) -> int:
+    with db.get_session() as session:
+        return session.query(StockDaily).count()
+
+
+def test_bulk_upsert_counts_inserts_and_updates(db):
+    df = make_bars(30)
+    
+    assert db.bulk_upsert_daily_data(df, 'Test', code='600000') == (30, 0)
+    
+    # 后 10 根修订 + 新增 5 根
+    more = make_bars(35, seed=1)
+    more['date'] = pd.bdate_range(start=df['date'].iloc[20], periods=35)
+    assert db.bulk_upsert_daily_data(more.iloc[:15], 'Test', code='600000') == (5, 10)
+    assert _count_rows(db) == 35
+    
+    stored = db.get_daily_frame('600000', days=100)
+    assert stored['close'].iloc[-1] == more['close'].iloc[14]
+
+
+def test_bulk_upsert_dedups_keys_within_frame(db):
+    df = make_bars(10)
+    duplicated = pd.concat([df, df.iloc[-3:].assign(close=99.0)], ignore_index=True)
+    
+    assert db.bulk_upsert_daily_data(duplicated, 'Test', code='600000') == (10, 0)
+    stored = db.get_daily_frame('600000', days=10)
+    assert (stored['close'].iloc[-3:] == 99.0).all()
+
+
+def test_bulk_upsert_multi_code_frame(db):
+    frame = pd.concat([make_bars(20, seed=i).assign(code=code) for i, code in enumerate(['000001', '600000'])])
+    assert db.bulk_upsert_daily_data(frame, 'Test') == (40, 0)
+    assert db.bulk_upsert_daily_data(frame, 'Test') == (0, 40)
+    
+    with pytest.raises(ValueError):
+        db.bulk_upsert_daily_data(make_bars(3), 'Test')
+
+
+@pytest.mark.parametrize('max_variables', [999, 32766])
+def test_bulk_upsert_respects_bind_variable_limit(db, max_variables):
+    db._max_variables = max_variables
+    df = make_bars(1500)
+    
+    assert db.bulk_upsert_daily_data(df.iloc[:300], 'Test', code='600000') == (300, 0)
+    assert db.bulk_upsert_daily_data(df, 'Test', code='600000', chunk_size=1000) == (1200, 300)
+    assert _count_rows(db) == 1500
+
+
+def test_chunk_rows_stays_within_limit(db):
+    db._max_variables = 999
+    assert db._chunk_rows(17) * 17 <= 999
+    assert db._chunk_rows(1, reserved=2) == db.BULK_CHUNK_SIZE
+    assert db._chunk_rows(2000) == 1
+
+
+def test_bar_cache_merges_committed_rows(db):
+    df = make_bars(40)
+    db.bulk_upsert_daily_data(df, 'Test', code='600000')
+    
+    # 读取填充缓存
+    db.get_daily_frame('600000', days=20)
+    hits = db.bar_cache_stats()['hits']
+    
+    # 修订最后一根并追加一根
+    revised = df.iloc[-1:].assign(close=123.45)
+    appended = df.iloc[-1:].assign(date=df['date'].iloc[-1] + pd.offsets.BDay(1), close=124.0)
+    db.bulk_upsert_daily_data(pd.concat([revised, appended]), 'Test', code='600000')
+    
+    cached = db.get_daily_frame('600000', days=20)
+    assert db.bar_cache_stats()['hits'] == hits + 1
+    assert cached['close'].iloc[-2:].tolist() == [123.45, 124.0]
+    pd.testing.assert_frame_equal(cached, db._query_daily_frame('600000', 20))
+
+
+def test_bar_cache_range_and_end_date_after_write(db):
+    df = make_bars(40)
+    db.bulk_upsert_daily_data(df.iloc[:30], 'Test', code='600000')
+    db.get_daily_frame('600000', days=10)
+    db.bulk_upsert_daily_data(df.iloc[30:], 'Test', code='600000')
+    
+    end = df['date'].iloc[34].date()
+    cached = db.get_daily_frame('600000', days=5, end_date=end)
+    pd.testing.assert_frame_equal(cached, db._query_daily_frame('600000', 5, end))
+    
+    start = df['date'].iloc[25].date()
+    records = db.get_data_range('600000', start, end)
+    assert [r.date for r in records] == [d.date() for d in df['date'].iloc[25:35]]
+    assert records[-1].close == df['close'].iloc[34]
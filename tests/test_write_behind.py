@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""日线异步写入队列（WriteBehindQueue）的写入顺序与失败处理"""
+
+import threading
+
+import pytest
+
+from storage import WriteBehindQueue
+from tests.helpers import make_bars
+
+
+def _written_codes(db, codes):
+    return {code for code in codes if not db.get_daily_frame(code, days=1).empty}
+
+
+class _FailingDb:
+    """批量写入总是失败、逐只写入对指定股票失败的假数据库"""
+    
+    def __init__(self, bad_codes):
+        self.bad_codes = set(bad_codes)
+        self.saved = []
+    
+    def bulk_upsert_daily_data(self, df, data_source='Unknown'):
+        raise RuntimeError("batch failed")
+    
+    def save_daily_data(self, df, code, data_source='Unknown'):
+        if code in self.bad_codes:
+            raise RuntimeError(f"{code} failed")
+        self.saved.append(code)
+        return len(df)
+
+
+def test_later_submission_wins_for_same_bar(db):
+    df = make_bars(10)
+    queue = WriteBehindQueue(db, maxsize=4, batch_rows=5)
+    try:
+        for close in (11.0, 12.0, 13.0):
+            queue.submit(df.assign(close=close), '600000', 'Test')
+        assert queue.wait_for('600000', timeout=10)
+    finally:
+        assert queue.close()
+    
+    stored = db.get_daily_frame('600000', days=10)
+    assert len(stored) == 10
+    assert (stored['close'] == 13.0).all()
+    assert queue.stats['frames'] == 3
+
+
+def test_many_codes_are_all_written(db):
+    codes = [f"{i:06d}" for i in range(20)]
+    queue = WriteBehindQueue(db, maxsize=2, batch_rows=50)
+    try:
+        for i, code in enumerate(codes):
+            queue.submit(make_bars(15, seed=i), code, 'Test')
+        assert all(queue.wait_for(code, timeout=10) for code in codes)
+    finally:
+        assert queue.close()
+    
+    assert _written_codes(db, codes) == set(codes)
+
+
+def test_failed_code_is_reported_without_blocking_others():
+    fake = _FailingDb(bad_codes={'000002'})
+    queue = WriteBehindQueue(fake, maxsize=8, batch_rows=10 ** 6)
+    try:
+        for i, code in enumerate(['000001', '000002', '000003']):
+            queue.submit(make_bars(5, seed=i), code, 'Test')
+        assert queue.wait_for('000001', timeout=10)
+        assert not queue.wait_for('000002', timeout=10)
+        assert queue.wait_for('000003', timeout=10)
+    finally:
+        # 失败的数据已处理完毕，不算遗留
+        assert queue.close()
+    
+    assert sorted(fake.saved) == ['000001', '000003']
+
+
+def test_resubmit_clears_failure():
+    fake = _FailingDb(bad_codes={'000001'})
+    queue = WriteBehindQueue(fake)
+    try:
+        queue.submit(make_bars(5), '000001', 'Test')
+        assert not queue.wait_for('000001', timeout=10)
+        fake.bad_codes.clear()
+        queue.submit(make_bars(5), '000001', 'Test')
+        assert queue.wait_for('000001', timeout=10)
+    finally:
+        queue.close()
+
+
+def test_submit_after_close_raises(db):
+    queue = WriteBehindQueue(db)
+    assert queue.close()
+    with pytest.raises(RuntimeError):
+        queue.submit(make_bars(5), '600000', 'Test')
+    # 重复关闭无副作用
+    assert queue.close()
+
+
+@pytest.mark.filterwarnings('ignore::pytest.PytestUnhandledThreadExceptionWarning')
+def test_dead_writer_releases_waiters(db):
+    class _BrokenQueue(WriteBehindQueue):
+        def _write_batch(self, batch):
+            raise SystemError("writer crashed")
+    
+    queue = _BrokenQueue(db, batch_rows=1)
+    queue.submit(make_bars(5), '600000', 'Test')
+    
+    assert not queue.wait_for('600000', timeout=10)
+    assert not queue.close()
+    with pytest.raises(RuntimeError):
+        queue.submit(make_bars(5), '600000', 'Test')
+
+
+def test_close_waits_for_concurrent_submits(db):
+    queue = WriteBehindQueue(db, maxsize=1, batch_rows=1)
+    codes = [f"{i:06d}" for i in range(8)]
+    errors = []
+    
+    def producer(i, code):
+        try:
+            queue.submit(make_bars(5, seed=i), code, 'Test')
+        except RuntimeError:
+            errors.append(code)
+    
+    threads = [threading.Thread(target=producer, args=(i, code)) for i, code in enumerate(codes)]
+    for thread in threads:
+        thread.start()
+    closed = queue.close()
+    for thread in threads:
+        thread.join()
+    
+    # 被拒绝的提交不会写入，已接受的提交必须全部落库
+    assert closed
+    written = _written_codes(db, codes)
+    assert written == set(codes) - set(errors)
+    assert all(queue.wait_for(code, timeout=1) for code in written)
@@ -2,15 +2,66 @@ import akshare as ak
 import pandas as pd
 import logging
 import time
+from datetime import date, datetime, timedelta
 import yfinance as yf
 
+from config import get_config
+from indicators import ema
+from data_provider.rate_limiter import HOST_EASTMONEY, HOST_YAHOO, get_rate_limiter
+from data_provider.spot_snapshot import SNAPSHOT_A_SHARE, get_spot_snapshot_service
+from market_panel import OhlcvPanel
+from relative_strength import get_rs_service
+from vcp_detector import detect_vcp
+
 logger = logging.getLogger(__name__)
 
+EMA_SPAN = 50
+MIN_BARS = 50
+TOP_N = 5
+
 def check_vcp_condition(df):
-    if df is None or len(df) < 50: return False
-    df['ema'] = df['收盘'].ewm(span=50, adjust=False).mean()
-    curr = df.iloc[-1]
-    return curr['收盘'] > curr['ema']
+    if df is None or len(df) < MIN_BARS: return False
+    close = df['收盘'].to_numpy(dtype=float).ravel()
+    return close[-1] > ema(close, EMA_SPAN)[-1]
+
+def _latest_trade_date():
+    # 快照对应的交易日：开盘（9:30）前取上一个工作日，周末取上周五，
+    # 保证快照（上一交易日收盘数据）覆盖而不是追加一根重复 K 线；
+    # 节假日由 OhlcvPanel.with_spot_bar 比较快照与最后一个交易日的行情识别
+    now = datetime.now()
+    today = now.date()
+    if today.weekday() < 5 and (now.hour, now.minute) < (9, 30):
+        today -= timedelta(days=1)
+    return today - timedelta(days=max(0, today.weekday() - 4))
+
+def scan_local_market(all_stocks):
+    """
+    基于本地 stock_daily 历史 + 当日快照的全市场扫描
+    
+    本地数据覆盖不足时返回 None，由调用方回退到逐只联网扫描
+    """
+    config = get_config()
+    panel = OhlcvPanel.load(days=config.vcp_history_days)
+    if len(panel) < config.vcp_min_local_codes:
+        logger.info(f"本地仅有 {len(panel)} 只股票的历史数据（阈值 {config.vcp_min_local_codes}），回退到联网扫描")
+        return None
+    
+    start = time.time()
+    panel = panel.with_spot_bar(all_stocks, trade_date=_latest_trade_date())
+    # 相对强度使用全市场 RS 评级（按交易日缓存），不可用时退化为面板内涨幅排名
+    try:
+        rs_percentile = get_rs_service().percentiles_for(panel.codes)
+    except Exception as e:
+        logger.warning(f"获取 RS 评级失败: {e}")
+        rs_percentile = None
+    table = detect_vcp(panel, rs_percentile=rs_percentile)
+    candidates = table[table['passed']]
+    logger.info(f"全市场 VCP 批量检测完成：{len(panel)} 只股票，{len(candidates)} 只符合形态，"
+                f"耗时 {time.time() - start:.3f}s")
+    for _, row in candidates.head(TOP_N).iterrows():
+        logger.info(f"  {row['code']}: 收缩 {row['contractions']} 次, 量能比 {row['volume_ratio']:.2f}, "
+                    f"距枢轴 {row['pivot_distance']:.1%}, RS {row['rs_percentile']:.0f}")
+    return candidates['code'].head(TOP_N).tolist()
 
 def get_vcp_targets():
     # 1. 定义你关注的“种子股池”（AI硬件、半导体、航天等）
@@ -19,7 +70,8 @@ def get_vcp_targets():
     for attempt in range(3):
         try:
             logger.info(f"🚀 尝试抓取行情 (第{attempt+1}次)...")
-            all_stocks = ak.stock_zh_a_spot_em()
+            # 复用全市场共享快照；重试时若缓存的是失败留下的空快照则重新请求
+            all_stocks = get_spot_snapshot_service().get_snapshot(SNAPSHOT_A_SHARE, retry_empty=attempt > 0)
             
             # --- 核心改进：处理抓取失败 ---
             if all_stocks is None or all_stocks.empty:
@@ -27,19 +79,27 @@ def get_vcp_targets():
                 #logger.warning("无法获取全市场快照，使用保底列表...")
                 #return ["600879", "300308"] # 航天电子和中际旭创
 
+            # 优先使用本地历史数据做全市场扫描，只有当日 K 线来自快照
+            qualified = scan_local_market(all_stocks)
+            if qualified is not None:
+                if qualified:
+                    return qualified
+                break
+            
             rising = all_stocks[all_stocks['涨跌幅'] > 0].sort_values(by='成交额', ascending=False).head(80)
             qualified = []
             for _, row in rising.iterrows():
                 code = row['代码']
                 try:
+                    get_rate_limiter(HOST_EASTMONEY).acquire()
                     hist = ak.stock_zh_a_hist(symbol=code, period="daily").tail(60)
                     if check_vcp_condition(hist):
                         qualified.append(code)
-                except: continue
+                except Exception: continue
 
             # 如果扫到了就返回，没扫到则进入下方的种子列表检查
             if qualified:
-                return qualified[:5]
+                return qualified[:TOP_N]
             
             #return qualified[:5] if qualified else ["600879"] # 如果没扫到，保底返回航天电子
         except Exception as e:
@@ -54,13 +114,14 @@ def get_vcp_targets():
             # 转换 Yahoo 格式
             yf_code = f"{code}.SS" if code.startswith('6') else f"{code}.SZ"
             # yfinance 在多伦多极其稳定
+            get_rate_limiter(HOST_YAHOO).acquire()
             df = yf.download(yf_code, period="3mo", interval="1d", progress=False)
             if not df.empty:
                 # 简单列名对齐以复用逻辑
                 df = df.rename(columns={'Close': '收盘'})
                 if check_vcp_condition(df):
                     final_backup.append(code)
-        except: continue
+        except Exception: continue
         
     return final_backup if final_backup else ["600519"] # 最终保底：茅台
 